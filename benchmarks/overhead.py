@@ -0,0 +1,85 @@
+"""Benchmarks of the python side overhead of the ORM, no database is needed"""
+import datetime
+
+from pg_orm import models
+from pg_orm.models.base_model import ModelMeta
+from pg_orm.models.database import Psycopg2Driver
+from pg_orm.validators import LengthValidator, ValueValidator
+
+from timing import measure
+
+
+def _field_definitions():
+    return {
+        "name": models.CharField(max_length=255),
+        "body": models.TextField(),
+        "views": models.IntegerField(),
+        "score": models.FloatField(),
+        "published": models.BooleanField(),
+        "created_at": models.DateTimeField(),
+        "payload": models.JsonField(null=True),
+        "tags": models.ArrayField("TEXT", null=True),
+    }
+
+
+class BenchPost(models.Model, table_name="bench_post"):
+    name = models.CharField(max_length=255)
+    body = models.TextField()
+    views = models.IntegerField()
+    score = models.FloatField()
+    published = models.BooleanField()
+    created_at = models.DateTimeField()
+    payload = models.JsonField(null=True)
+    tags = models.ArrayField("TEXT", null=True)
+
+
+ROW = {
+    "id": 1,
+    "name": "A benchmark post",
+    "body": "Lorem ipsum " * 20,
+    "views": 42,
+    "score": 4.5,
+    "published": True,
+    "created_at": datetime.datetime(2021, 1, 1),
+    "payload": {"key": "value"},
+    "tags": ["a", "b"],
+}
+
+
+def run(scale: float = 1.0) -> dict:
+    if BenchPost.db is None:
+        # Nothing is sent to the database, the driver only has to exist
+        BenchPost.set_db(Psycopg2Driver(None))
+
+    number = max(int(10000 * scale), 1)
+    query_gen = BenchPost._query_gen
+    manager = BenchPost.objects
+    instance = BenchPost(**ROW)
+    rows = [dict(ROW, id=i) for i in range(1000)]
+    columns = tuple(ROW)
+    tuples = [tuple(row.values()) for row in rows]
+    length_validator = LengthValidator(min_length=1, max_length=255)
+    value_validator = ValueValidator(min_value=0, max_value=100)
+    values = {k: v for k, v in ROW.items() if k != "id"}
+
+    def create_model_class():
+        ModelMeta("BenchCreated", (models.Model,), _field_definitions(), table_name="bench_created")
+
+    def set_attribute():
+        instance.views = 43
+
+    return {
+        "model_class_creation": measure(create_model_class, max(number // 10, 1)),
+        "instance_construction": measure(lambda: BenchPost(**ROW), number),
+        "attribute_access": measure(lambda: instance.name, number * 10),
+        "attribute_set": measure(set_attribute, number * 10),
+        "compile_select": measure(lambda: query_gen.generate_select_query(name="x", views=1), number),
+        "compile_select_asyncpg": measure(lambda: query_gen.generate_select_query(True, name="x", views=1), number),
+        "compile_insert": measure(lambda: query_gen.generate_insert_query(True, **values), number),
+        "compile_update": measure(lambda: query_gen.generate_update_query(**ROW), number),
+        "hydrate_row": measure(lambda: manager._return_model(ROW), number),
+        "hydrate_1000_rows": measure(lambda: [manager._return_model(row) for row in rows], max(number // 1000, 1)),
+        "hydrate_1000_tuples": measure(lambda: manager._return_models(columns, tuples), max(number // 1000, 1)),
+        "length_validator": measure(lambda: length_validator(ROW["name"]), number * 10),
+        "value_validator": measure(lambda: value_validator(ROW["views"]), number * 10),
+    }
@@ -0,0 +1,82 @@
+"""Runs the benchmarks and saves the results as json.
+
+    python benchmarks/run.py                      # python side overhead only
+    python benchmarks/run.py --db                 # plus throughput against a throwaway cluster
+    python benchmarks/run.py -o new.json --compare old.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pg_orm  # noqa: E402
+import overhead  # noqa: E402
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: dict, new: dict):
+    """Prints the change of every benchmark between two result files"""
+    print(f"{'benchmark':<28} {'old us/op':>12} {'new us/op':>12} {'change':>9}")
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            print(f"{name:<28} {'-':>12} {result['per_op_us']:>12.3f} {'new':>9}")
+            continue
+
+        change = (result["per_op_us"] - before["per_op_us"]) / before["per_op_us"] * 100
+        print(f"{name:<28} {before['per_op_us']:>12.3f} {result['per_op_us']:>12.3f} {change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pg_orm benchmarks")
+    parser.add_argument("--db", action="store_true", help="run the throughput benchmarks with initdb")
+    parser.add_argument("--bindir", help="directory of the PostgreSQL binaries (initdb, pg_ctl)")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per throughput benchmark")
+    parser.add_argument("--scale", type=float, default=1.0, help="scales the iterations of the overhead benchmarks")
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="a previous result file to compare against")
+    args = parser.parse_args()
+
+    results = overhead.run(args.scale)
+    if args.db:
+        import throughput
+
+        results.update(throughput.run(args.rows, args.bindir))
+
+    data = {
+        "meta": {
+            "version": pg_orm.__version__,
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=4)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            compare(json.load(fp), data)
+    else:
+        for name, result in results.items():
+            print(f"{name:<28} {result['per_op_us']:>12.3f} us/op {result['ops_per_sec']:>14.1f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""End to end throughput of both drivers against a throwaway PostgreSQL cluster"""
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+import pg_orm
+from pg_orm import models
+
+from timing import throughput
+
+
+class TemporaryCluster:
+    """Creates a PostgreSQL cluster with initdb in a temporary directory and removes it on exit.
+    The server only listens on a unix socket inside that directory."""
+
+    def __init__(self, bindir: str = None):
+        self.bindir = bindir or self._find_bindir()
+        self.directory = None
+        self.port = None
+
+    @staticmethod
+    def _find_bindir():
+        initdb = shutil.which("initdb")
+        if initdb:
+            return os.path.dirname(initdb)
+
+        pg_config = shutil.which("pg_config")
+        if pg_config:
+            return subprocess.run([pg_config, "--bindir"], check=True, capture_output=True, text=True).stdout.strip()
+
+        raise RuntimeError("Could not find initdb, put the PostgreSQL binaries on the PATH or pass --bindir.")
+
+    def _run(self, program, *args):
+        subprocess.run([os.path.join(self.bindir, program), *args], check=True, capture_output=True)
+
+    @property
+    def connection_kwargs(self):
+        return {"host": self.directory, "port": self.port, "user": "postgres", "database": "postgres"}
+
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix="pg_orm_bench_")
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+
+        data = os.path.join(self.directory, "data")
+        self._run("initdb", "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8", "--no-sync")
+        options = f"-p {self.port} -k {self.directory} -c listen_addresses='' -c fsync=off"
+        self._run("pg_ctl", "-D", data, "-o", options, "-l", os.path.join(self.directory, "log"), "-w", "start")
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._run("pg_ctl", "-D", os.path.join(self.directory, "data"), "-m", "immediate", "stop")
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class SyncRow(models.Model, table_name="bench_sync_row"):
+    name = models.CharField(max_length=255)
+    value = models.IntegerField()
+
+
+class AsyncRow(models.AsyncModel, table_name="bench_async_row"):
+    name = models.CharField(max_length=255)
+    value = models.IntegerField()
+
+
+def run_psycopg2(cluster: TemporaryCluster, rows: int) -> dict:
+    from psycopg2 import pool
+
+    kwargs = dict(cluster.connection_kwargs)
+    kwargs["dbname"] = kwargs.pop("database")
+    pg_pool = pool.SimpleConnectionPool(1, 4, **kwargs)
+    pg_orm.init_db(psycopg2_pool=pg_pool)
+    results = {}
+
+    try:
+        SyncRow.create_table()
+
+        started = time.perf_counter()
+        instances = [SyncRow.objects.create(name=f"row {i}", value=i) for i in range(rows)]
+        results["psycopg2_insert"] = throughput(started, rows)
+
+        started = time.perf_counter()
+        for instance in instances:
+            SyncRow.objects.get(id=instance.id)
+        results["psycopg2_select_by_id"] = throughput(started, rows)
+
+        started = time.perf_counter()
+        selects = max(rows // 100, 1)
+        for _ in range(selects):
+            SyncRow.objects.all()
+        results["psycopg2_select_all"] = throughput(started, selects * rows)
+
+        started = time.perf_counter()
+        for instance in instances:
+            instance.value += 1
+            instance.update()
+        results["psycopg2_update"] = throughput(started, rows)
+
+        SyncRow.drop(delete_migration_files=False)
+    finally:
+        pg_pool.closeall()
+
+    return results
+
+
+async def run_asyncpg(cluster: TemporaryCluster, rows: int) -> dict:
+    import asyncpg
+
+    pool = await asyncpg.create_pool(min_size=1, max_size=4, **cluster.connection_kwargs)
+    pg_orm.init_db(asyncpg_pool=pool)
+    results = {}
+
+    try:
+        await AsyncRow.create_table()
+
+        started = time.perf_counter()
+        instances = [await AsyncRow.objects.create(name=f"row {i}", value=i) for i in range(rows)]
+        results["asyncpg_insert"] = throughput(started, rows)
+
+        started = time.perf_counter()
+        for instance in instances:
+            await AsyncRow.objects.get(id=instance.id)
+        results["asyncpg_select_by_id"] = throughput(started, rows)
+
+        started = time.perf_counter()
+        selects = max(rows // 100, 1)
+        for _ in range(selects):
+            await AsyncRow.objects.all()
+        results["asyncpg_select_all"] = throughput(started, selects * rows)
+
+        started = time.perf_counter()
+        for instance in instances:
+            instance.value += 1
+            await instance.update()
+        results["asyncpg_update"] = throughput(started, rows)
+
+        await AsyncRow.drop(delete_migration_files=False)
+    finally:
+        await pool.close()
+
+    return results
+
+
+def run(rows: int = 2000, bindir: str = None) -> dict:
+    results = {}
+    with TemporaryCluster(bindir) as cluster:
+        results.update(run_psycopg2(cluster, rows))
+        results.update(asyncio.run(run_asyncpg(cluster, rows)))
+    return results
@@ -0,0 +1,17 @@
+import time
+import timeit
+
+
+def measure(function, number: int = 10000, repeat: int = 5) -> dict:
+    """Times a function, returns the best time per call out of ``repeat`` rounds"""
+    best = min(timeit.repeat(function, number=number, repeat=repeat)) / number
+    return {"per_op_us": round(best * 1e6, 3), "ops_per_sec": round(1 / best, 1)}
+
+
+def throughput(started: float, operations: int) -> dict:
+    """Turns a perf_counter() start time and the number of operations since then into a result"""
+    elapsed = time.perf_counter() - started
+    return {
+        "per_op_us": round(elapsed / operations * 1e6, 3),
+        "ops_per_sec": round(operations / elapsed, 1),
+    }
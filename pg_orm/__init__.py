@@ -1,12 +1,38 @@
 import logging
 
 
-def init_db(*, psycopg2_pool=None, asyncpg_pool=None):
+def init_db(*, psycopg2_pool=None, asyncpg_pool=None, psycopg_pool=None, async_psycopg_pool=None, json_codecs=True):
+    """Sets the drivers of the models, sync models use psycopg2_pool or psycopg_pool
+    (a psycopg 3 ConnectionPool) and async models asyncpg_pool or async_psycopg_pool (an AsyncConnectionPool).
+
+    The JSON codecs of psycopg2/psycopg 3 are registered process-wide, so they apply to every connection
+    of the process and not only to the ones of the pools. Pass json_codecs=False to keep the existing adapters,
+    dicts must then be adapted by the application for JsonField values to be written."""
     from pg_orm.models.base_model import Model, AsyncModel
-    from pg_orm.models.database import Psycopg2Driver, AsyncpgDriver
+    from pg_orm.models.database import Psycopg2Driver, AsyncpgDriver, PsycopgDriver, AsyncPsycopgDriver
+
+    if not (psycopg2_pool or asyncpg_pool or psycopg_pool or async_psycopg_pool):
+        raise Exception("psycopg2_pool, asyncpg_pool, psycopg_pool or async_psycopg_pool must be specified.")
+    if psycopg2_pool and psycopg_pool:
+        raise ValueError("Sync models use one driver, pass psycopg2_pool or psycopg_pool.")
+    if asyncpg_pool and async_psycopg_pool:
+        raise ValueError("Async models use one driver, pass asyncpg_pool or async_psycopg_pool.")
+
+    if json_codecs and (psycopg_pool or async_psycopg_pool):
+        from pg_orm.models import codecs
+
+        codecs.register_psycopg()
+
+    if psycopg_pool:
+        Model.set_db(PsycopgDriver(psycopg_pool))
+
+    if async_psycopg_pool:
+        AsyncModel.set_db(AsyncPsycopgDriver(async_psycopg_pool))
+
+    if json_codecs and psycopg2_pool:
+        from pg_orm.models import codecs
 
-    if not psycopg2_pool and not asyncpg_pool:
-        raise Exception("psycopg2_pool or asyncpg_pool must be specified.")
+        codecs.register_psycopg2()
 
     if psycopg2_pool:
         Model.set_db(Psycopg2Driver(psycopg2_pool))
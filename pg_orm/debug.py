@@ -0,0 +1,136 @@
+"""Tools which report the statements a code path sends to the database"""
+import functools
+import inspect
+import logging
+import os
+import re
+import sys
+import traceback
+
+from pg_orm.errors import NPlusOneError
+from pg_orm.models.database import add_query_listener, remove_query_listener
+
+log = logging.getLogger(__name__)
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\$\d+|%s")
+_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(query: str) -> str:
+    """Replaces the literals and parameters of a statement with ? so repeated statements compare equal"""
+    query = _LITERALS.sub("?", query)
+    query = _LISTS.sub("(?)", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+class _QueryListener:
+    """Base class of the tools, works as a context manager and as a decorator of sync and async functions"""
+
+    def __init__(self):
+        self.queries = []
+        self._token = None
+
+    def record(self, query):
+        self.queries.append(query)
+
+    def __enter__(self):
+        self.queries = []
+        self._token = add_query_listener(self.record)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        remove_query_listener(self._token)
+
+    def _copy(self):
+        raise NotImplementedError
+
+    def __call__(self, function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with self._copy():
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self._copy():
+                    return function(*args, **kwargs)
+
+        return wrapper
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+class assert_max_queries(_QueryListener):
+    """Fails with an AssertionError when more than ``max_queries`` statements are sent inside the block
+
+    with assert_max_queries(2):
+        post = Post.objects.get(id=1)
+        post.update()
+    """
+
+    def __init__(self, max_queries: int):
+        super().__init__()
+        self.max_queries = max_queries
+
+    def _copy(self):
+        return assert_max_queries(self.max_queries)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        super().__exit__(exc_type, exc_value, tb)
+        if exc_type is None and self.count > self.max_queries:
+            queries = "\n".join(f"{i}. {query}" for i, query in enumerate(self.queries, 1))
+            raise AssertionError(f"{self.count} queries executed, {self.max_queries} allowed:\n{queries}")
+
+
+def _call_site():
+    """The first frame of the call stack which is outside of pg_orm"""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename.startswith(_PACKAGE_DIR):
+        frame = frame.f_back
+    return frame
+
+
+class detect_n_plus_one(_QueryListener):
+    """Reports a statement which runs ``threshold`` times from the same call site inside the block,
+    the usual sign of a query made in a loop (N+1). Wrap a unit of work, e.g. a request, in it.
+
+    The report is logged as a warning with the stack trace of the call site,
+    with raise_error=True a NPlusOneError is raised instead.
+    """
+
+    def __init__(self, threshold: int = 5, raise_error: bool = False):
+        super().__init__()
+        self.threshold = threshold
+        self.raise_error = raise_error
+        self.counts = {}
+        self.reports = []
+
+    def _copy(self):
+        return detect_n_plus_one(self.threshold, self.raise_error)
+
+    def __enter__(self):
+        self.counts = {}
+        self.reports = []
+        return super().__enter__()
+
+    def record(self, query):
+        super().record(query)
+        frame = _call_site()
+        site = (frame.f_code.co_filename, frame.f_lineno) if frame is not None else None
+        key = (normalize(query), site)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+        if self.counts[key] == self.threshold:
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            message = f"Possible N+1 query, executed {self.threshold} times from " \
+                      f"{'%s:%s' % site if site else 'unknown'}:\n{key[0]}\n{stack}"
+            self.reports.append(message)
+
+            if self.raise_error:
+                raise NPlusOneError(message)
+            log.warning(message)
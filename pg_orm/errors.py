@@ -29,3 +29,29 @@ class DataBaseNotConfigured(DBError):
     def __init__(self):
         super().__init__("DataBase is not properly configured."
                          "\nUse pg_orm.init_db and configure the database properly.")
+
+
+class NPlusOneError(DBError):
+    """Raised by pg_orm.debug.detect_n_plus_one when a statement is repeated from the same call site"""
+    pass
+
+
+class DeferredFieldError(DBError):
+    """Raised when a deferred field of an AsyncModel instance is read before it was loaded"""
+    pass
+
+
+class QueryTimeout(DBError):
+    """Raised when a query didn't finish before the deadline of its context (see pg_orm.models.deadline),
+    the query is cancelled and its connection returned to the pool"""
+    pass
+
+
+class BufferFull(DBError):
+    """Raised when a write-behind buffer stayed full for longer than its put_timeout"""
+    pass
+
+
+class LockTimeout(DBError):
+    """Raised when an advisory lock (e.g. the one of the migrations) wasn't acquired within its timeout"""
+    pass
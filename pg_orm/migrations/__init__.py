@@ -1 +1,3 @@
 from pg_orm.migrations.migration import (migrate, migrate_all, async_migrate, async_migrate_all)
+from pg_orm.migrations.online import OnlineMigration
+from pg_orm.migrations.lock import MigrationLock
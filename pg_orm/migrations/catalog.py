@@ -0,0 +1,19 @@
+"""Queries which read the state of the tables from pg_catalog instead of the tables themselves"""
+
+
+def _param(asyncpg=False):
+    return "$1" if asyncpg else "%s"
+
+
+def existing_tables_query(asyncpg=False):
+    """Returns the given table names which exist (resolved through the search_path)"""
+    return f"SELECT name FROM unnest({_param(asyncpg)}::text[]) AS name WHERE to_regclass(name) IS NOT NULL;"
+
+
+def table_columns_query(asyncpg=False):
+    """Returns the names of the live columns of a table"""
+    return (
+        "SELECT attname FROM pg_attribute "
+        f"WHERE attrelid = to_regclass({_param(asyncpg)}) AND attnum > 0 AND NOT attisdropped "
+        "ORDER BY attnum;"
+    )
@@ -0,0 +1,69 @@
+"""The migration ledger, a table which stores the migrated state of every model"""
+import hashlib
+import json
+
+LEDGER_TABLE = "pg_orm_migrations"
+
+
+def _json_default(value):
+    # Callables (e.g. default_sql_value=datetime.now) are stored by name so the checksum stays stable
+    name = getattr(value, "__qualname__", None)
+    if name is not None:
+        return f"{getattr(value, '__module__', '')}.{name}"
+    return str(value)
+
+
+def dumps(state: dict) -> str:
+    return json.dumps(state, sort_keys=True, default=_json_default)
+
+
+def checksum(state: dict) -> str:
+    return hashlib.sha256(dumps(state).encode("utf-8")).hexdigest()
+
+
+def model_key(cls) -> str:
+    """The ledger row of a model, keyed on its import path so models which share a class name don't share a row"""
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def legacy_key(cls) -> str:
+    """The key of the rows recorded before the ledger was keyed on the import path"""
+    return cls.__name__
+
+
+def creation_query():
+    return (
+        f"CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} ("
+        "model TEXT PRIMARY KEY, "
+        "table_name TEXT NOT NULL, "
+        "checksum TEXT NOT NULL, "
+        "state JSONB NOT NULL, "
+        "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())"
+    )
+
+
+def select_query():
+    return f"SELECT model, table_name, checksum, state::text AS state FROM {LEDGER_TABLE};"
+
+
+def upsert_query(asyncpg=False):
+    params = ("$1", "$2", "$3", "$4") if asyncpg else ("%s",) * 4
+    return (
+        f"INSERT INTO {LEDGER_TABLE} (model, table_name, checksum, state) "
+        "VALUES ({0}, {1}, {2}, {3}::jsonb) ON CONFLICT (model) DO UPDATE SET "
+        "table_name = EXCLUDED.table_name, checksum = EXCLUDED.checksum, "
+        "state = EXCLUDED.state, applied_at = now();".format(*params)
+    )
+
+
+def upsert_args(cls, state: dict):
+    return model_key(cls), state["name"], checksum(state), dumps(state)
+
+
+def deletion_query(asyncpg=False):
+    params = ("$1", "$2", "$3") if asyncpg else ("%s",) * 3
+    return f"DELETE FROM {LEDGER_TABLE} WHERE model = {{0}} OR (model = {{1}} AND table_name = {{2}});".format(*params)
+
+
+def deletion_args(cls):
+    return model_key(cls), legacy_key(cls), cls.table_name
@@ -0,0 +1,38 @@
+"""The advisory lock which coordinates the migrations of many nodes"""
+import hashlib
+import logging
+from typing import Optional, Union
+
+log = logging.getLogger(__name__)
+
+
+def lock_key(name: str) -> int:
+    """A stable bigint advisory lock key derived from a name"""
+    return int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+DEFAULT_LOCK_KEY = lock_key("pg_orm_migrations")
+
+
+class MigrationLock:
+    """Settings of the advisory lock which lets a single node migrate the database at a time.
+
+    The other nodes wait for it (up to ``timeout`` seconds, then LockTimeout is raised) and find nothing
+    left to apply once they get it, or with wait=False they skip the migration right away.
+    ``key`` is a bigint or a name which is hashed into one, nodes which should exclude each other share it.
+    The lock is held on a connection of the pool for the whole migration, which runs on other connections,
+    so the pool needs at least 2 connections, with a single one the migration fails or hangs."""
+
+    def __init__(self, key: Union[int, str] = DEFAULT_LOCK_KEY, timeout: Optional[float] = None, wait: bool = True):
+        self.key = lock_key(key) if isinstance(key, str) else key
+        self.timeout = timeout
+        self.wait = wait
+
+    @classmethod
+    def from_option(cls, lock: Union[bool, "MigrationLock", None]):
+        if isinstance(lock, MigrationLock):
+            return lock
+        return cls() if lock else None
+
+    def skipped(self):
+        log.info(f"Another node holds the migration lock {self.key}, skipping the migration")
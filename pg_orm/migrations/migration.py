@@ -3,106 +3,402 @@ import os
 import logging
 import json
 from pathlib import Path
-import psycopg2
-import asyncpg
-from typing import Union, Type
-
-from psycopg2 import errors
+from typing import Union, Type, List, Optional
 
+from pg_orm.errors import SchemaError
 from pg_orm.models.base_model import Model, AsyncModel
+from pg_orm.models.fields import ForeignKey
+from pg_orm.migrations import catalog, ledger
+from pg_orm.migrations.lock import MigrationLock
+from pg_orm.migrations.online import OnlineMigration
 from pg_orm.migrations.schema_diff import SchemaDifference
 
 
 log = logging.getLogger(__name__)
-loop = asyncio.get_event_loop()
 
 
 def _get_data_file(cls: Union[Type[Model], Type[AsyncModel]], directory):
     return Path(os.path.join(directory, cls.__name__ + ".json"))
 
 
-def _write_migrations(cls: Union[Type[Model], Type[AsyncModel]], directory="migrations"):
-    """Writes the data to the data files, creates it if not exists
-       WARNING: Do not manually call this function unless you know what you are doing use migrate instead"""
+def _read_migrations(cls: Union[Type[Model], Type[AsyncModel]], directory="migrations") -> Optional[dict]:
+    """Reads the legacy json migration file of the model"""
     data_file = _get_data_file(cls, directory)
 
-    table_data = cls.to_dict()
-
     if not data_file.exists():
-        data_file.parent.mkdir(parents=True, exist_ok=True)
-        with data_file.open("w+", encoding="utf-8") as fp:
-            json.dump(table_data, fp, indent=4, ensure_ascii=True)
+        return None
 
-    else:
-        with data_file.open("w+", encoding="utf-8") as fp:
-            json.dump(table_data, fp, indent=4, ensure_ascii=True)
+    with data_file.open() as fp:
+        return json.load(fp)
 
 
-def migrate(cls: Type[Model], directory="migrations", print_query: bool = False):
-    data_file = _get_data_file(cls, directory)
+def _get_models(base) -> list:
+    """Returns all the models which subclass the given base class"""
+    models = []
+    for model in base.__subclasses__():
+        if "table_name" in model.__dict__:  # Abstract bases like MaterializedView have no table
+            models.append(model)
+        models.extend(_get_models(model))
+    return models
 
-    if not data_file.exists():
-        _write_migrations(cls, directory)
-        return cls.create_table()
 
-    with data_file.open() as fp:
-        data = json.load(fp)
+def _dependency_levels(models) -> List[list]:
+    """Groups the models into levels, the models of a level only reference
+    the tables of the previous levels through their foreign keys.
+    Materialized views come last, one per level, since their queries can read any table or an earlier view"""
+    views = [model for model in models if model.view_query is not None]
+    models = [model for model in models if model.view_query is None]
+    tables = {model.table_name.lower(): model for model in models}
+    dependencies = {}
+    for model in models:
+        references = {tables.get(field.to.lower()) for field in model.fields.values() if isinstance(field, ForeignKey)}
+        references.discard(None)
+        references.discard(model)
+        dependencies[model] = references
 
-        try:
-            cls.db.execute(f"SELECT * FROM {data['name']};")
-        except psycopg2.errors.UndefinedTable:
-            cls.create_table()
-            _write_migrations(cls, directory)
-            return
+    levels = []
+    while dependencies:
+        level = [model for model, references in dependencies.items() if not references]
+        if not level:
+            raise SchemaError(
+                "Circular foreign keys between %s" % ", ".join(m.__name__ for m in dependencies)
+            )
 
-        statements = SchemaDifference(cls, data).to_sql()
+        for model in level:
+            del dependencies[model]
+        for references in dependencies.values():
+            references.difference_update(level)
+        levels.append(level)
 
-        if statements:
-            for statement in statements:
-                cls.db.execute(statement.strip())
-                if print_query:
-                    print(statement + "\n")
+    levels.extend([view] for view in views)
+    return levels
+
+
+def _table_name(cls, data):
+    # The table might have been renamed since the last migration
+    return data["name"] if data else cls.table_name
+
+
+def _missing_columns_sql(cls, columns):
+    """ALTER TABLE statement which adds the fields of the model that are missing in the live table"""
+    missing = [field for field in cls.fields.values() if field.column_name.lower() not in columns]
+    if not missing:
+        return []
+
+    add_fields_query = [f"ADD COLUMN IF NOT EXISTS {field.column_name} {field.to_sql()}" for field in missing]
+    return [f"ALTER TABLE {cls.table_name}\n" + ", ".join(add_fields_query)]
+
+
+def _notify_trigger_sql(cls, data) -> list:
+    """Creates the notify trigger of a model with notify="trigger" or drops it once the model stopped using it"""
+    if cls.notify == "trigger":
+        return cls._query_gen.generate_notify_trigger_queries()
+    if data and data.get("notify") == "trigger":
+        return cls._query_gen.generate_notify_trigger_drop_queries()
+    return []
+
+
+def _apply(cls: Type[Model], data, exists: bool, print_query: bool = False, online: OnlineMigration = None):
+    """Applies the changes of the model in the current transaction (or step by step when online),
+    returns the index statements which have to run outside of it"""
+    if exists and cls.view_query is not None:
+        # A materialized view can't be altered, it is rebuilt from its query
+        statement = cls._query_gen.generate_drop_query(_table_name(cls, data))
+        cls.db.execute(statement)
+        if print_query:
+            print(statement + "\n")
+        exists = False
+
+    if not exists:
+        cls.create_table()
+        return []
+
+    if data is None:
+        # There is no migration data, compare against the live table instead
+        columns = [row["attname"] for row in cls.db.fetchall(catalog.table_columns_query(), cls.table_name)]
+        statements = _missing_columns_sql(cls, columns)
+        index_statements = cls._query_gen.generate_index_creation_queries(concurrently=True)
+    elif online:
+        difference = SchemaDifference(cls, data)
+        steps = difference.online_steps(online.batch_size)
+        if steps:
+            online.run(cls, steps, print_query)
         else:
             print("No changes to apply")
 
-    _write_migrations(cls, directory)  # At last synchronize the json files with the current state of the Model
+        for statement in _notify_trigger_sql(cls, data):
+            cls.db.execute(statement)
 
+        cls.maintain_partitions()
+        return difference.index_sql()
+    else:
+        difference = SchemaDifference(cls, data)
+        statements = difference.to_sql() or []
+        index_statements = difference.index_sql()
 
-def migrate_all(directory="migrations", print_query: bool = False):
-    for model in Model.__subclasses__():
-        if model._is_sync:
-            migrate(model, directory, print_query)
+    statements = list(statements) + _notify_trigger_sql(cls, data)
 
+    if statements:
+        for statement in statements:
+            cls.db.execute(statement.strip())
+            if print_query:
+                print(statement + "\n")
+    else:
+        print("No changes to apply")
 
-async def async_migrate(cls: Type[AsyncModel], directory="migrations", print_query: bool = False):
-    data_file = _get_data_file(cls, directory)
+    cls.maintain_partitions()
+    return index_statements
 
-    if not data_file.exists():
-        _write_migrations(cls, directory)
-        return await cls.create_table()
 
-    with data_file.open() as fp:
-        data = json.load(fp)
+def _create_indexes(cls: Type[Model], statements, print_query: bool = False):
+    for statement in statements:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        cls.db.execute(statement, autocommit=True)
+        if print_query:
+            print(statement + "\n")
+
+
+def _ledger_entry(model, entries):
+    entry = entries.get(ledger.model_key(model))
+    if entry is None:
+        # Recorded before the ledger was keyed on the import path, only trusted for the table of the model
+        entry = entries.get(ledger.legacy_key(model))
+        if entry is not None and entry["table_name"] != model.table_name:
+            entry = None
+    return entry
+
+
+def _pending(models, entries, directory) -> dict:
+    """Returns the models whose state differs from the one recorded in the ledger, with their recorded state.
+    Models without a ledger entry fall back to the legacy json files, without those the live table is introspected"""
+    pending = {}
+    rebuilt_view = False
+    for model in models:
+        entry = _ledger_entry(model, entries)
+        if entry is not None and entry["checksum"] == ledger.checksum(model.to_dict()):
+            # Unchanged since the last migration, unless it is a view which an earlier rebuilt view dropped
+            if not (rebuilt_view and model.view_query is not None):
+                continue
+
+        rebuilt_view = rebuilt_view or (model.view_query is not None and entry is not None)
+
+        pending[model] = json.loads(entry["state"]) if entry is not None else _read_migrations(model, directory)
+    return pending
+
+
+def _ledger_state(model, data, indexes_pending: bool) -> dict:
+    state = model.to_dict()
+    if indexes_pending:
+        # The concurrent index builds run after the transaction, they are recorded once they succeeded
+        state["indexes"] = data.get("indexes", []) if data else []
+    return state
+
+
+def _migrate(models, directory, print_query: bool = False, online: OnlineMigration = None,
+             lock: MigrationLock = None):
+    if lock is None:
+        return _apply_pending(models, directory, print_query, online)
+
+    with models[0].db.advisory_lock(lock.key, lock.timeout, lock.wait) as acquired:
+        if not acquired:
+            return lock.skipped()
+        # The ledger is read under the lock, what the node which held it before applied isn't pending anymore
+        _apply_pending(models, directory, print_query, online)
 
-        try:
-            await cls.db.execute(f"SELECT * FROM {data['name']};")
-        except asyncpg.exceptions.UndefinedTableError:
-            await cls.create_table()
-            return _write_migrations(cls, directory)
 
-        statements = SchemaDifference(cls, data).to_sql()
+def _apply_pending(models, directory, print_query: bool = False, online: OnlineMigration = None):
+    db = models[0].db
+    db.execute(ledger.creation_query())
+    entries = {row["model"]: row for row in db.fetchall(ledger.select_query())}
+    pending = _pending(models, entries, directory)
+    for model in models:
+        if model not in pending:
+            # Unchanged partitioned models still get their upcoming partitions and lose the expired ones
+            model.maintain_partitions()
+    if not pending:
+        return
 
+    names = [_table_name(model, data) for model, data in pending.items()]
+    existing = {row["name"] for row in db.fetchall(catalog.existing_tables_query(), names)}
+    index_statements = {}
+
+    def apply(model, data):
+        statements = _apply(model, data, _table_name(model, data) in existing, print_query, online)
+        state = _ledger_state(model, data, bool(statements))
+        db.execute(ledger.upsert_query(), *ledger.upsert_args(model, state))
+        index_statements[model] = statements
+
+    if online:
+        for model, data in pending.items():
+            apply(model, data)
+    else:
+        with db.transaction():
+            for model, data in pending.items():
+                apply(model, data)
+
+    for model, statements in index_statements.items():
         if statements:
-            for statement in statements:
-                await cls.db.execute(statement.strip())
-                if print_query:
-                    print(statement + "\n")
+            _create_indexes(model, statements, print_query)
+            db.execute(ledger.upsert_query(), *ledger.upsert_args(model, model.to_dict()))
+
+
+def migrate(cls: Type[Model], directory="migrations", print_query: bool = False, online=False, lock=True):
+    """Applies the changes of the model to its table.
+    With online=True (or an OnlineMigration) the changes are applied step by step with lock timeouts.
+    lock (True or a MigrationLock) holds an advisory lock so a single node migrates at a time,
+    the lock keeps a connection of the pool for itself so the pool needs at least 2 connections"""
+    _migrate([cls], directory, print_query, OnlineMigration.from_option(online), MigrationLock.from_option(lock))
+
+
+def migrate_all(directory="migrations", print_query: bool = False, online=False, lock=True):
+    """Migrates all the models in the order of their foreign keys, the schema changes are applied in one transaction
+    (or step by step with lock timeouts when online).
+    lock (True or a MigrationLock) holds an advisory lock so a single node migrates at a time,
+    the lock keeps a connection of the pool for itself so the pool needs at least 2 connections"""
+    models = [model for level in _dependency_levels(_get_models(Model)) for model in level]
+    if models:
+        _migrate(models, directory, print_query, OnlineMigration.from_option(online), MigrationLock.from_option(lock))
+
+
+async def _async_apply(cls: Type[AsyncModel], data, exists: bool, print_query: bool = False,
+                       online: OnlineMigration = None):
+    """Applies the changes of the model in the current transaction (or step by step when online),
+    returns the index statements which have to run outside of it"""
+    if exists and cls.view_query is not None:
+        # A materialized view can't be altered, it is rebuilt from its query
+        statement = cls._query_gen.generate_drop_query(_table_name(cls, data))
+        await cls.db.execute(statement)
+        if print_query:
+            print(statement + "\n")
+        exists = False
+
+    if not exists:
+        await cls.create_table()
+        return []
+
+    if data is None:
+        # There is no migration data, compare against the live table instead
+        columns = [row["attname"] for row in await cls.db.fetch(catalog.table_columns_query(True), cls.table_name)]
+        statements = _missing_columns_sql(cls, columns)
+        index_statements = cls._query_gen.generate_index_creation_queries(concurrently=True)
+    elif online:
+        difference = SchemaDifference(cls, data)
+        steps = difference.online_steps(online.batch_size)
+        if steps:
+            await online.async_run(cls, steps, print_query)
         else:
             print("No changes to apply")
 
-    _write_migrations(cls, directory)  # At last synchronize the json files with the current state of the Model
+        for statement in _notify_trigger_sql(cls, data):
+            await cls.db.execute(statement)
+
+        await cls.maintain_partitions()
+        return difference.index_sql()
+    else:
+        difference = SchemaDifference(cls, data)
+        statements = difference.to_sql() or []
+        index_statements = difference.index_sql()
+
+    statements = list(statements) + _notify_trigger_sql(cls, data)
+
+    if statements:
+        for statement in statements:
+            await cls.db.execute(statement.strip())
+            if print_query:
+                print(statement + "\n")
+    else:
+        print("No changes to apply")
+
+    await cls.maintain_partitions()
+    return index_statements
+
+
+async def _async_create_indexes(cls: Type[AsyncModel], statements, print_query: bool = False):
+    for statement in statements:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        await cls.db.execute(statement, autocommit=True)
+        if print_query:
+            print(statement + "\n")
+
+
+async def _async_migrate(levels, directory, print_query: bool = False, concurrently: bool = False,
+                         online: OnlineMigration = None, lock: MigrationLock = None):
+    if lock is None:
+        return await _async_apply_pending(levels, directory, print_query, concurrently, online)
+
+    async with levels[0][0].db.advisory_lock(lock.key, lock.timeout, lock.wait) as acquired:
+        if not acquired:
+            return lock.skipped()
+        await _async_apply_pending(levels, directory, print_query, concurrently, online)
+
+
+async def _async_apply_pending(levels, directory, print_query: bool = False, concurrently: bool = False,
+                               online: OnlineMigration = None):
+    db = levels[0][0].db
+    await db.execute(ledger.creation_query())
+    entries = {row["model"]: row for row in await db.fetch(ledger.select_query())}
+    pending = _pending([model for level in levels for model in level], entries, directory)
+    for level in levels:
+        for model in level:
+            if model not in pending:
+                # Unchanged partitioned models still get their upcoming partitions and lose the expired ones
+                await model.maintain_partitions()
+    if not pending:
+        return
+
+    names = [_table_name(model, data) for model, data in pending.items()]
+    existing = {row["name"] for row in await db.fetch(catalog.existing_tables_query(True), names)}
+    index_statements = {}
+
+    async def apply(model):
+        data = pending[model]
+        statements = await _async_apply(model, data, _table_name(model, data) in existing, print_query, online)
+        state = _ledger_state(model, data, bool(statements))
+        await model.db.execute(ledger.upsert_query(True), *ledger.upsert_args(model, state))
+        index_statements[model] = statements
+
+    async def apply_in_transaction(model):
+        async with model.db.transaction():
+            await apply(model)
+
+    if concurrently:
+        for level in levels:
+            await asyncio.gather(*(
+                apply(model) if online else apply_in_transaction(model) for model in level if model in pending
+            ))
+    elif online:
+        for model in pending:
+            await apply(model)
+    else:
+        async with db.transaction():
+            for model in pending:
+                await apply(model)
+
+    for model, statements in index_statements.items():
+        if statements:
+            await _async_create_indexes(model, statements, print_query)
+            await db.execute(ledger.upsert_query(True), *ledger.upsert_args(model, model.to_dict()))
+
+
+async def async_migrate(cls: Type[AsyncModel], directory="migrations", print_query: bool = False, online=False,
+                        lock=True):
+    """Applies the changes of the model to its table.
+    With online=True (or an OnlineMigration) the changes are applied step by step with lock timeouts.
+    lock (True or a MigrationLock) holds an advisory lock so a single node migrates at a time,
+    the lock keeps a connection of the pool for itself so the pool needs at least 2 connections"""
+    await _async_migrate([[cls]], directory, print_query, online=OnlineMigration.from_option(online),
+                         lock=MigrationLock.from_option(lock))
 
 
-async def async_migrate_all(directory="migrations", print_query: bool = False):
-    for model in AsyncModel.__subclasses__():
-        await async_migrate(model, directory, print_query)
+async def async_migrate_all(directory="migrations", print_query: bool = False, concurrently: bool = False,
+                            online=False, lock=True):
+    """Migrates all the models in the order of their foreign keys.
+    The schema changes are applied in one transaction, unless concurrently is True,
+    then the models which don't depend on each other are migrated concurrently, each in its own transaction.
+    With online the changes of each model are applied step by step with lock timeouts.
+    lock (True or a MigrationLock) holds an advisory lock so a single node migrates at a time,
+    the lock keeps a connection of the pool for itself so the pool needs at least 2 connections"""
+    levels = _dependency_levels(_get_models(AsyncModel))
+    if levels:
+        await _async_migrate(levels, directory, print_query, concurrently, OnlineMigration.from_option(online),
+                             MigrationLock.from_option(lock))
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from typing import Union
+
+from pg_orm.errors import DBError
+from pg_orm.migrations.schema_diff import Step, ConcurrentStep, BackfillStep
+
+log = logging.getLogger(__name__)
+
+LOCK_NOT_AVAILABLE = "55P03"
+QUERY_CANCELED = "57014"
+
+
+def _sqlstate(error):
+    # psycopg2 exposes the error code as pgcode and asyncpg as sqlstate
+    return getattr(error, "pgcode", None) or getattr(error, "sqlstate", None)
+
+
+class OnlineMigration:
+    """Settings of an online migration.
+
+    Every step gives up after ``lock_timeout`` if it can't get its lock (instead of queueing
+    behind long transactions and blocking all the traffic behind it) and is retried
+    up to ``retries`` times with an exponential backoff starting at ``retry_delay`` seconds."""
+
+    def __init__(
+            self,
+            lock_timeout: str = "2s",
+            statement_timeout: str = "30s",
+            retries: int = 5,
+            retry_delay: float = 0.5,
+            batch_size: int = 1000,
+    ):
+        self.lock_timeout = lock_timeout
+        self.statement_timeout = statement_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_option(cls, online: Union[bool, "OnlineMigration", None]):
+        if isinstance(online, OnlineMigration):
+            return online
+        return cls() if online else None
+
+    def _timeout_queries(self, step: Step, asyncpg=False):
+        param = "$1" if asyncpg else "%s"
+        statement_timeout = "0" if step.long_running else self.statement_timeout
+        return [
+            (f"SELECT set_config('lock_timeout', {param}, true)", self.lock_timeout),
+            (f"SELECT set_config('statement_timeout', {param}, true)", statement_timeout),
+        ]
+
+    def _should_retry(self, error, attempt):
+        if _sqlstate(error) not in (LOCK_NOT_AVAILABLE, QUERY_CANCELED) or attempt >= self.retries:
+            return False
+
+        delay = self.retry_delay * 2 ** attempt
+        log.warning(f"Online migration step timed out ({error}), retrying in {delay:.1f}s")
+        return delay
+
+    def _locked_rows_delay(self, step, attempt):
+        """The backoff before the next batch of a backfill whose remaining rows are locked by other transactions"""
+        if attempt >= self.retries:
+            raise DBError(f"The rows left to backfill stayed locked by other transactions: {step}")
+
+        delay = self.retry_delay * 2 ** attempt
+        log.warning(f"The rows left to backfill are locked, retrying in {delay:.1f}s")
+        return delay
+
+    def _run_step(self, cls, step):
+        """Runs the step once, returns the number of rows a backfill step updated"""
+        with cls.db.transaction():
+            for query, value in self._timeout_queries(step):
+                cls.db.fetchval(query, value)
+
+            if isinstance(step, BackfillStep):
+                return cls.db.fetchval(step.statements[0], *step.args)
+
+            for statement in step.statements:
+                cls.db.execute(statement, *step.args)
+
+    def run(self, cls, steps, print_query: bool = False):
+        for step in steps:
+            if print_query:
+                print(";\n".join(step.statements) + "\n")
+
+            if isinstance(step, ConcurrentStep):
+                cls.db.execute(step.statements[0], autocommit=True)
+                continue
+
+            attempt = 0
+            while True:
+                try:
+                    updated = self._run_step(cls, step)
+                except Exception as error:
+                    delay = self._should_retry(error, attempt)
+                    if delay is False:
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+                # Backfills are repeated batch by batch until nothing is left to update
+                if not isinstance(step, BackfillStep):
+                    break
+                if updated:
+                    attempt = 0
+                    continue
+                # SKIP LOCKED makes the batch empty while the rows left are locked by other transactions
+                if step.remaining is None or not cls.db.fetchval(step.remaining):
+                    break
+                time.sleep(self._locked_rows_delay(step, attempt))
+                attempt += 1
+
+    async def _async_run_step(self, cls, step):
+        async with cls.db.transaction():
+            for query, value in self._timeout_queries(step, asyncpg=True):
+                await cls.db.fetchval(query, value)
+
+            if isinstance(step, BackfillStep):
+                return await cls.db.fetchval(step.statements[0], *step.args)
+
+            for statement in step.statements:
+                await cls.db.execute(statement, *step.args)
+
+    async def async_run(self, cls, steps, print_query: bool = False):
+        for step in steps:
+            if print_query:
+                print(";\n".join(step.statements) + "\n")
+
+            if isinstance(step, ConcurrentStep):
+                await cls.db.execute(step.statements[0], autocommit=True)
+                continue
+
+            attempt = 0
+            while True:
+                try:
+                    updated = await self._async_run_step(cls, step)
+                except Exception as error:
+                    delay = self._should_retry(error, attempt)
+                    if delay is False:
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+                if not isinstance(step, BackfillStep):
+                    break
+                if updated:
+                    attempt = 0
+                    continue
+                if step.remaining is None or not await cls.db.fetchval(step.remaining):
+                    break
+                await asyncio.sleep(self._locked_rows_delay(step, attempt))
+                attempt += 1
@@ -1,14 +1,38 @@
-from copy import deepcopy
-
 from pg_orm.models.base_model import BaseModel
 
 
+class Step:
+    """A unit of an online migration which runs in its own short transaction"""
+
+    def __init__(self, *statements: str, args: tuple = (), long_running: bool = False):
+        self.statements = statements
+        self.args = args
+        self.long_running = long_running  # Exempt from the statement_timeout
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, "; ".join(self.statements))
+
+
+class ConcurrentStep(Step):
+    """A step which can't run inside a transaction block (CREATE INDEX CONCURRENTLY)"""
+
+
+class BackfillStep(Step):
+    """A batched UPDATE which is repeated until it doesn't update any rows.
+    The batches skip the rows locked by other transactions, ``remaining`` tells whether rows are left
+    after an empty batch"""
+
+    def __init__(self, *statements: str, remaining: str = None, **kwargs):
+        super().__init__(*statements, **kwargs)
+        self.remaining = remaining
+
+
 class SchemaDifference:
     """Compares the migrations to the current state of the model"""
 
     def __init__(self, model: BaseModel, before: dict):
-        model = deepcopy(model)
-        model.fields = dict(sorted(model.fields.items(), key=lambda k: k[0]))  # type: ignore
+        # The fields are compared in name order, without reordering the fields of the model itself
+        self.fields = dict(sorted(model.fields.items(), key=lambda k: k[0]))
         before["fields"] = list(sorted(before["fields"], key=lambda k: k["column_name"]))
         self.model = model
         self.before = BaseModel.from_dict(before)
@@ -16,7 +40,7 @@ class SchemaDifference:
     @staticmethod
     def get_field_comparable_id(field):
         """An id which can be used to compare two fields"""
-        return '-'.join('%s:%s' % (attr, getattr(field, attr)) for attr in ("column_name", "validators", "is_unique",
+        return '-'.join('%s:%s' % (attr, getattr(field, attr)) for attr in ("column_name", "is_unique",
                                                                             "primary_key", "nullable",
                                                                             "default_sql_value"))
 
@@ -27,55 +51,181 @@ class SchemaDifference:
 
         return first.is_unique == second.is_unique and first.primary_key == second.primary_key
 
-    def to_sql(self):
+    def _changes(self):
+        """Yields the changes between the migrations and the model as (kind, before, current) tuples"""
         before = self.before
         current = self.model
-        base = f"ALTER TABLE {before.table_name}\n"
-        statements = []
         get_id = self.get_field_comparable_id
 
-        if len(before.fields) == len(current.fields):
-            for c, b in zip(current.fields.values(), before.fields.values()):
-                alter_col = f"ALTER COLUMN {b.column_name}"
-
+        if len(before.fields) == len(self.fields):
+            for c, b in zip(self.fields.values(), before.fields.values()):
                 if get_id(c) == get_id(b):
                     continue  # Nothing has changed
 
                 if self.field_is_renamed(b, c):
-                    statements.append(base + f"RENAME COLUMN {b.column_name} TO {c.column_name}")
+                    yield "rename_column", b, c
 
                 if b.nullable != c.nullable:
-                    set_or_drop = "DROP" if b.nullable is True and c.nullable is False else "SET"
-                    statements.append(base + f"{alter_col} {set_or_drop} NOT NULL")
+                    yield "nullable", b, c
 
                 if b.default_sql_value != c.default_sql_value:
-                    set_or_drop = f"SET DEFAULT {c._get_default_sql_val()}" if c.default_sql_value is not None else\
-                                  "DROP DEFAULT"
-                    statements.append(base + f"{alter_col} {set_or_drop}")
+                    yield "default", b, c
 
-        elif len(before.fields) < len(current.fields):
+        elif len(before.fields) < len(self.fields):
             # Get the fields which are newly added We have to use this method instead of
             # list(set(before.fields) - set(current.fields)) since fields are not hashable
-            newly_added_fields = [x for x in current.fields.values() if
-                                  get_id(x) not in [get_id(y) for y in before.fields.values()]]
-            add_fields_query = [f"ADD COLUMN {field.column_name} {field.to_sql()}" for field in newly_added_fields]
-            statements.append(base + ", ".join(add_fields_query))
+            before_ids = [get_id(y) for y in before.fields.values()]
+            for field in self.fields.values():
+                if get_id(field) not in before_ids:
+                    yield "add_column", None, field
 
-        elif len(before.fields) > len(current.fields):
+        elif len(before.fields) > len(self.fields):
             # Get the fields which are removed
 
             # We have to use this method instead of list(set(current.fields) - set(before.fields))
             # since fields are not hashable
-            removed_fields = [x for x in before.fields if
-                              get_id(x) not in [get_id(y) for y in current.fields]]
-            drop_fields_query = [f"DROP COLUMN IF EXISTS {field.column_name}" for field in removed_fields]
-            statements.append(base + ", ".join(drop_fields_query))
+            current_ids = [get_id(y) for y in self.fields.values()]
+            for field in before.fields.values():
+                if get_id(field) not in current_ids:
+                    yield "drop_column", field, None
 
         if before.table_name != current.table_name:
-            statements.append(base + f"RENAME TO {current.table_name}")
+            yield "rename_table", before, current
+
+    def to_sql(self):
+        base = f"ALTER TABLE {self.before.table_name}\n"
+        statements = []
+        added, dropped = [], []
+
+        for kind, b, c in self._changes():
+            if kind == "rename_column":
+                statements.append(base + f"RENAME COLUMN {b.column_name} TO {c.column_name}")
+
+            elif kind == "nullable":
+                set_or_drop = "DROP" if c.nullable else "SET"
+                statements.append(base + f"ALTER COLUMN {c.column_name} {set_or_drop} NOT NULL")
+
+            elif kind == "default":
+                set_or_drop = f"SET{c._get_default_sql_val()}" if c.default_sql_value is not None else\
+                              "DROP DEFAULT"
+                statements.append(base + f"ALTER COLUMN {c.column_name} {set_or_drop}")
+
+            elif kind == "add_column":
+                added.append(f"ADD COLUMN {c.column_name} {c.to_sql()}")
+
+            elif kind == "drop_column":
+                dropped.append(f"DROP COLUMN IF EXISTS {b.column_name}")
+
+            elif kind == "rename_table":
+                statements.append(base + f"RENAME TO {c.table_name}")
+
+        if added:
+            statements.insert(0, base + ", ".join(added))
+        if dropped:
+            statements.insert(0, base + ", ".join(dropped))
 
         if not statements:
             return None  # Return None if nothing has changed
 
         else:
             return statements
+
+    def online_steps(self, batch_size: int = 1000):
+        """Returns the changes as steps which are safe to apply to a busy table.
+
+        Every step runs in its own short transaction with a lock_timeout.
+        New NOT NULL columns are added as nullable, backfilled in batches of ``batch_size``
+        and constrained through a NOT VALID check constraint which is validated without blocking writes."""
+        table = self.before.table_name
+        base = f"ALTER TABLE {table} "
+        asyncpg = not self.model._is_sync
+        steps = []
+
+        for kind, b, c in self._changes():
+            if kind == "rename_column":
+                steps.append(Step(base + f"RENAME COLUMN {b.column_name} TO {c.column_name}"))
+
+            elif kind == "nullable":
+                if c.nullable:
+                    steps.append(Step(base + f"ALTER COLUMN {c.column_name} DROP NOT NULL"))
+                else:
+                    steps.extend(self._set_not_null_steps(table, c.column_name))
+
+            elif kind == "default":
+                set_or_drop = f"SET{c._get_default_sql_val()}" if c.default_sql_value is not None else\
+                              "DROP DEFAULT"
+                steps.append(Step(base + f"ALTER COLUMN {c.column_name} {set_or_drop}"))
+
+            elif kind == "add_column":
+                if c.primary_key:
+                    steps.append(Step(base + f"ADD COLUMN {c.column_name} {c.to_sql()}", long_running=True))
+                    continue
+
+                # A constant DEFAULT is only stored in the catalog, the table is not rewritten
+                steps.append(Step(base + f"ADD COLUMN IF NOT EXISTS {c.column_name} "
+                                         f"{c.postgresql}{c._get_default_sql_val()}"))
+
+                if c.default is not None and not c.default_sql_value:
+                    steps.append(self._backfill_step(table, c, batch_size, asyncpg))
+
+                if not c.nullable:
+                    steps.extend(self._set_not_null_steps(table, c.column_name))
+
+                if c.is_unique:
+                    name = f"{table}_{c.column_name}_key"[:63]
+                    steps.append(ConcurrentStep(
+                        f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({c.column_name})"
+                    ))
+                    steps.append(Step(base + f"ADD CONSTRAINT {name} UNIQUE USING INDEX {name}"))
+
+            elif kind == "drop_column":
+                steps.append(Step(base + f"DROP COLUMN IF EXISTS {b.column_name}"))
+
+            elif kind == "rename_table":
+                steps.append(Step(base + f"RENAME TO {c.table_name}"))
+
+        return steps
+
+    @staticmethod
+    def _set_not_null_steps(table, column):
+        # SET NOT NULL skips the full table scan (and the long ACCESS EXCLUSIVE lock)
+        # when a valid CHECK (column IS NOT NULL) constraint exists
+        name = f"{table}_{column}_not_null"[:63]
+        base = f"ALTER TABLE {table} "
+        return [
+            Step(base + f"DROP CONSTRAINT IF EXISTS {name}",
+                 base + f"ADD CONSTRAINT {name} CHECK ({column} IS NOT NULL) NOT VALID"),
+            Step(base + f"VALIDATE CONSTRAINT {name}", long_running=True),
+            Step(base + f"ALTER COLUMN {column} SET NOT NULL",
+                 base + f"DROP CONSTRAINT {name}"),
+        ]
+
+    def _backfill_step(self, table, field, batch_size, asyncpg=False):
+        pk = next(f.column_name for f in self.model.fields.values() if f.primary_key)
+        param = "$1" if asyncpg else "%s"
+        query = (
+            f"WITH batch AS (UPDATE {table} SET {field.column_name} = {param} WHERE {pk} IN "
+            f"(SELECT {pk} FROM {table} WHERE {field.column_name} IS NULL LIMIT {int(batch_size)} "
+            f"FOR UPDATE SKIP LOCKED) RETURNING 1) SELECT count(*) FROM batch"
+        )
+        remaining = f"SELECT EXISTS(SELECT 1 FROM {table} WHERE {field.column_name} IS NULL)"
+        return BackfillStep(query, args=(field._get_default_python_val(),), remaining=remaining)
+
+    def index_sql(self):
+        """Returns the statements which synchronize the indexes.
+        They use CONCURRENTLY (except on partitioned tables) so they have to run outside a transaction"""
+        current = self.model
+        concurrently = current.partition_by is None
+        before = {index.name: index for index in self.before.indexes}
+        after = {index.name: index for index in current.indexes}
+        statements = []
+
+        for name, index in before.items():
+            if after.get(name) != index:  # Removed or changed
+                statements.append(index.to_drop_sql(concurrently))
+
+        for name, index in after.items():
+            if before.get(name) != index:
+                statements.extend(index.creation_statements(current.table_name, current.fields, concurrently))
+
+        return statements
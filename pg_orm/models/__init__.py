@@ -1,5 +1,9 @@
 from .base_model import Model, AsyncModel
+from .database import deadline
 from .fields import *
+from .indexes import Index, GinIndex, BrinIndex, TrigramIndex
+from .partitioning import RangePartition, ListPartition, HashPartition
+from .views import MaterializedView, AsyncMaterializedView
 
 CASCADE = "CASCADE"
 NO_ACTION = "NO ACTION"
@@ -1,25 +1,34 @@
 import typing as t
-import pydoc
 from pathlib import Path
+import contextlib
 import logging
 import os
 import collections
 
-from pg_orm.errors import FiledError, DataBaseNotConfigured
-from pg_orm.models.fields import Field, AutoIncrementIntegerField
+from pg_orm.errors import FiledError, DataBaseNotConfigured, SchemaError, DBError
+from pg_orm.models.fields import Field, AutoIncrementIntegerField, BinaryField
 from pg_orm.models.manager import Manager, AsyncManager
 from pg_orm.models.query_generator import QueryGenerator
-from pg_orm.models.database import Psycopg2Driver, AsyncpgDriver
-from pg_orm.models.utils import maybe_await
+from pg_orm.models.database import Psycopg2Driver, AsyncpgDriver, PsycopgDriver, AsyncPsycopgDriver
+from pg_orm.models.partitioning import Partition
+from pg_orm.models.indexes import Index
+from pg_orm.models.deferred import DeferredGroup
+from pg_orm.models import binary, cache
+from pg_orm.models.write_behind import WriteBehindBuffer, AsyncWriteBehindBuffer
+from pg_orm.models.codecs import json_loads
+from pg_orm.models.utils import maybe_await, locate
 
 log = logging.getLogger(__name__)
+_MISSING = object()
 
 
 class ModelMeta(type):
     def __new__(cls, name, bases, attrs, **kwargs):
-        if BaseModel in bases:
+        if BaseModel in bases or kwargs.get("abstract"):
             return super().__new__(cls, name, bases, attrs)
 
+        is_view = any(getattr(base, "is_view", False) for base in bases)
+
         table_name = (
                 attrs.pop("__tablename__", None)
                 or attrs.pop("table_name", None)
@@ -39,14 +48,56 @@ class ModelMeta(type):
         if not model_fields:
             raise Exception("No fields specified")
 
-        if not any(field.primary_key for field in model_fields.values()):
+        if not is_view and not any(field.primary_key for field in model_fields.values()):
             id_field = AutoIncrementIntegerField()
             id_field.column_name = "id"
             model_fields["id"] = id_field
             model_fields.move_to_end("id", last=False)
 
+        for key, field in model_fields.items():
+            if field.deferred and field.primary_key:
+                raise SchemaError(f"The primary key '{key}' cannot be deferred.")
+            field.validate_model(model_fields)
+
+        partition_by = attrs.pop("__partition_by__", None) or kwargs.get("partition_by")
+        if partition_by is not None:
+            partition_by.validate(model_fields)
+
+        indexes = list(attrs.pop("__indexes__", None) or kwargs.get("indexes") or [])
+        for field in model_fields.values():
+            for index in field.default_indexes():
+                if not any(i.columns == index.columns for i in indexes):
+                    indexes.append(index)
+        for index in indexes:
+            index.validate(table_name, model_fields)
+
+        notify = attrs.pop("__notify__", None) or kwargs.get("notify") or False
+        if notify not in (False, True, "trigger"):
+            raise SchemaError("notify has to be True (the ORM notifies) or 'trigger' (a table trigger notifies).")
+
+        view_query = attrs.pop("__query__", None) or kwargs.get("query")
+        if is_view:
+            if not view_query:
+                raise SchemaError(f"The materialized view '{table_name}' needs a query.")
+            if partition_by is not None or notify:
+                raise SchemaError("Materialized views can't be partitioned or notify.")
+
+            view_query = view_query.strip().rstrip(";")
+            # The columns of a view have no constraints, REFRESH ... CONCURRENTLY needs a unique index instead
+            for key, field in model_fields.items():
+                if (field.primary_key or field.is_unique) and not any(
+                        i.unique and i.columns == [key] for i in indexes):
+                    index = Index(key, unique=True)
+                    index.validate(table_name, model_fields)
+                    indexes.append(index)
+
         attrs["table_name"] = table_name
+        attrs["notify"] = notify
+        attrs["notify_channel"] = f"{table_name}_changes"[:63]
         attrs["fields"] = model_fields
+        attrs["partition_by"] = partition_by
+        attrs["indexes"] = indexes
+        attrs["view_query"] = view_query if is_view else None
 
         new_class = super().__new__(cls, name, bases, attrs)
         new_class._query_gen = QueryGenerator(new_class)
@@ -61,10 +112,24 @@ class ModelMeta(type):
 
 
 class BaseModel:
-    db: t.Union[Psycopg2Driver, AsyncpgDriver, None] = None
+    db: t.Union[Psycopg2Driver, AsyncpgDriver, PsycopgDriver, AsyncPsycopgDriver, None] = None
     attrs: t.Dict[str, t.Any]
     fields: t.Dict[str, Field]
     table_name: str
+    partition_by: t.Optional[Partition] = None
+    indexes: t.List[Index] = []
+    # True sends a NOTIFY on notify_channel for every write made through the ORM, "trigger" creates a trigger
+    notify: t.Union[bool, str] = False
+    notify_channel: str
+    # The SELECT of a MaterializedView
+    is_view = False
+    view_query: t.Optional[str] = None
+    # The values of the fields assigned since the instance was loaded/saved, None while it isn't tracked
+    _original: t.Optional[t.Dict[str, t.Any]] = None
+    # Shared by the instances of a result set which was loaded without some columns
+    _deferred: t.Optional[DeferredGroup] = None
+    # The open write-behind buffer which save() goes through
+    _write_behind = None
 
     """Contains common method for Model and AsyncModel"""
     def __init__(self, **kwargs):
@@ -81,12 +146,119 @@ class BaseModel:
     def set_db(cls, db):
         cls.db = db
 
+    @classmethod
+    def _from_rows(cls, columns, rows, deferred=()) -> list:
+        """Builds instances from rows (tuples or asyncpg records) in the order of ``columns``.
+        The columns are checked once for the whole result set instead of once per row in __init__,
+        ``deferred`` are the fields left out of the query, they are loaded on first access"""
+        if cls.db is None:
+            raise DataBaseNotConfigured()
+
+        columns = tuple(columns)
+        for column in columns:
+            if column not in cls.fields:
+                raise FiledError(column, cls.fields.keys())
+
+        new = cls.__new__
+        set_attrs = object.__setattr__
+        instances = []
+        for row in rows:
+            instance = new(cls)
+            set_attrs(instance, "attrs", dict(zip(columns, row)))
+            set_attrs(instance, "_original", {})
+            instances.append(instance)
+
+        if deferred and instances:
+            group = DeferredGroup(cls, deferred)
+            group.instances = instances
+            for instance in instances:
+                set_attrs(instance, "_deferred", group)
+
+        return instances
+
+    def _prepare_insert(self):
+        """Validates the values and fills in the defaults of the unset fields"""
+        for key, value in self.attrs.items():
+            for validator in self.fields[key].validators:
+                maybe_await(validator(value))
+
+        all_fields = set(self.fields)
+        all_fields.discard("id")
+        unspecified_fields = set(all_fields) - set(self.attrs)
+        for field_name in unspecified_fields:
+            field = self.fields[field_name]
+            if field.default is not None:
+                self.attrs[field_name] = field._get_default_python_val()
+
+    def _mark_clean(self):
+        """Starts tracking the changes of the instance, called once it matches its row"""
+        object.__setattr__(self, "_original", {})
+
+    def get_dirty_fields(self) -> dict:
+        """Returns the fields changed since the instance was loaded or saved with their new values.
+        Every field except the id is dirty for an instance that wasn't loaded from the database.
+        Values mutated in place (a JsonField dict for example) are not detected, reassign them
+        or pass them to ``update(fields=...)``"""
+        attrs = self.attrs
+        original = self._original
+        if original is None:
+            return {k: v for k, v in attrs.items() if k != "id"}
+
+        return {
+            k: attrs[k] for k, old in original.items()
+            if k in attrs and attrs[k] is not old and attrs[k] != old
+        }
+
+    def _row_values(self) -> dict:
+        """The attrs with the partition key the row is stored with, update() and delete() find the row by it.
+        A key assigned since the row was loaded is replaced by its loaded value, or left out if it wasn't loaded"""
+        partitioning = self.partition_by
+        original = self._original
+        if partitioning is None or not original or partitioning.key not in original:
+            return self.attrs
+
+        values = dict(self.attrs)
+        stored = original[partitioning.key]
+        if stored is _MISSING:
+            del values[partitioning.key]
+        else:
+            values[partitioning.key] = stored
+        return values
+
+    def _get_update_fields(self, fields=None) -> list:
+        changed = list(self.get_dirty_fields())
+        for name in fields or ():
+            if name not in self.fields:
+                raise FiledError(name, self.fields.keys())
+            if name not in changed and name in self.attrs:
+                changed.append(name)
+
+        return [name for name in changed if not self.fields[name].generated]
+
+    def _get_binary_field(self, name):
+        field = self.fields.get(name)
+        if not isinstance(field, BinaryField):
+            raise FiledError(name, [k for k, f in self.fields.items() if isinstance(f, BinaryField)])
+        self._query_gen._check_id(self.attrs, "stream")
+        return field
+
+    def _forget(self, name):
+        """Drops a value which is out of date after it was written directly to the database"""
+        self.attrs.pop(name, None)
+        if self._original is not None:
+            self._original.pop(name, None)
+
     @classmethod
     def to_dict(cls):
         data = dict()
         data["name"] = cls.table_name
         data["path"] = cls.__module__ + "." + cls.__qualname__
         data["fields"] = [f.to_dict() for f in cls.fields.values()]
+        data["indexes"] = [i.to_dict() for i in cls.indexes]
+        if cls.notify:
+            data["notify"] = cls.notify
+        if cls.view_query is not None:
+            data["query"] = cls.view_query
         return data
 
     @classmethod
@@ -94,27 +266,39 @@ class BaseModel:
         path = data["path"]
         given = cls.__module__ + '.' + cls.__qualname__
         if given != path:
-            cls = pydoc.locate(path)
+            cls = locate(path)
             if cls is None:
                 raise RuntimeError('Could not locate "%s"' % path)
 
         self = cls()
         self.table_name = data["name"]
         self.fields = {field["column_name"]: Field.from_dict(field) for field in data["fields"]}
+        self.indexes = [Index.from_dict(index) for index in data.get("indexes", [])]
         return self
 
     @classmethod
     def _delete_migration_files(cls, directory="migrations"):
+        """Deletes the legacy json migration file of the model if there is one"""
         data_file = Path(os.path.join(directory, f"{cls.__name__}.json"))
 
         if not data_file.exists():
-            raise RuntimeError("Could not find the appropriate migrations files.")
+            return
 
         try:
             data_file.unlink()
         except Exception:
             raise RuntimeError("Could not delete migration files.")
 
+    @classmethod
+    def _get_ledger_deletion_queries(cls, asyncpg=False):
+        from pg_orm.migrations import ledger
+
+        return ledger.creation_query(), ledger.deletion_query(asyncpg), ledger.deletion_args(cls)
+
+    @classmethod
+    def _decode_change(cls, payload):
+        return json_loads(payload)
+
     def __repr__(self):
         return "<%s: %s>" % (
             type(self).__name__,
@@ -128,7 +312,10 @@ class BaseModel:
         return isinstance(other, self.__class__) and self.id == other.id
 
     def __setattr__(self, name, value):
-        if name in self.fields.keys():
+        if name in self.fields:
+            original = self._original
+            if original is not None and name not in original:
+                original[name] = self.attrs.get(name, _MISSING)
             self.attrs[name] = value
         else:
             super().__setattr__(name, value)
@@ -137,8 +324,15 @@ class BaseModel:
         attrs = super().__getattribute__("attrs")
         if item in attrs:
             return attrs[item]
-        else:
-            return super().__getattribute__(item)
+
+        value = super().__getattribute__(item)
+        if isinstance(value, Field):
+            # A field which isn't in attrs, load it if it was deferred
+            group = super().__getattribute__("_deferred")
+            if group is not None and item in group.names:
+                return group.get(self, item)
+
+        return value
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -156,42 +350,153 @@ class Model(BaseModel, metaclass=ModelMeta):
         """Creates the table for the model"""
         log.info(f"Creating table '{cls.table_name}'")
         cls.db.execute(cls._query_gen.generate_table_creation_query())
+        cls.maintain_partitions()
+
+        for statement in cls._query_gen.generate_index_creation_queries():
+            cls.db.execute(statement)
+
+        if cls.notify == "trigger":
+            for statement in cls._query_gen.generate_notify_trigger_queries():
+                cls.db.execute(statement)
+
+    @classmethod
+    @contextlib.contextmanager
+    def _change_feed(cls, operation: str, data: dict):
+        """Runs a write and its NOTIFY in one transaction when notify=True,
+        the notification is only delivered if the transaction commits.
+        The cached results of the table (see Manager.cached) are invalidated after the write
+        and again once the transaction it ran in committed"""
+        try:
+            if cls.notify is not True:
+                yield
+                return
+
+            with cls.db.transaction():
+                yield
+                query, args = cls._query_gen.generate_notify_query(operation, data)
+                cls.db.execute(query, *args)
+        finally:
+            cache.invalidate_after_commit(cls.db, cls.table_name)
+
+    @classmethod
+    def listen(cls, timeout: t.Optional[float] = None) -> t.Iterator[dict]:
+        """Yields the changes of the table ({"table", "op", "id"}) as they are committed, the model has to
+        use notify. The iteration stops once no change arrived for ``timeout`` seconds (never by default).
+        A connection of the pool is held while iterating."""
+        for payload in cls.db.listen(cls.notify_channel, timeout):
+            yield cls._decode_change(payload)
+
+    @classmethod
+    def write_behind(cls, max_rows: int = 1000, flush_interval: float = 1.0, max_pending: int = 10000,
+                     **options) -> WriteBehindBuffer:
+        """Makes save() collect the new rows in memory, a background thread writes them in batches
+        once max_rows are pending or every flush_interval seconds. The saved instances don't get their id.
+        Returns the buffer, close() it (it is also closed at exit) to write the rest and go back to direct saves"""
+        if cls._write_behind is not None:
+            raise DBError(f"{cls.__name__} already has an open write-behind buffer.")
+
+        cls._write_behind = WriteBehindBuffer(
+            cls, max_rows=max_rows, flush_interval=flush_interval, max_pending=max_pending, **options
+        )
+        return cls._write_behind
+
+    @classmethod
+    def maintain_partitions(cls, now=None):
+        """Creates the upcoming partitions of a partitioned model and detaches/drops the expired ones"""
+        if cls.partition_by is None:
+            return
+
+        for statement in cls._query_gen.generate_partition_creation_queries(now):
+            cls.db.execute(statement)
+
+        existing = [row["relname"] for row in
+                    cls.db.fetchall(cls._query_gen.generate_partition_list_query(), cls.table_name)]
+        for statement in cls._query_gen.generate_partition_expiry_queries(existing, now):
+            log.info(f"Expiring partition of '{cls.table_name}': {statement}")
+            cls.db.execute(statement)
+        cache.invalidate_after_commit(cls.db, cls.table_name)
 
     @classmethod
     def drop(cls, directory="migrations", delete_migration_files: bool = True):
-        """Drops the table and deletes the data files"""
-        if delete_migration_files:
-            cls._delete_migration_files(directory)
+        """Drops the table and removes it from the migration ledger"""
+        with cls.db.transaction():
+            if delete_migration_files:
+                cls._delete_migration_files(directory)
+                creation_query, deletion_query, args = cls._get_ledger_deletion_queries()
+                cls.db.execute(creation_query)
+                cls.db.execute(deletion_query, *args)
 
-        cls.db.execute(f"DROP TABLE {cls.table_name} CASCADE;")
+            cls.db.execute(cls._query_gen.generate_drop_query())
+        cache.invalidate_after_commit(cls.db, cls.table_name)
 
     def save(self, commit: bool = True):
-        """Saves the current model instance to the database"""
-        for key, value in self.attrs.items():
-            for validator in self.fields[key].validators:
-                maybe_await(validator(value))
-
-        all_fields = set(self.fields)
-        all_fields.discard("id")
-        unspecified_fields = set(all_fields) - set(self.attrs)
-        for field_name in unspecified_fields:
-            field = self.fields[field_name]
-            if field.default is not None:
-                self.attrs[field_name] = field._get_default_python_val()
+        """Saves the current model instance to the database,
+        through the write-behind buffer of the model when one is open (see write_behind)"""
+        self._prepare_insert()
+        if self._write_behind is not None:
+            self._write_behind.save(self)
+            return
 
         query, values = self._query_gen.generate_insert_query(**self.attrs, return_inserted=True)
-        data = self.db.fetchone(query, *values, commit=commit)
-        self.attrs.update(**data)
+        with self._change_feed("insert", self.attrs):
+            data = self.db.fetchone(query, *values, commit=commit)
+            self.attrs.update(**data)
+        self._mark_clean()
+
+    def load_deferred(self, *names: str):
+        """Loads the deferred fields (all of them by default) of the instance and the rest of its result set"""
+        if self._deferred is not None:
+            self._deferred.load(names)
+
+    def iter_binary(self, name: str, chunk_size: int = binary.CHUNK_SIZE) -> t.Iterator[bytes]:
+        """Yields the value of a BinaryField in chunks read with substring(), one query per chunk.
+        Defer the field so the whole value isn't loaded with the row."""
+        query, key_args = self._query_gen.generate_binary_read_query(
+            self._get_binary_field(name).column_name, row=self._row_values()
+        )
+        offset = 1
+        while True:
+            chunk = self.db.fetchval(query, offset, chunk_size, *key_args, self.id)
+            if chunk is None:
+                return
+            if chunk:
+                yield bytes(chunk)
+            if len(chunk) < chunk_size:
+                return
+            offset += chunk_size
+
+    def write_binary(self, name: str, source, chunk_size: int = binary.CHUNK_SIZE):
+        """Writes a BinaryField from bytes, a memoryview or a file like object without holding a second copy,
+        the chunks are sent one by one and concatenated by the server in a single UPDATE"""
+        (create, insert, update, clear), key_args = self._query_gen.generate_binary_write_queries(
+            self._get_binary_field(name).column_name, row=self._row_values()
+        )
+        with self.db.transaction(), self._change_feed("update", self.attrs):
+            self.db.execute(create)
+            for position, chunk in enumerate(binary.iter_chunks(source, chunk_size)):
+                self.db.execute(insert, position, chunk)
+            self.db.execute(update, *key_args, self.id)
+            self.db.execute(clear)
+
+        self._forget(name)
 
     def delete(self, commit: bool = True):
         """Deletes the current model instance from the database"""
-        query, id = self._query_gen.generate_row_deletion_query(**self.attrs)
-        self.db.execute(query, id, commit=commit)
+        query, args = self._query_gen.generate_row_deletion_query(**self._row_values())
+        with self._change_feed("delete", self.attrs):
+            self.db.execute(query, *args, commit=commit)
+
+    def update(self, commit: bool = True, fields: t.Optional[t.Iterable[str]] = None):
+        """Writes the changed fields of the instance to the database, nothing is sent if no field changed.
+        ``fields`` are written even when they don't look changed"""
+        changed = self._get_update_fields(fields)
+        if not changed:
+            return
 
-    def update(self, commit: bool = True):
-        """Updates the model instace in the database with the current instance"""
-        query, args, id = self._query_gen.generate_update_query(**self.attrs)
-        self.db.execute(query, *args, id, commit=commit)
+        query, args, id = self._query_gen.generate_update_query(fields=changed, row=self._row_values(), **self.attrs)
+        with self._change_feed("update", self.attrs):
+            self.db.execute(query, *args, id, commit=commit)
+        self._mark_clean()
 
 
 class AsyncModel(BaseModel, metaclass=ModelMeta):
@@ -207,39 +512,153 @@ class AsyncModel(BaseModel, metaclass=ModelMeta):
         """Creates the table for the model if it doesn't exist"""
         log.info(f"Creating table for Model '{cls.table_name}'")
         await cls.db.execute(cls._query_gen.generate_table_creation_query())
+        await cls.maintain_partitions()
+
+        for statement in cls._query_gen.generate_index_creation_queries():
+            await cls.db.execute(statement)
+
+        if cls.notify == "trigger":
+            for statement in cls._query_gen.generate_notify_trigger_queries():
+                await cls.db.execute(statement)
 
     @classmethod
-    async def drop(cls, directory="migrations", delete_migration_files: bool = True):
-        """Drops the table and deletes the data files"""
-        if delete_migration_files:
-            cls._delete_migration_files(directory)
+    @contextlib.asynccontextmanager
+    async def _change_feed(cls, operation: str, data: dict):
+        """Runs a write and its NOTIFY in one transaction when notify=True,
+        the notification is only delivered if the transaction commits.
+        The cached results of the table (see Manager.cached) are invalidated after the write
+        and again once the transaction it ran in committed"""
+        try:
+            if cls.notify is not True:
+                yield
+                return
 
-        await cls.db.execute(f"DROP TABLE {cls.table_name} CASCADE;")
+            async with cls.db.transaction():
+                yield
+                query, args = cls._query_gen.generate_notify_query(operation, data, True)
+                await cls.db.execute(query, *args)
+        finally:
+            cache.invalidate_after_commit(cls.db, cls.table_name)
 
-    async def save(self):
-        """Saves the current model instance"""
-        for key, value in self.attrs.items():
-            for validator in self.fields[key].validators:
-                maybe_await(validator(value))
+    @classmethod
+    async def listen(cls) -> t.AsyncIterator[dict]:
+        """Yields the changes of the table ({"table", "op", "id"}) as they are committed, the model has to
+        use notify. A connection of the pool is held while iterating."""
+        async for payload in cls.db.listen(cls.notify_channel):
+            yield cls._decode_change(payload)
 
-        all_fields = set(self.fields)
-        all_fields.discard("id")
-        unspecified_fields = set(all_fields) - set(self.attrs)
-        for field_name in unspecified_fields:
-            field = self.fields[field_name]
-            if field.default is not None:
-                self.attrs[field_name] = field._get_default_python_val()
+    @classmethod
+    def write_behind(cls, max_rows: int = 1000, flush_interval: float = 1.0, max_pending: int = 10000,
+                     **options) -> AsyncWriteBehindBuffer:
+        """Makes save() collect the new rows in memory, a task of the running event loop writes them in batches
+        once max_rows are pending or every flush_interval seconds. The saved instances don't get their id.
+        Returns the buffer, await close() on shutdown to write the rest and go back to direct saves"""
+        if cls._write_behind is not None:
+            raise DBError(f"{cls.__name__} already has an open write-behind buffer.")
+
+        cls._write_behind = AsyncWriteBehindBuffer(
+            cls, max_rows=max_rows, flush_interval=flush_interval, max_pending=max_pending, **options
+        )
+        return cls._write_behind
+
+    @classmethod
+    async def maintain_partitions(cls, now=None):
+        """Creates the upcoming partitions of a partitioned model and detaches/drops the expired ones"""
+        if cls.partition_by is None:
+            return
 
-        query, values = self._query_gen.generate_insert_query(asyncpg=True, **self.attrs)
+        for statement in cls._query_gen.generate_partition_creation_queries(now):
+            await cls.db.execute(statement)
 
-        await self.db.execute(query, *values)
+        existing = [row["relname"] for row in
+                    await cls.db.fetch(cls._query_gen.generate_partition_list_query(True), cls.table_name)]
+        for statement in cls._query_gen.generate_partition_expiry_queries(existing, now):
+            log.info(f"Expiring partition of '{cls.table_name}': {statement}")
+            await cls.db.execute(statement)
+        cache.invalidate_after_commit(cls.db, cls.table_name)
+
+    @classmethod
+    async def drop(cls, directory="migrations", delete_migration_files: bool = True):
+        """Drops the table and removes it from the migration ledger"""
+        async with cls.db.transaction():
+            if delete_migration_files:
+                cls._delete_migration_files(directory)
+                creation_query, deletion_query, args = cls._get_ledger_deletion_queries(True)
+                await cls.db.execute(creation_query)
+                await cls.db.execute(deletion_query, *args)
+
+            await cls.db.execute(cls._query_gen.generate_drop_query())
+        cache.invalidate_after_commit(cls.db, cls.table_name)
+
+    async def save(self):
+        """Saves the current model instance,
+        through the write-behind buffer of the model when one is open (see write_behind)"""
+        self._prepare_insert()
+        if self._write_behind is not None:
+            await self._write_behind.save(self)
+            return
+
+        query, values = self._query_gen.generate_insert_query(asyncpg=True, return_inserted=True, **self.attrs)
+        async with self._change_feed("insert", self.attrs):
+            data = await self.db.fetchrow(query, *values)
+            self.attrs.update(**data)
+        self._mark_clean()
+
+    async def load_deferred(self, *names: str):
+        """Loads the deferred fields (all of them by default) of the instance and the rest of its result set"""
+        if self._deferred is not None:
+            await self._deferred.async_load(names)
+
+    async def iter_binary(self, name: str, chunk_size: int = binary.CHUNK_SIZE) -> t.AsyncIterator[bytes]:
+        """Yields the value of a BinaryField in chunks read with substring(), one query per chunk.
+        Defer the field so the whole value isn't loaded with the row."""
+        query, key_args = self._query_gen.generate_binary_read_query(
+            self._get_binary_field(name).column_name, True, row=self._row_values()
+        )
+        offset = 1
+        while True:
+            chunk = await self.db.fetchval(query, offset, chunk_size, *key_args, self.id)
+            if chunk is None:
+                return
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            offset += chunk_size
+
+    async def write_binary(self, name: str, source, chunk_size: int = binary.CHUNK_SIZE):
+        """Writes a BinaryField from bytes, a memoryview, a file like object or an async iterable of bytes,
+        the chunks are sent one by one and concatenated by the server in a single UPDATE"""
+        (create, insert, update, clear), key_args = self._query_gen.generate_binary_write_queries(
+            self._get_binary_field(name).column_name, True, row=self._row_values()
+        )
+        async with self.db.transaction(), self._change_feed("update", self.attrs):
+            await self.db.execute(create)
+            position = 0
+            async for chunk in binary.aiter_chunks(source, chunk_size):
+                await self.db.execute(insert, position, chunk)
+                position += 1
+            await self.db.execute(update, *key_args, self.id)
+            await self.db.execute(clear)
+
+        self._forget(name)
 
     async def delete(self):
         """Deletes the current model instance"""
-        query, id = self._query_gen.generate_row_deletion_query(True, **self.attrs)
-        await self.db.execute(query, id)
-
-    async def update(self):
-        """Updates the model instace in the database with the current instance"""
-        query, args, id = self._query_gen.generate_update_query(True, **self.attrs)
-        await self.db.execute(query, *args, id)
+        query, args = self._query_gen.generate_row_deletion_query(True, **self._row_values())
+        async with self._change_feed("delete", self.attrs):
+            await self.db.execute(query, *args)
+
+    async def update(self, fields: t.Optional[t.Iterable[str]] = None):
+        """Writes the changed fields of the instance to the database, nothing is sent if no field changed.
+        ``fields`` are written even when they don't look changed"""
+        changed = self._get_update_fields(fields)
+        if not changed:
+            return
+
+        query, args, id = self._query_gen.generate_update_query(
+            True, fields=changed, row=self._row_values(), **self.attrs
+        )
+        async with self._change_feed("update", self.attrs):
+            await self.db.execute(query, *args, id)
+        self._mark_clean()
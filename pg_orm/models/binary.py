@@ -0,0 +1,49 @@
+"""Chunking of large BinaryField values, see Model.iter_binary and Model.write_binary"""
+
+CHUNK_SIZE = 1024 * 1024
+
+# Chunks are collected in a temporary table and concatenated by the server in one UPDATE,
+# appending to the column chunk by chunk would rewrite the whole value for every chunk
+CHUNK_TABLE = "pg_orm_binary_chunks"
+
+
+def iter_chunks(source, chunk_size: int = CHUNK_SIZE):
+    """Splits a bytes like object or a file like object (anything with read(size)) into chunks.
+    bytes, bytearray and memoryview are sliced through a memoryview so nothing is copied."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source).cast("B")
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+        return
+
+    read = getattr(source, "read", None)
+    if read is None:
+        raise TypeError(f"Cannot write {type(source).__name__!r}, pass bytes, a memoryview or a file like object.")
+
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def aiter_chunks(source, chunk_size: int = CHUNK_SIZE):
+    """iter_chunks which also takes async iterables of bytes and file like objects with an async read()"""
+    import inspect
+
+    if hasattr(source, "__aiter__"):
+        async for chunk in source:
+            if chunk:
+                yield chunk
+        return
+
+    read = getattr(source, "read", None)
+    if read is not None and inspect.iscoroutinefunction(read):
+        while True:
+            chunk = await read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    for chunk in iter_chunks(source, chunk_size):
+        yield chunk
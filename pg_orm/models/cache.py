@@ -0,0 +1,137 @@
+"""Opt-in cache of query results, see Manager.cached"""
+import collections
+import copy
+import threading
+import time
+
+# The version of every table written through this process, bumped by every write of a Model/Manager.
+# Entries cached at an older version are stale, writes of other processes are only bounded by the ttl.
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def table_version(table: str) -> int:
+    return _versions.get(table, 0)
+
+
+def invalidate(table: str):
+    """Makes every cached result of the table stale"""
+    with _versions_lock:
+        _versions[table] = _versions.get(table, 0) + 1
+
+
+def invalidate_after_commit(db, table: str):
+    """Invalidates the table now and again once the transaction of the context ended (see the after_transaction
+    of the drivers). Until the commit the other connections read the old rows, which would otherwise be cached
+    at the new version and stay stale, the first bump keeps the writing transaction from reading its old results"""
+    invalidate(table)
+    after_transaction = getattr(db, "after_transaction", None)
+    if after_transaction is not None:
+        after_transaction(lambda: invalidate(table))
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+_MUTABLE = (dict, list, set, bytearray)
+
+
+def _copy_rows(result):
+    """Copies the mutable values (json objects, arrays) of a (columns, rows) result, so instances built from
+    the rows can be changed in place without changing the cached result. Rows without one are shared"""
+    columns, rows = result
+    copied = []
+    for row in rows:
+        if any(isinstance(value, _MUTABLE) for value in row):
+            row = tuple(copy.deepcopy(value) if isinstance(value, _MUTABLE) else value for value in row)
+        copied.append(row)
+    return columns, copied
+
+
+class QueryCache:
+    """LRU cache of result sets keyed by their SQL and parameters, the rows are cached and
+    fresh instances are built from them on every hit. The mutable values of the rows are copied
+    when they are stored and on every hit, changing an instance in place never changes the cache.
+
+    An entry is dropped once it is ``ttl`` seconds old (never when None), once the version of its table
+    changes or when it is the least recently used one of a full cache. Thread safe.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.stale = 0
+
+    @staticmethod
+    def key(table: str, query: str, args) -> tuple:
+        """The key of a query, None when its parameters can't be hashed and it isn't cached"""
+        key = (table, query, _freeze(args))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        """Returns a copy of the cached (columns, rows) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            version, expires, rows = entry
+            if version != table_version(key[0]) or (expires is not None and expires <= time.monotonic()):
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _copy_rows(rows)
+
+    def set(self, key, rows, version: int, ttl: float = None):
+        """Caches the (columns, rows) read at ``version`` of the table (read it before running the query)"""
+        ttl = self.ttl if ttl is None else ttl
+        rows = _copy_rows(rows)
+        with self._lock:
+            self._entries[key] = (version, None if ttl is None else time.monotonic() + ttl, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+default_cache = QueryCache()
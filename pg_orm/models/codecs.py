@@ -0,0 +1,81 @@
+"""JSON encoding/decoding used by the drivers, the JSON library can be replaced with a faster one"""
+from typing import Any, Callable, Optional, Tuple
+
+_library: Optional[Tuple[Callable[[Any], str], Callable[[Any], Any]]] = None
+
+
+def _default_library():
+    try:
+        import orjson
+    except ImportError:
+        import json
+
+        return json.dumps, json.loads
+
+    return (lambda value: orjson.dumps(value).decode("utf-8")), orjson.loads
+
+
+def set_json_library(dumps: Callable[[Any], str], loads: Callable[[Any], Any]):
+    """Sets the functions used to encode and decode JSON, call it before init_db and before the pools are created.
+    By default orjson is used when it is installed and the standard json module otherwise."""
+    global _library
+    _library = (dumps, loads)
+
+
+def get_json_library():
+    global _library
+    if _library is None:
+        _library = _default_library()
+    return _library
+
+
+def json_dumps(value) -> str:
+    return get_json_library()[0](value)
+
+
+def json_loads(value):
+    return get_json_library()[1](value)
+
+
+def register_psycopg2():
+    """Makes psycopg2 encode dicts as JSON and decode json/jsonb columns with the configured library.
+    The dict adapter and the loaders are global, they replace the ones of every psycopg2 connection of the process"""
+    from psycopg2.extensions import register_adapter
+    from psycopg2.extras import Json, register_default_json, register_default_jsonb
+
+    dumps, loads = get_json_library()
+    register_adapter(dict, lambda value: Json(value, dumps=dumps))
+    register_default_json(loads=loads, globally=True)
+    register_default_jsonb(loads=loads, globally=True)
+
+
+def register_psycopg():
+    """Makes psycopg 3 send dicts as JSON and decode json/jsonb columns with the configured library.
+    It changes the global adapters of psycopg, connections created afterwards use them"""
+    import psycopg
+    from psycopg.adapt import Dumper
+    from psycopg.types.json import set_json_dumps, set_json_loads
+
+    dumps, loads = get_json_library()
+
+    class DictDumper(Dumper):
+        # Sent as unknown like the Json adapter of psycopg2, the server casts it to json or jsonb
+        oid = 0
+
+        def dump(self, obj):
+            data = dumps(obj)
+            return data.encode("utf-8") if isinstance(data, str) else data
+
+    psycopg.adapters.register_dumper(dict, DictDumper)
+    set_json_dumps(dumps)
+    set_json_loads(loads)
+
+
+async def register_asyncpg_codecs(connection):
+    """Registers the json/jsonb codecs on an asyncpg connection, pass it as the init of the pool:
+
+    pool = await asyncpg.create_pool(URI, init=register_asyncpg_codecs)
+    """
+    dumps, loads = get_json_library()
+    for type_name in ("json", "jsonb"):
+        await connection.set_type_codec(type_name, encoder=dumps, decoder=loads, schema="pg_catalog")
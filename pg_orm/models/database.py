@@ -1,8 +1,82 @@
+import contextlib
+import contextvars
+import re
+import time
+import typing as t
 from abc import ABC, abstractmethod
 
-from psycopg2 import pool
-import asyncpg
+from pg_orm.errors import LockTimeout, QueryTimeout
 
+if t.TYPE_CHECKING:
+    # The drivers are only imported by the application which creates the pool
+    from psycopg2 import pool
+    import asyncpg
+    import psycopg_pool
+
+# Callables which are called with every statement sent through the drivers, see pg_orm.debug
+_query_listeners: contextvars.ContextVar[tuple] = contextvars.ContextVar("pg_orm_query_listeners", default=())
+
+
+def add_query_listener(listener) -> contextvars.Token:
+    return _query_listeners.set(_query_listeners.get() + (listener,))
+
+
+def remove_query_listener(token: contextvars.Token):
+    _query_listeners.reset(token)
+
+
+def _notify(query):
+    for listener in _query_listeners.get():
+        listener(query)
+
+
+# The time.monotonic() by which the queries of the current context have to finish, see deadline
+_deadline: contextvars.ContextVar[t.Optional[float]] = contextvars.ContextVar("pg_orm_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(timeout: t.Optional[float]):
+    """Every query sent through the drivers inside the block has to finish within ``timeout`` seconds
+    from entering it, otherwise it is cancelled and QueryTimeout is raised.
+    Nested blocks (and the timeout of managers) can only shorten the deadline, None leaves it as is."""
+    if timeout is None:
+        yield
+        return
+
+    new = time.monotonic() + timeout
+    current = _deadline.get()
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining() -> t.Optional[float]:
+    """The seconds left until the deadline of the context, None when there is no deadline"""
+    end = _deadline.get()
+    if end is None:
+        return None
+
+    remaining = end - time.monotonic()
+    if remaining <= 0:
+        raise QueryTimeout("The deadline passed before the query was sent.")
+    return remaining
+
+
+def _sqlstate(error):
+    # psycopg2 exposes the error code as pgcode, asyncpg and psycopg as sqlstate
+    return getattr(error, "pgcode", None) or getattr(error, "sqlstate", None)
+
+
+def _lock_timeout(timeout: t.Optional[float]) -> str:
+    """The lock_timeout setting of a timeout in seconds, 0 waits forever"""
+    return "0" if timeout is None else f"{max(int(timeout * 1000), 1)}ms"
+
+
+def _check_lock_timeout(error, key, timeout):
+    if _sqlstate(error) == "55P03":  # lock_not_available
+        raise LockTimeout(f"The advisory lock {key} wasn't acquired within {timeout}s.") from error
 
 
 class DatabaseDriver(ABC):
@@ -23,84 +97,877 @@ class DatabaseDriver(ABC):
         pass
 
 class Psycopg2Driver:
-    def __init__(self, pool: pool.AbstractConnectionPool):
+    def __init__(self, pool: "pool.AbstractConnectionPool"):
         self.pool = pool
+        # The connection of the transaction which is open in the current context
+        self._transaction = contextvars.ContextVar(f"psycopg2_transaction_{id(self)}", default=None)
+        # The transactions (connection ids) in which a deadline set statement_timeout
+        self._local_timeouts = set()
+        # The callbacks of after_transaction by the id of the connection of their transaction
+        self._after_transaction = {}
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Runs every query made through the driver inside the block in one transaction.
+        Nested blocks join the outer transaction."""
+        conn = self._transaction.get()
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self.pool.getconn()
+        token = self._transaction.set(conn)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._transaction.reset(token)
+            self._local_timeouts.discard(id(conn))
+            callbacks = self._after_transaction.pop(id(conn), ())
+            self.pool.putconn(conn)
+            for callback in callbacks:
+                callback()
+
+    def in_transaction(self) -> bool:
+        """True inside transaction(), where the locks taken by select_for_update() are held"""
+        return self._transaction.get() is not None
+
+    def after_transaction(self, callback):
+        """Calls callback once the transaction of the current context ended (committed or rolled back),
+        right away outside of transaction()"""
+        conn = self._transaction.get()
+        if conn is None:
+            return callback()
+        self._after_transaction.setdefault(id(conn), []).append(callback)
 
-    def execute(self, query, *args, commit=True):
-        with self.pool.getconn() as conn:
+    @contextlib.contextmanager
+    def _connection(self, autocommit=False):
+        """Yields the connection of the current transaction or a connection from the pool"""
+        conn = self._transaction.get()
+        if conn is not None and not autocommit:
+            yield conn, False
+            return
+
+        conn = self.pool.getconn()
+        # autocommit is needed by statements which can't run in a transaction block
+        # like CREATE INDEX CONCURRENTLY
+        if autocommit:
+            conn.autocommit = True
+        try:
+            yield conn, True
+            if not autocommit:
+                conn.commit()
+        except BaseException:
+            if not autocommit:
+                conn.rollback()
+            raise
+        finally:
+            if autocommit:
+                conn.autocommit = False
+            self.pool.putconn(conn)
+
+    def _run(self, conn, cursor, query, args, owned=True):
+        """Executes a statement, a deadline of the context (see deadline) is enforced with statement_timeout"""
+        _notify(query)
+        remaining = _remaining()
+        if remaining is None:
+            if not owned and id(conn) in self._local_timeouts:
+                # The transaction outlived the deadline which set its timeout
+                self._local_timeouts.discard(id(conn))
+                query = "SET LOCAL statement_timeout TO DEFAULT; " + query
+            cursor.execute(query, args)
+            return
+
+        timeout = f"{max(int(remaining * 1000), 1)}ms"
+        try:
+            if conn.autocommit:
+                # Statements like CREATE INDEX CONCURRENTLY can't share their query string
+                cursor.execute("SET statement_timeout = %s", (timeout,))
+                try:
+                    cursor.execute(query, args)
+                finally:
+                    cursor.execute("RESET statement_timeout")
+            else:
+                if not owned:
+                    self._local_timeouts.add(id(conn))
+                # Lasts until the end of the transaction and costs no extra round trip
+                cursor.execute("SELECT set_config('statement_timeout', %s, true); " + query, (timeout,) + args)
+        except Exception as e:
+            if getattr(e, "pgcode", None) == "57014":  # query_canceled
+                raise QueryTimeout(f"The query was cancelled after {timeout}.") from e
+            raise
+
+    def execute(self, query, *args, commit=True, autocommit=False):
+        with self._connection(autocommit) as (conn, owned):
             with conn.cursor() as cursor:
-                cursor.execute(query, args)
-                if commit:
+                self._run(conn, cursor, query, args, owned)
+                if commit and owned and not autocommit:
                     conn.commit()
-                self.pool.putconn(conn)
 
     def fetchall(self, query, *args):
         query_set = []
-        with self.pool.getconn() as conn:
+        with self._connection() as (conn, owned):
             with conn.cursor() as cursor:
-                cursor.execute(query, args)
+                self._run(conn, cursor, query, args, owned)
                 result = cursor.fetchall()
                 if result:
                     column_names = [desc[0] for desc in cursor.description]
                     query_set = [dict(zip(column_names, row)) for row in result]
 
-                self.pool.putconn(conn)
-
         return query_set
 
+    def fetch_rows(self, query, *args):
+        """Returns the column names and the rows as tuples, without building a dict per row"""
+        with self._connection() as (conn, owned):
+            with conn.cursor() as cursor:
+                self._run(conn, cursor, query, args, owned)
+                rows = cursor.fetchall()
+                columns = tuple(desc[0] for desc in cursor.description) if cursor.description else ()
+
+        return columns, rows
+
     def fetchone(self, query, *args, commit=False):
         query_set = {}
-        with self.pool.getconn() as conn:
+        with self._connection() as (conn, owned):
             with conn.cursor() as cursor:
-                cursor.execute(query, args)
-                if commit:
-                    conn.commit()
+                self._run(conn, cursor, query, args, owned)
                 result = cursor.fetchone()
+                if commit and owned:
+                    conn.commit()
                 if result:
                     column_names = [desc[0] for desc in cursor.description]
                     query_set = dict(zip(column_names, result))
-                self.pool.putconn(conn)
 
         return query_set
 
-    
     def fetchval(self, query, *args, commit=False):
-        query_set = {}
-        with self.pool.getconn() as conn:
+        with self._connection() as (conn, owned):
             with conn.cursor() as cursor:
-                cursor.execute(query, args)
-                if commit:
-                    conn.commit()
+                self._run(conn, cursor, query, args, owned)
                 result = cursor.fetchone()
-                if result:
-                    column_names = [desc[0] for desc in cursor.description]
-                    query_set = dict(zip(column_names, result))
-                self.pool.putconn(conn)
+                if commit and owned:
+                    conn.commit()
 
-        return query_set
+        return result[0] if result else None
 
+    @contextlib.contextmanager
+    def advisory_lock(self, key: int, timeout: t.Optional[float] = None, wait: bool = True):
+        """Holds the session level advisory lock ``key`` on a connection of its own while the block runs.
+        Yields whether it was acquired: wait=False doesn't wait when another session holds it,
+        otherwise LockTimeout is raised when it wasn't acquired within ``timeout`` seconds (never by default)"""
+        conn = self.pool.getconn()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                _notify(f"SELECT pg_advisory_lock({key});")
+                if wait:
+                    cursor.execute("SELECT set_config('lock_timeout', %s, false)", (_lock_timeout(timeout),))
+                    try:
+                        cursor.execute("SELECT pg_advisory_lock(%s)", (key,))
+                    except Exception as e:
+                        _check_lock_timeout(e, key, timeout)
+                        raise
+                    finally:
+                        cursor.execute("RESET lock_timeout")
+                    acquired = True
+                else:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+                    acquired = cursor.fetchone()[0]
+
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_advisory_unlock(%s)", (key,))
+        finally:
+            conn.autocommit = False
+            self.pool.putconn(conn)
+
+    def listen(self, channel: str, timeout: t.Optional[float] = None) -> t.Iterator[str]:
+        """Yields the payloads of the notifications sent to a channel, waiting for them with select().
+        Stops once nothing arrived for ``timeout`` seconds, a connection of the pool is held until then."""
+        import select
+        import time
+
+        conn = self.pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                _notify(f"LISTEN {channel};")
+                cursor.execute(f"LISTEN {channel};")
+
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+                if select.select([conn], [], [], wait) == ([], [], []):
+                    return
+
+                conn.poll()
+                while conn.notifies:
+                    yield conn.notifies.pop(0).payload
+                if deadline is not None:
+                    deadline = time.monotonic() + timeout
+        finally:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"UNLISTEN {channel};")
+            finally:
+                conn.autocommit = False
+                self.pool.putconn(conn)
 
 
 class AsyncpgDriver:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: "asyncpg.Pool"):
+        self.pool = pool
+        # The connection of the transaction which is open in the current task
+        self._transaction = contextvars.ContextVar(f"asyncpg_transaction_{id(self)}", default=None)
+        # The callbacks of after_transaction by the id of the connection of their transaction
+        self._after_transaction = {}
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Runs every query made through the driver inside the block in one transaction.
+        Nested blocks join the outer transaction."""
+        conn = self._transaction.get()
+        if conn is not None:
+            yield conn
+            return
+
+        callbacks = ()
+        try:
+            async with self.pool.acquire(timeout=_remaining()) as conn:
+                async with conn.transaction():
+                    token = self._transaction.set(conn)
+                    try:
+                        yield conn
+                    finally:
+                        self._transaction.reset(token)
+                        callbacks = self._after_transaction.pop(id(conn), ())
+        finally:
+            # Called once the transaction block committed or rolled back
+            for callback in callbacks:
+                callback()
+
+    def in_transaction(self) -> bool:
+        """True inside transaction(), where the locks taken by select_for_update() are held"""
+        return self._transaction.get() is not None
+
+    def after_transaction(self, callback):
+        """Calls callback once the transaction of the current context ended (committed or rolled back),
+        right away outside of transaction()"""
+        conn = self._transaction.get()
+        if conn is None:
+            return callback()
+        self._after_transaction.setdefault(id(conn), []).append(callback)
+
+    @property
+    def _executor(self):
+        """The connection of the current transaction or the pool"""
+        return self._transaction.get() or self.pool
+
+    async def _run(self, method, query, args, executor=None):
+        """Runs a statement, a deadline of the context (see deadline) is passed on as the timeout of asyncpg"""
+        _notify(query)
+        executor = executor or self._executor
+        remaining = _remaining()
+        if remaining is None:
+            return await getattr(executor, method)(query, *args)
+
+        import asyncio
+
+        try:
+            return await getattr(executor, method)(query, *args, timeout=remaining)
+        except asyncio.TimeoutError as e:
+            raise QueryTimeout(f"The query did not finish within {remaining:.3f}s.") from e
+
+    async def execute(self, query, *args, autocommit=False):
+        """autocommit runs the statement on a connection of the pool outside of the transaction of the context,
+        it is needed by statements which can't run in a transaction block like CREATE INDEX CONCURRENTLY"""
+        return await self._run("execute", query, args, self.pool if autocommit else None)
+
+    async def fetch(self, query, *args):
+        return await self._run("fetch", query, args)
+
+    async def fetch_rows(self, query, *args):
+        """Returns the column names and the records, which are read by position like tuples"""
+        records = await self.fetch(query, *args)
+        return (tuple(records[0].keys()) if records else ()), records
+
+    async def fetchrow(self, query, *args):
+        return await self._run("fetchrow", query, args)
+
+    async def fetchval(self, query, *args):
+        return await self._run("fetchval", query, args)
+
+    @contextlib.asynccontextmanager
+    async def advisory_lock(self, key: int, timeout: t.Optional[float] = None, wait: bool = True):
+        """Holds the session level advisory lock ``key`` on a connection of its own while the block runs.
+        Yields whether it was acquired: wait=False doesn't wait when another session holds it,
+        otherwise LockTimeout is raised when it wasn't acquired within ``timeout`` seconds (never by default)"""
+        async with self.pool.acquire() as conn:
+            _notify(f"SELECT pg_advisory_lock({key});")
+            if wait:
+                await conn.execute("SELECT set_config('lock_timeout', $1, false)", _lock_timeout(timeout))
+                try:
+                    await conn.execute("SELECT pg_advisory_lock($1)", key)
+                except Exception as e:
+                    _check_lock_timeout(e, key, timeout)
+                    raise
+                finally:
+                    await conn.execute("RESET lock_timeout")
+                acquired = True
+            else:
+                acquired = await conn.fetchval("SELECT pg_try_advisory_lock($1)", key)
+
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    await conn.execute("SELECT pg_advisory_unlock($1)", key)
+
+    async def copy_records(self, table: str, columns, records) -> int:
+        """Inserts the rows (tuples in the order of columns) with the binary COPY of asyncpg,
+        returns the number of rows"""
+        _notify(f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)")
+        status = await self._executor.copy_records_to_table(
+            table, records=records, columns=list(columns), timeout=_remaining()
+        )
+        return int(status.split()[-1])
+
+    async def listen(self, channel: str) -> t.AsyncIterator[str]:
+        """Yields the payloads of the notifications sent to a channel through add_listener,
+        a connection of the pool is held while iterating"""
+        import asyncio
+
+        queue = asyncio.Queue()
+
+        def callback(connection, pid, channel, payload):
+            queue.put_nowait(payload)
+
+        async with self.pool.acquire() as conn:
+            _notify(f"LISTEN {channel};")
+            await conn.add_listener(channel, callback)
+            try:
+                while True:
+                    yield await queue.get()
+            finally:
+                await conn.remove_listener(channel, callback)
+
+
+_DOLLAR_PARAM = re.compile(r"\$(\d+)")
+
+
+def _dollar_to_format(query, args):
+    """Rewrites the $1 parameters of the queries generated for async models to the %s of psycopg,
+    the arguments are reordered (and repeated) to match the order the parameters appear in"""
+    if not args:
+        return query, None
+
+    order = []
+
+    def placeholder(match):
+        order.append(int(match.group(1)) - 1)
+        return "%s"
+
+    query = _DOLLAR_PARAM.sub(placeholder, query.replace("%", "%%"))
+    return query, [args[i] for i in order]
+
+
+def _is_query_canceled(error) -> bool:
+    return getattr(error, "sqlstate", None) == "57014"
+
+
+_COLUMN_TYPES_QUERY = (
+    "SELECT attname, atttypid::int FROM pg_attribute "
+    "WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped"
+)
+
+
+def _copy_query(table, columns, binary):
+    return f"COPY {table} ({', '.join(columns)}) FROM STDIN" + (" (FORMAT BINARY)" if binary else "")
+
+
+class PsycopgDriver:
+    """Driver of sync models built on psycopg 3 and a psycopg_pool.ConnectionPool.
+
+    Results are read with the binary protocol (binary=False reads text), pipeline() sends many
+    statements without waiting for each round trip and copy_records() inserts rows with a binary COPY.
+    The queries use the %s parameters of psycopg2, the sync models work with either driver."""
+
+    def __init__(self, pool: "psycopg_pool.ConnectionPool", binary: bool = True):
         self.pool = pool
+        self.binary = binary
+        self._transaction = contextvars.ContextVar(f"psycopg_transaction_{id(self)}", default=None)
+        self._local_timeouts = set()
+        # The callbacks of after_transaction by the id of the connection of their transaction
+        self._after_transaction = {}
+        # The column type oids of the tables written with copy_records, binary COPY needs them
+        self._column_types = {}
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Runs every query made through the driver inside the block in one transaction.
+        Nested blocks join the outer transaction."""
+        conn = self._transaction.get()
+        if conn is not None:
+            yield conn
+            return
+
+        callbacks = ()
+        try:
+            # The pool commits the transaction when the block succeeds and rolls it back otherwise
+            with self.pool.connection(timeout=_remaining()) as conn:
+                token = self._transaction.set(conn)
+                try:
+                    yield conn
+                finally:
+                    self._transaction.reset(token)
+                    self._local_timeouts.discard(id(conn))
+                    callbacks = self._after_transaction.pop(id(conn), ())
+        finally:
+            for callback in callbacks:
+                callback()
 
-    async def execute(self, query, *args):
-        result = await self.pool.execute(query, *args)
+    def in_transaction(self) -> bool:
+        """True inside transaction(), where the locks taken by select_for_update() are held"""
+        return self._transaction.get() is not None
 
-        return result
+    def after_transaction(self, callback):
+        """Calls callback once the transaction of the current context ended (committed or rolled back),
+        right away outside of transaction()"""
+        conn = self._transaction.get()
+        if conn is None:
+            return callback()
+        self._after_transaction.setdefault(id(conn), []).append(callback)
+
+    @contextlib.contextmanager
+    def pipeline(self):
+        """Runs the block in one transaction in pipeline mode, the statements executed inside it are sent
+        without waiting for the result of the previous one. Reading a result waits for everything before it."""
+        with self.transaction() as conn, conn.pipeline():
+            yield conn
+
+    @contextlib.contextmanager
+    def _connection(self, autocommit=False):
+        """Yields the connection of the current transaction or a connection from the pool"""
+        conn = self._transaction.get()
+        if conn is not None and not autocommit:
+            yield conn, False
+            return
+
+        with self.pool.connection(timeout=_remaining()) as conn:
+            # autocommit is needed by statements which can't run in a transaction block
+            # like CREATE INDEX CONCURRENTLY
+            if autocommit:
+                conn.autocommit = True
+            try:
+                yield conn, True
+            finally:
+                if autocommit:
+                    conn.autocommit = False
+
+    def _cursor(self, conn, **kwargs):
+        return conn.cursor(binary=self.binary, **kwargs)
+
+    def _run(self, conn, owned, run, query, pipeline=True):
+        """Calls run(), a deadline of the context (see deadline) is enforced with statement_timeout.
+        psycopg sends parameters separately from the statement, so the timeout is set by its own statement
+        in pipeline mode, which still makes one round trip (COPY can't be pipelined and costs two)"""
+        _notify(query)
+        remaining = _remaining()
+        if remaining is None:
+            if not owned and id(conn) in self._local_timeouts:
+                # The transaction outlived the deadline which set its timeout
+                self._local_timeouts.discard(id(conn))
+                conn.execute("SET LOCAL statement_timeout TO DEFAULT")
+            return run()
+
+        timeout = f"{max(int(remaining * 1000), 1)}ms"
+        try:
+            if conn.autocommit:
+                conn.execute("SELECT set_config('statement_timeout', %s, false)", (timeout,))
+                try:
+                    return run()
+                finally:
+                    conn.execute("RESET statement_timeout")
+
+            if not owned:
+                self._local_timeouts.add(id(conn))
+            if not pipeline:
+                conn.execute("SELECT set_config('statement_timeout', %s, true)", (timeout,))
+                return run()
+            with conn.pipeline():
+                conn.execute("SELECT set_config('statement_timeout', %s, true)", (timeout,))
+                return run()
+        except Exception as e:
+            if _is_query_canceled(e):
+                raise QueryTimeout(f"The query was cancelled after {timeout}.") from e
+            raise
+
+    def execute(self, query, *args, commit=True, autocommit=False):
+        """Runs a statement, statements outside of transaction() are always committed
+        (commit is accepted for compatibility with Psycopg2Driver)"""
+        with self._connection(autocommit) as (conn, owned):
+            with self._cursor(conn) as cursor:
+                self._run(conn, owned, lambda: cursor.execute(query, args), query)
+
+    def executemany(self, query, args_list):
+        """Runs a statement once for every tuple of arguments, psycopg pipelines them"""
+        with self._connection() as (conn, owned):
+            with self._cursor(conn) as cursor:
+                self._run(conn, owned, lambda: cursor.executemany(query, args_list), query)
+
+    def fetchall(self, query, *args):
+        from psycopg.rows import dict_row
+
+        with self._connection() as (conn, owned):
+            with self._cursor(conn, row_factory=dict_row) as cursor:
+                self._run(conn, owned, lambda: cursor.execute(query, args), query)
+                return cursor.fetchall()
+
+    def fetch_rows(self, query, *args):
+        """Returns the column names and the rows as tuples"""
+        with self._connection() as (conn, owned):
+            with self._cursor(conn) as cursor:
+                self._run(conn, owned, lambda: cursor.execute(query, args), query)
+                rows = cursor.fetchall()
+                columns = tuple(column.name for column in cursor.description) if cursor.description else ()
+
+        return columns, rows
+
+    def fetchone(self, query, *args, commit=False):
+        from psycopg.rows import dict_row
+
+        with self._connection() as (conn, owned):
+            with self._cursor(conn, row_factory=dict_row) as cursor:
+                self._run(conn, owned, lambda: cursor.execute(query, args), query)
+                return cursor.fetchone() or {}
+
+    def fetchval(self, query, *args, commit=False):
+        with self._connection() as (conn, owned):
+            with self._cursor(conn) as cursor:
+                self._run(conn, owned, lambda: cursor.execute(query, args), query)
+                result = cursor.fetchone()
+
+        return result[0] if result else None
+
+    def _get_column_types(self, conn, table, columns):
+        key = (table, tuple(columns))
+        if key not in self._column_types:
+            types = dict(conn.execute(_COLUMN_TYPES_QUERY, (table,)).fetchall())
+            self._column_types[key] = [types[column] for column in columns]
+        return self._column_types[key]
+
+    def copy_records(self, table: str, columns, records) -> int:
+        """Inserts the rows (tuples in the order of columns) with COPY FROM STDIN,
+        in the binary format unless the driver was created with binary=False. Returns the number of rows.
+        COPY can't be used inside pipeline()"""
+        query = _copy_query(table, columns, self.binary)
+        with self._connection() as (conn, owned):
+            types = self._get_column_types(conn, table, columns) if self.binary else None
+            with conn.cursor() as cursor:
+
+                def copy():
+                    with cursor.copy(query) as copy:
+                        if types:
+                            copy.set_types(types)
+                        for record in records:
+                            copy.write_row(record)
+
+                self._run(conn, owned, copy, query, pipeline=False)
+                return cursor.rowcount
+
+    @contextlib.contextmanager
+    def advisory_lock(self, key: int, timeout: t.Optional[float] = None, wait: bool = True):
+        """Holds the session level advisory lock ``key`` on a connection of its own while the block runs.
+        Yields whether it was acquired: wait=False doesn't wait when another session holds it,
+        otherwise LockTimeout is raised when it wasn't acquired within ``timeout`` seconds (never by default)"""
+        with self.pool.connection() as conn:
+            conn.autocommit = True
+            try:
+                _notify(f"SELECT pg_advisory_lock({key});")
+                if wait:
+                    conn.execute("SELECT set_config('lock_timeout', %s, false)", (_lock_timeout(timeout),))
+                    try:
+                        conn.execute("SELECT pg_advisory_lock(%s)", (key,))
+                    except Exception as e:
+                        _check_lock_timeout(e, key, timeout)
+                        raise
+                    finally:
+                        conn.execute("RESET lock_timeout")
+                    acquired = True
+                else:
+                    acquired = conn.execute("SELECT pg_try_advisory_lock(%s)", (key,)).fetchone()[0]
+
+                try:
+                    yield acquired
+                finally:
+                    if acquired:
+                        conn.execute("SELECT pg_advisory_unlock(%s)", (key,))
+            finally:
+                conn.autocommit = False
+
+    def listen(self, channel: str, timeout: t.Optional[float] = None) -> t.Iterator[str]:
+        """Yields the payloads of the notifications sent to a channel.
+        Stops once nothing arrived for ``timeout`` seconds, a connection of the pool is held until then."""
+        with self.pool.connection() as conn:
+            conn.autocommit = True
+            try:
+                _notify(f"LISTEN {channel};")
+                conn.execute(f"LISTEN {channel};")
+                while True:
+                    received = False
+                    for notify in conn.notifies(timeout=timeout, stop_after=1):
+                        received = True
+                        yield notify.payload
+                    if not received:
+                        return
+            finally:
+                try:
+                    conn.execute(f"UNLISTEN {channel};")
+                finally:
+                    conn.autocommit = False
+
+
+class AsyncPsycopgDriver:
+    """Driver of async models built on psycopg 3 and a psycopg_pool.AsyncConnectionPool,
+    the async counterpart of PsycopgDriver. The $1 parameters of the queries generated for async models
+    are rewritten to the %s parameters of psycopg."""
+
+    def __init__(self, pool: "psycopg_pool.AsyncConnectionPool", binary: bool = True):
+        self.pool = pool
+        self.binary = binary
+        self._transaction = contextvars.ContextVar(f"async_psycopg_transaction_{id(self)}", default=None)
+        self._local_timeouts = set()
+        # The callbacks of after_transaction by the id of the connection of their transaction
+        self._after_transaction = {}
+        self._column_types = {}
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Runs every query made through the driver inside the block in one transaction.
+        Nested blocks join the outer transaction."""
+        conn = self._transaction.get()
+        if conn is not None:
+            yield conn
+            return
+
+        callbacks = ()
+        try:
+            async with self.pool.connection(timeout=_remaining()) as conn:
+                token = self._transaction.set(conn)
+                try:
+                    yield conn
+                finally:
+                    self._transaction.reset(token)
+                    self._local_timeouts.discard(id(conn))
+                    callbacks = self._after_transaction.pop(id(conn), ())
+        finally:
+            for callback in callbacks:
+                callback()
+
+    def in_transaction(self) -> bool:
+        """True inside transaction(), where the locks taken by select_for_update() are held"""
+        return self._transaction.get() is not None
+
+    def after_transaction(self, callback):
+        """Calls callback once the transaction of the current context ended (committed or rolled back),
+        right away outside of transaction()"""
+        conn = self._transaction.get()
+        if conn is None:
+            return callback()
+        self._after_transaction.setdefault(id(conn), []).append(callback)
+
+    @contextlib.asynccontextmanager
+    async def pipeline(self):
+        """Runs the block in one transaction in pipeline mode, the statements executed inside it are sent
+        without waiting for the result of the previous one. Reading a result waits for everything before it."""
+        async with self.transaction() as conn, conn.pipeline():
+            yield conn
+
+    @contextlib.asynccontextmanager
+    async def _connection(self, autocommit=False):
+        """Yields the connection of the current transaction or a connection from the pool"""
+        conn = self._transaction.get()
+        if conn is not None and not autocommit:
+            yield conn, False
+            return
+
+        async with self.pool.connection(timeout=_remaining()) as conn:
+            # psycopg opens a transaction before the first statement unless autocommit is set,
+            # statements like CREATE INDEX CONCURRENTLY can't run in it
+            if autocommit:
+                await conn.set_autocommit(True)
+            try:
+                yield conn, True
+            finally:
+                if autocommit:
+                    await conn.set_autocommit(False)
+
+    def _cursor(self, conn, **kwargs):
+        return conn.cursor(binary=self.binary, **kwargs)
+
+    async def _run(self, conn, owned, run, query, pipeline=True):
+        """Awaits run(), a deadline of the context (see deadline) is enforced with statement_timeout"""
+        _notify(query)
+        remaining = _remaining()
+        if remaining is None:
+            if not owned and id(conn) in self._local_timeouts:
+                self._local_timeouts.discard(id(conn))
+                await conn.execute("SET LOCAL statement_timeout TO DEFAULT")
+            return await run()
+
+        timeout = f"{max(int(remaining * 1000), 1)}ms"
+        try:
+            if conn.autocommit:
+                await conn.execute("SELECT set_config('statement_timeout', %s, false)", (timeout,))
+                try:
+                    return await run()
+                finally:
+                    await conn.execute("RESET statement_timeout")
+
+            if not owned:
+                self._local_timeouts.add(id(conn))
+            if not pipeline:
+                await conn.execute("SELECT set_config('statement_timeout', %s, true)", (timeout,))
+                return await run()
+            async with conn.pipeline():
+                await conn.execute("SELECT set_config('statement_timeout', %s, true)", (timeout,))
+                return await run()
+        except Exception as e:
+            if _is_query_canceled(e):
+                raise QueryTimeout(f"The query was cancelled after {timeout}.") from e
+            raise
+
+    async def _fetch(self, query, args, fetch, **cursor_kwargs):
+        pg_query, params = _dollar_to_format(query, args)
+        async with self._connection() as (conn, owned):
+            async with self._cursor(conn, **cursor_kwargs) as cursor:
+                await self._run(conn, owned, lambda: cursor.execute(pg_query, params), query)
+                return await fetch(cursor)
+
+    async def execute(self, query, *args, autocommit=False):
+        """Runs a statement, autocommit runs it on a connection of its own outside of the transaction
+        of the context (needed by statements like CREATE INDEX CONCURRENTLY)"""
+        pg_query, params = _dollar_to_format(query, args)
+        async with self._connection(autocommit) as (conn, owned):
+            async with self._cursor(conn) as cursor:
+                await self._run(conn, owned, lambda: cursor.execute(pg_query, params), query)
+                return cursor.statusmessage
+
+    async def executemany(self, query, args_list):
+        """Runs a statement once for every tuple of arguments, psycopg pipelines them"""
+        args_list = list(args_list)
+        if not args_list:
+            return
+        pg_query, _ = _dollar_to_format(query, args_list[0])
+        params = [_dollar_to_format(query, args)[1] for args in args_list]
+        async with self._connection() as (conn, owned):
+            async with self._cursor(conn) as cursor:
+                await self._run(conn, owned, lambda: cursor.executemany(pg_query, params), query)
 
     async def fetch(self, query, *args):
-        result = await self.pool.fetch(query, *args)
+        """Returns the rows as dicts"""
+        from psycopg.rows import dict_row
+
+        return await self._fetch(query, args, lambda cursor: cursor.fetchall(), row_factory=dict_row)
 
-        return result
+    async def fetch_rows(self, query, *args):
+        """Returns the column names and the rows as tuples"""
+
+        async def fetch(cursor):
+            rows = await cursor.fetchall()
+            return (tuple(column.name for column in cursor.description) if cursor.description else ()), rows
+
+        return await self._fetch(query, args, fetch)
 
     async def fetchrow(self, query, *args):
-        result = await self.pool.fetchrow(query, *args)
+        """Returns the first row as a dict or None"""
+        from psycopg.rows import dict_row
 
-        return result
+        return await self._fetch(query, args, lambda cursor: cursor.fetchone(), row_factory=dict_row)
 
     async def fetchval(self, query, *args):
-        result = await self.pool.fetchval(query, * args)
+        async def fetch(cursor):
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+        return await self._fetch(query, args, fetch)
+
+    async def _get_column_types(self, conn, table, columns):
+        key = (table, tuple(columns))
+        if key not in self._column_types:
+            cursor = await conn.execute(_COLUMN_TYPES_QUERY, (table,))
+            types = dict(await cursor.fetchall())
+            self._column_types[key] = [types[column] for column in columns]
+        return self._column_types[key]
+
+    async def copy_records(self, table: str, columns, records) -> int:
+        """Inserts the rows (tuples in the order of columns) with COPY FROM STDIN,
+        in the binary format unless the driver was created with binary=False. Returns the number of rows.
+        COPY can't be used inside pipeline()"""
+        query = _copy_query(table, columns, self.binary)
+        async with self._connection() as (conn, owned):
+            types = await self._get_column_types(conn, table, columns) if self.binary else None
+            async with conn.cursor() as cursor:
+
+                async def copy():
+                    async with cursor.copy(query) as copy:
+                        if types:
+                            copy.set_types(types)
+                        for record in records:
+                            await copy.write_row(record)
+
+                await self._run(conn, owned, copy, query, pipeline=False)
+                return cursor.rowcount
+
+    @contextlib.asynccontextmanager
+    async def advisory_lock(self, key: int, timeout: t.Optional[float] = None, wait: bool = True):
+        """Holds the session level advisory lock ``key`` on a connection of its own while the block runs.
+        Yields whether it was acquired: wait=False doesn't wait when another session holds it,
+        otherwise LockTimeout is raised when it wasn't acquired within ``timeout`` seconds (never by default)"""
+        async with self.pool.connection() as conn:
+            await conn.set_autocommit(True)
+            try:
+                _notify(f"SELECT pg_advisory_lock({key});")
+                if wait:
+                    await conn.execute("SELECT set_config('lock_timeout', %s, false)", (_lock_timeout(timeout),))
+                    try:
+                        await conn.execute("SELECT pg_advisory_lock(%s)", (key,))
+                    except Exception as e:
+                        _check_lock_timeout(e, key, timeout)
+                        raise
+                    finally:
+                        await conn.execute("RESET lock_timeout")
+                    acquired = True
+                else:
+                    cursor = await conn.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+                    acquired = (await cursor.fetchone())[0]
+
+                try:
+                    yield acquired
+                finally:
+                    if acquired:
+                        await conn.execute("SELECT pg_advisory_unlock(%s)", (key,))
+            finally:
+                await conn.set_autocommit(False)
 
-        return result
+    async def listen(self, channel: str) -> t.AsyncIterator[str]:
+        """Yields the payloads of the notifications sent to a channel,
+        a connection of the pool is held while iterating"""
+        async with self.pool.connection() as conn:
+            await conn.set_autocommit(True)
+            try:
+                _notify(f"LISTEN {channel};")
+                await conn.execute(f"LISTEN {channel};")
+                async for notify in conn.notifies():
+                    yield notify.payload
+            finally:
+                try:
+                    await conn.execute(f"UNLISTEN {channel};")
+                finally:
+                    await conn.set_autocommit(False)
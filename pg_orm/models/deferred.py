@@ -0,0 +1,65 @@
+from pg_orm.errors import DeferredFieldError
+
+
+class DeferredGroup:
+    """The instances of one result set that were loaded without some of their columns.
+
+    Reading a deferred field on one of them loads that column for every instance of the
+    group which is still missing it with a single query, so iterating over a QuerySet
+    costs one extra query per deferred field instead of one per row.
+    """
+
+    def __init__(self, model, names):
+        self.model = model
+        self.names = frozenset(names)
+        self.instances = []
+
+    def _pending(self, names):
+        return [i for i in self.instances if any(name not in i.attrs for name in names)]
+
+    def _query(self, names, asyncpg=False):
+        return self.model._query_gen.generate_deferred_load_query(names, asyncpg)
+
+    def _fill(self, instances, columns, rows):
+        by_id = {instance.attrs.get("id"): instance for instance in instances}
+        for row in rows:
+            values = dict(zip(columns, row))
+            instance = by_id.get(values.pop("id"))
+            if instance is None:
+                continue
+            for name, value in values.items():
+                # Never overwrite a value that was assigned before the column was loaded
+                instance.attrs.setdefault(name, value)
+
+    def _check(self, names):
+        names = list(names or self.names)
+        for name in names:
+            if name not in self.names:
+                raise ValueError(f"'{name}' is not deferred.")
+        return names
+
+    def load(self, names=None):
+        """Loads the deferred columns (all of them by default) of every instance in the group"""
+        names = self._check(names)
+        instances = self._pending(names)
+        if instances:
+            ids = [i.attrs.get("id") for i in instances]
+            self._fill(instances, *self.model.db.fetch_rows(self._query(names), ids))
+
+    async def async_load(self, names=None):
+        names = self._check(names)
+        instances = self._pending(names)
+        if instances:
+            ids = [i.attrs.get("id") for i in instances]
+            self._fill(instances, *await self.model.db.fetch_rows(self._query(names, True), ids))
+
+    def get(self, instance, name):
+        """Returns the value of a deferred field, loading it for the whole group first"""
+        if not self.model._is_sync:
+            raise DeferredFieldError(
+                f"'{name}' of {self.model.__name__} is deferred, "
+                f"await instance.load_deferred() or queryset.load_deferred() before reading it."
+            )
+
+        self.load([name])
+        return instance.attrs[name]
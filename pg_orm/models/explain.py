@@ -0,0 +1,71 @@
+"""EXPLAIN of the statement behind a QuerySet, see QuerySet.explain"""
+import logging
+
+from pg_orm.models.codecs import json_loads
+
+log = logging.getLogger(__name__)
+
+FORMATS = ("text", "json", "xml", "yaml")
+
+
+def explain_query(query: str, analyze=False, buffers=False, format="json") -> str:
+    if format.lower() not in FORMATS:
+        raise ValueError(f"Unknown EXPLAIN format {format!r}, expected one of {', '.join(FORMATS)}.")
+
+    options = [f"FORMAT {format.upper()}"]
+    if analyze:
+        options.append("ANALYZE")
+    if buffers:
+        options.append("BUFFERS")
+    return f"EXPLAIN ({', '.join(options)}) {query}"
+
+
+def parse_plan(rows, format="json"):
+    """The plan of the EXPLAIN rows, the top level dict for JSON (with "Plan", "Planning Time"...)
+    and the text for the other formats"""
+    if format.lower() != "json":
+        return "\n".join(row[0] for row in rows)
+
+    plan = rows[0][0]
+    if isinstance(plan, (str, bytes)):
+        # asyncpg returns json columns as text
+        plan = json_loads(plan)
+    return plan[0]
+
+
+def iter_nodes(node):
+    """Yields the node and every node below it"""
+    yield node
+    for child in node.get("Plans", ()):
+        yield from iter_nodes(child)
+
+
+def node_rows(node) -> float:
+    """The rows a node returned when it was analyzed, the planner estimate otherwise"""
+    if "Actual Rows" in node:
+        return node["Actual Rows"] * node.get("Actual Loops", 1)
+    return node.get("Plan Rows", 0)
+
+
+def estimated_rows(plan: dict) -> int:
+    """The number of rows the planner expects the statement to return"""
+    return int(round(plan["Plan"]["Plan Rows"]))
+
+
+def seq_scans(plan: dict, min_rows: float = 0) -> list:
+    """The Seq Scan nodes of a JSON plan which read at least ``min_rows`` rows"""
+    return [
+        node for node in iter_nodes(plan["Plan"])
+        if node.get("Node Type") == "Seq Scan" and node_rows(node) >= min_rows
+    ]
+
+
+def flag_seq_scans(plan: dict, min_rows: float, query: str) -> list:
+    """Logs a warning for every Seq Scan of the plan which reads at least ``min_rows`` rows"""
+    nodes = seq_scans(plan, min_rows)
+    for node in nodes:
+        log.warning(
+            f"Sequential scan of {node.get('Relation Name')!r} reading {node_rows(node):.0f} rows "
+            f"(threshold {min_rows}) in: {query}"
+        )
+    return nodes
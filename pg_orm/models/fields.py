@@ -1,16 +1,100 @@
 import datetime
-import pydoc
 from typing import Iterable, Any, Callable, Optional
 
-from pg_orm.errors import SchemaError
+from pg_orm.errors import SchemaError, FiledError
+from pg_orm.models.codecs import json_dumps
+from pg_orm.models.indexes import GinIndex
 from pg_orm.models import base_model
 from pg_orm.models.utils import maybe_await
-from pg_orm.models.utils import quote
+from pg_orm.models.utils import quote, locate, qualified_name
+
+
+def _operator(operator):
+    def compile_lookup(column, value, param):
+        return f"{column} {operator} {param(value)}"
+    return compile_lookup
+
+
+def _exact(column, value, param):
+    return f"{column} IS NULL" if value is None else f"{column}={param(value)}"
+
+
+def _ne(column, value, param):
+    return f"{column} IS NOT NULL" if value is None else f"{column} <> {param(value)}"
+
+
+def _in(column, values, param):
+    values = list(values)
+    if not values:
+        return "FALSE"
+    # A single array parameter keeps the statement text the same for any number of values
+    return f"{column} = ANY({param(values)})"
+
+
+def _not_in(column, values, param):
+    values = list(values)
+    if not values:
+        return "TRUE"
+    return f"{column} <> ALL({param(values)})"
+
+
+def _range(column, bounds, param):
+    start, end = bounds
+    return f"{column} BETWEEN {param(start)} AND {param(end)}"
+
+
+def _isnull(column, value, param):
+    return f"{column} IS NULL" if value else f"{column} IS NOT NULL"
+
+
+LOOKUPS = {
+    "exact": _exact,
+    "ne": _ne,
+    "in": _in,
+    "not_in": _not_in,
+    "gt": _operator(">"),
+    "gte": _operator(">="),
+    "lt": _operator("<"),
+    "lte": _operator("<="),
+    "range": _range,
+    "isnull": _isnull,
+}
+
+
+def _like_pattern(value):
+    escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _contains(column, value, param):
+    # Can use a TrigramIndex, unlike a btree index
+    return f"{column} LIKE {param(_like_pattern(value))}"
+
+
+def _icontains(column, value, param):
+    return f"{column} ILIKE {param(_like_pattern(value))}"
+
+
+def _similar(column, value, param):
+    # pg_trgm similarity above pg_trgm.similarity_threshold (0.3 by default), uses a TrigramIndex
+    return f"{column} {param.percent} {param(value)}"
+
+
+TEXT_LOOKUPS = {
+    **LOOKUPS,
+    "contains": _contains,
+    "icontains": _icontains,
+    "similar": _similar,
+}
 
 
 class Field:
     python = None  # The field data type in python
     postgresql = None  # The value will be set in the subclasses
+    lookups = LOOKUPS  # The filter() lookups of the field
+    deferred = False  # Left out of queries and loaded on first access
+    generated = False  # Computed by the database, never written
+    search_lookup = "contains"  # The lookup search() uses for the field
 
     def __init__(
             self,
@@ -20,8 +104,10 @@ class Field:
             default: Any = None,
             default_sql_value: Any = None,
             validators: Optional[Iterable[Callable[[Any], Any]]] = None,
+            deferred: bool = False,
     ):
         self.column_name = None  # This will be replaced later
+        self.deferred = deferred
         self.validators = validators
         self.is_unique = unique
         self.primary_key = primary_key
@@ -35,6 +121,10 @@ class Field:
     def to_dict(self):
         data = self.__dict__.copy()
         data.pop("default", None)
+        # Deferred loading doesn't change the schema
+        data.pop("deferred", None)
+        # Validators are python objects, only their names are stored
+        data["validators"] = [qualified_name(v) for v in self.validators]
         cls = self.__class__
         data["path"] = cls.__module__ + "." + cls.__qualname__
 
@@ -46,7 +136,7 @@ class Field:
         given = cls.__module__ + "." + cls.__qualname__
 
         if given != meta:
-            cls = pydoc.locate(meta)
+            cls = locate(meta)
             if cls is None:
                 raise RuntimeError('Could not locate "%s".' % meta)
 
@@ -54,12 +144,36 @@ class Field:
         self.__dict__.update(data)
         return self
 
-    def to_sql(self):
+    def to_sql(self, constraints: bool = True):
+        """Returns the column definition, constraints=False leaves out PRIMARY KEY and UNIQUE
+        so they can be declared as table constraints instead (needed by partitioned tables)"""
         if self.postgresql is None:
             raise NotImplementedError()
+        if not constraints:
+            return f"{self.postgresql}{self._get_null_val()}{self._get_default_sql_val()}"
         return f"{self.postgresql}{self._get_pk_val()}{self._get_unique_val()}"\
                 f"{self._get_null_val()}{self._get_default_sql_val()}"
 
+    def compile_lookup(self, column: str, lookup: list, value: Any, param: Callable[[Any], str]) -> str:
+        """Compiles a filter() lookup (column__lookup=value) on this field into a SQL condition,
+        param(value) adds an argument to the query and returns its placeholder"""
+        compile_lookup = self.lookups.get("__".join(lookup) or "exact")
+        if compile_lookup is None:
+            raise FiledError("__".join([column, *lookup]), [f"{column}__{name}" for name in self.lookups])
+        return compile_lookup(column, value, param)
+
+    def compile_rank(self, column: str, lookup: list, value: Any, param: Callable[[Any], str]) -> Optional[str]:
+        """Returns the expression search() orders the rows by for a lookup, highest first"""
+        return None
+
+    def validate_model(self, fields: dict):
+        """Called with the fields of the model the field is declared on"""
+        pass
+
+    def default_indexes(self) -> list:
+        """Indexes which are added to the model unless it declares one on the column itself"""
+        return []
+
     def _get_default_python_val(self):
         if callable(self.default):
             return maybe_await(self.default)
@@ -165,12 +279,18 @@ class CharField(Field):
     For large amounts of text, use TextField."""
 
     python = str
+    lookups = TEXT_LOOKUPS
 
     def __init__(self, max_length: int = None, **kwargs):
         self.max_length = max_length
         super().__init__(**kwargs)
         self.postgresql = f"VARCHAR({self.max_length})" if self.max_length is not None else "TEXT"
 
+    def compile_rank(self, column, lookup, value, param):
+        if lookup == ["similar"]:
+            return f"similarity({column}, {param(value)})"
+        return None
+
 
 class FloatField(IntegerField):
     """A field for boolean values"""
@@ -226,7 +346,8 @@ class ForeignKey(Field):
 
         super().__init__(**kwargs)
 
-        if isinstance(to, base_model.BaseModel):
+        if isinstance(to, base_model.BaseModel) or \
+                (isinstance(to, type) and issubclass(to, base_model.BaseModel)):
             self.to = to.table_name
 
         elif isinstance(to, str):
@@ -246,6 +367,101 @@ class JsonField(Field):
     python = dict
     postgresql = "JSON"
 
+    def _jsonb_column(self, column):
+        # JSON has no containment operators, the cast matches the expression a GinIndex indexes
+        return column if self.postgresql == "JSONB" else f"{column}::jsonb"
+
+    def compile_lookup(self, column, lookup, value, param):
+        """Supports the contains (@>), contained_by (<@), has_key (?), has_keys (?&) and has_any_keys (?|)
+        lookups besides the common ones, other lookups are paths: payload__user__id=1 matches {"user": {"id": 1}}
+        through @>. Every part of a path with more than one key is a key (payload__tags__contains=1 matches
+        {"tags": {"contains": 1}}), a single key which is a lookup name is the lookup, use
+        payload__contains={"in": 1} for such a top level key.
+        All of them can use a GinIndex on the field."""
+        if not lookup or "__".join(lookup) in self.lookups:
+            return super().compile_lookup(column, lookup, value, param)
+
+        target = self._jsonb_column(column)
+        name = lookup[0] if len(lookup) == 1 else None
+
+        if name == "has_key":
+            return f"{target} ? {param(value)}"
+        elif name == "has_keys":
+            return f"{target} ?& {param(list(value))}"
+        elif name == "has_any_keys":
+            return f"{target} ?| {param(list(value))}"
+        elif name == "contained_by":
+            return f"{target} <@ {param(json_dumps(value))}::text::jsonb"
+        elif name != "contains":
+            for key in reversed(lookup):
+                value = {key: value}
+
+        # The value is sent as text so a registered jsonb codec doesn't encode it twice
+        return f"{target} @> {param(json_dumps(value))}::text::jsonb"
+
+
+class JsonbField(JsonField):
+    """A field for JSON values which are stored parsed (JSONB), they can be indexed with a GinIndex"""
+
+    postgresql = "JSONB"
+
+
+class SearchVectorField(Field):
+    """A tsvector column generated from text columns of the same row, for full text search.
+    search() and filter() match it with websearch_to_tsquery and search() orders the rows by ts_rank.
+    A GinIndex is added to the model for it and the field is deferred by default.
+
+        search = models.SearchVectorField("title", "body", weights="AB")
+    """
+
+    python = str
+    generated = True
+    search_lookup = "match"
+    lookups = {"isnull": _isnull}
+
+    def __init__(self, *columns: str, config: str = "english", weights: Optional[str] = None, **kwargs):
+        if not columns:
+            raise SchemaError("A SearchVectorField needs at least one column.")
+        if weights is not None and len(weights) != len(columns):
+            raise SchemaError("SearchVectorField needs one weight (A, B, C or D) per column.")
+
+        self.columns = list(columns)
+        self.config = config
+        self.weights = weights
+        kwargs.setdefault("deferred", True)
+        super().__init__(**kwargs)
+        self.postgresql = f"TSVECTOR GENERATED ALWAYS AS ({self._vector_sql()}) STORED"
+
+    def _vector_sql(self):
+        vectors = []
+        for i, column in enumerate(self.columns):
+            vector = f"to_tsvector('{self.config}', coalesce({column}, ''))"
+            if self.weights:
+                vector = f"setweight({vector}, '{self.weights[i]}')"
+            vectors.append(vector)
+        return " || ".join(vectors)
+
+    def _tsquery(self, value, param):
+        return f"websearch_to_tsquery('{self.config}', {param(value)})"
+
+    def compile_lookup(self, column, lookup, value, param):
+        if "__".join(lookup) in ("", "match"):
+            return f"{column} @@ {self._tsquery(value, param)}"
+        return super().compile_lookup(column, lookup, value, param)
+
+    def compile_rank(self, column, lookup, value, param):
+        if "__".join(lookup) in ("", "match"):
+            return f"ts_rank({column}, {self._tsquery(value, param)})"
+        return None
+
+    def validate_model(self, fields):
+        for column in self.columns:
+            if not isinstance(fields.get(column), CharField):
+                raise SchemaError(f"SearchVectorField column '{column}' is not a CharField or TextField of the model.")
+
+    def default_indexes(self):
+        return [GinIndex(self.column_name)]
+
 
 class BinaryField(Field):
     python = bytes
@@ -0,0 +1,150 @@
+from typing import Iterable, Optional
+
+from pg_orm.errors import SchemaError
+from pg_orm.models.utils import locate
+
+
+class Index:
+    """An index on one or more columns of a model.
+
+    ``where`` makes a partial index and ``include`` adds non key columns (a covering index).
+    Indexes added to an existing table are built with CREATE INDEX CONCURRENTLY by the migrations.
+    """
+
+    method = "btree"
+    extension = None  # A PostgreSQL extension the index needs
+    methods = ("btree", "hash", "gin", "gist", "spgist", "brin")
+
+    def __init__(
+            self,
+            *columns: str,
+            name: str = None,
+            unique: bool = False,
+            where: str = None,
+            include: Optional[Iterable[str]] = None,
+            opclass: str = None,
+            method: str = None,
+    ):
+        if not columns:
+            raise SchemaError("An index needs at least one column.")
+
+        self.columns = list(columns)
+        self.name = name
+        self.unique = unique
+        self.where = where
+        self.include = list(include or [])
+        self.opclass = opclass
+        self.method = (method or self.method).lower()
+
+        if self.method not in self.methods:
+            raise SchemaError(f"Invalid index method. Choices are: {', '.join(self.methods)}")
+
+        if unique and self.method != "btree":
+            raise SchemaError("Only btree indexes can be unique.")
+
+    def validate(self, table_name, fields):
+        for column in self.columns + self.include:
+            if column not in fields:
+                raise SchemaError(f"Cannot index '{column}', it is not a field of the model.")
+
+        if self.name is None:
+            suffix = "key" if self.unique else "idx"
+            self.name = f"{table_name}_{'_'.join(self.columns)}_{suffix}"[:63]
+
+    def _column_sql(self, field):
+        from pg_orm.models.fields import JsonField
+
+        column = field.column_name
+        if self.method == "gin" and isinstance(field, JsonField) and field.postgresql == "JSON":
+            # JSON has no GIN operator class, index the jsonb representation instead
+            column = f"({column}::jsonb)"
+
+        if self.opclass:
+            column += f" {self.opclass}"
+
+        return column
+
+    def to_sql(self, table_name: str, fields, concurrently: bool = False):
+        columns = ", ".join(self._column_sql(fields[c]) for c in self.columns)
+        query = "CREATE {0}INDEX {1}IF NOT EXISTS {2} ON {3} USING {4} ({5})".format(
+            "UNIQUE " if self.unique else "",
+            "CONCURRENTLY " if concurrently else "",
+            self.name,
+            table_name,
+            self.method,
+            columns,
+        )
+        if self.include:
+            query += f" INCLUDE ({', '.join(self.include)})"
+        if self.where:
+            query += f" WHERE {self.where}"
+
+        return query
+
+    def creation_statements(self, table_name: str, fields, concurrently: bool = False):
+        statements = [self.to_sql(table_name, fields, concurrently)]
+        if self.extension:
+            statements.insert(0, f"CREATE EXTENSION IF NOT EXISTS {self.extension}")
+        return statements
+
+    def to_drop_sql(self, concurrently: bool = False):
+        return f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {self.name}"
+
+    def to_dict(self):
+        data = self.__dict__.copy()
+        cls = self.__class__
+        data["path"] = cls.__module__ + "." + cls.__qualname__
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        meta = data["path"]
+        given = cls.__module__ + "." + cls.__qualname__
+
+        if given != meta:
+            cls = locate(meta)
+            if cls is None:
+                raise RuntimeError('Could not locate "%s".' % meta)
+
+        self = cls.__new__(cls)
+        self.__dict__.update(data)
+        self.__dict__.pop("path", None)
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, Index) and self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        # Over the same attributes as __eq__, the lists (columns, include) as tuples
+        return hash(tuple(
+            (key, tuple(value) if isinstance(value, list) else value) for key, value in sorted(self.__dict__.items())
+        ))
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self.name)
+
+
+class GinIndex(Index):
+    """An inverted index, used for JsonField/ArrayField containment and full text search"""
+
+    method = "gin"
+
+
+class BrinIndex(Index):
+    """A tiny block range index for naturally ordered columns like insertion timestamps"""
+
+    method = "brin"
+
+
+class TrigramIndex(GinIndex):
+    """A pg_trgm GIN index on text columns, used by LIKE/ILIKE '%value%' (the contains and icontains
+    lookups, search()) and the similar lookup. The pg_trgm extension is created with the index."""
+
+    extension = "pg_trgm"
+
+    def __init__(self, *columns: str, **kwargs):
+        kwargs.setdefault("opclass", "gin_trgm_ops")
+        super().__init__(*columns, **kwargs)
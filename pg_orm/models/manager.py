@@ -1,4 +1,11 @@
+import copy
+import inspect
+
 from pg_orm import models
+from pg_orm.errors import DBError, FiledError
+from pg_orm.models import cache as _cache
+from pg_orm.models import explain as _explain
+from pg_orm.models.database import deadline
 from pg_orm.models.queryset import QuerySet
 from pg_orm.models.utils import maybe_await
 
@@ -6,53 +13,178 @@ from pg_orm.models.utils import maybe_await
 class Manager:
     def __init__(self, model):
         self.model = model
-        self.db = getattr(model, "db", None)
+        self._deferred = frozenset(name for name, field in model.fields.items() if field.deferred)
+        self._timeout = None
+        self._cache = None
+        self._cache_ttl = None
+        self._limit = None
+        self._lock = None
+
+    @property
+    def db(self):
+        # Looked up on every access since init_db can be called after the models are defined
+        return self.model.db
+
+    def defer(self, *names: str) -> "Manager":
+        """Returns a manager whose queries leave out the given columns,
+        they are loaded on first access for the whole result set at once"""
+        for name in names:
+            if name not in self.model.fields:
+                raise FiledError(name, self.model.fields.keys())
+            if self.model.fields[name].primary_key:
+                raise ValueError(f"The primary key '{name}' cannot be deferred.")
+
+        manager = copy.copy(self)
+        manager._deferred = self._deferred.union(names)
+        return manager
+
+    def undefer(self, *names: str) -> "Manager":
+        """Returns a manager which loads the given deferred columns (all of them by default) with the rows"""
+        manager = copy.copy(self)
+        manager._deferred = self._deferred.difference(names) if names else frozenset()
+        return manager
+
+    def timeout(self, seconds: float) -> "Manager":
+        """Returns a manager whose queries are cancelled with QueryTimeout after ``seconds``,
+        an enclosing deadline() which ends earlier still applies"""
+        manager = copy.copy(self)
+        manager._timeout = seconds
+        return manager
+
+    def cached(self, ttl: float = None, cache: "_cache.QueryCache" = None) -> "Manager":
+        """Returns a manager whose all/get/filter/search results are cached by their SQL and parameters
+        (in pg_orm.models.cache.default_cache by default). Writes through the models of this process
+        invalidate the cached results of their table, ``ttl`` bounds how stale they can get otherwise"""
+        manager = copy.copy(self)
+        manager._cache = _cache.default_cache if cache is None else cache
+        manager._cache_ttl = ttl
+        return manager
+
+    def limit(self, count: int) -> "Manager":
+        """Returns a manager whose all/get/filter/search queries return at most ``count`` rows"""
+        manager = copy.copy(self)
+        manager._limit = count
+        return manager
+
+    def select_for_update(self, skip_locked: bool = False, nowait: bool = False, of=()) -> "Manager":
+        """Returns a manager whose all/get/filter/search queries lock the rows they return (FOR UPDATE) until
+        the end of the transaction, they have to run inside db.transaction(). skip_locked leaves out the rows locked
+        by other transactions, nowait raises instead of waiting for them, ``of`` limits the lock to some tables"""
+        manager = copy.copy(self)
+        manager._lock = self.model._query_gen.generate_lock_clause(skip_locked, nowait, of)
+        return manager
+
+    def _select_options(self) -> dict:
+        """The keyword arguments of generate_select_query which the options of the manager set"""
+        return {"columns": self._get_columns(), "limit": self._limit, "lock": self._lock}
+
+    def _check_lock(self):
+        if self._lock is not None and not self.db.in_transaction():
+            raise DBError("select_for_update() has to be used inside db.transaction(), "
+                          "the locks are released at the end of the transaction.")
+
+    def _get_columns(self):
+        """The columns to select, None selects all of them"""
+        if not self._deferred:
+            return None
+        return [name for name in self.model.fields if name not in self._deferred]
+
+    def sql(self, **kwargs) -> str:
+        """Returns the SELECT which filter(**kwargs) runs with the values inlined,
+        it can be used as the query of a MaterializedView"""
+        return self.model._query_gen.generate_literal_select_query(columns=self._get_columns(), **kwargs)
+
+    def _fetch_rows(self, query, args=()):
+        # Locking reads always go to the database
+        key = None if self._cache is None or self._lock else self._cache.key(self.model.table_name, query, args)
+        if key is None:
+            with deadline(self._timeout):
+                return self.db.fetch_rows(query, *args)
+
+        rows = self._cache.get(key)
+        if rows is None:
+            version = _cache.table_version(self.model.table_name)
+            with deadline(self._timeout):
+                rows = self.db.fetch_rows(query, *args)
+            self._cache.set(key, rows, version, self._cache_ttl)
+        return rows
 
     def all(self) -> QuerySet:
         """Returns all rows in the table"""
-        query = "SELECT * FROM {0};".format(self.model.table_name)
-        return QuerySet(
-            self.model, [self._return_model(row) for row in self.db.fetchall(query)]
-        )
+        self._check_lock()
+        query, _ = self.model._query_gen.generate_select_query(**self._select_options())
+        rows = self._fetch_rows(query)
+        return QuerySet(self.model, self._return_models(*rows), query)
 
     def get(self, **kwargs):
         """Returns a single row with the given values"""
-        self.model(**kwargs)
-        query, args = self.model._query_gen.generate_select_query(**kwargs)
-        r = self.db.fetchone(query, *args)
-        return self._return_model(r)
+        self._check_lock()
+        query, args = self.model._query_gen.generate_select_query(**self._select_options(), **kwargs)
+        rows = self._fetch_rows(query, args)
+        instances = self._return_models(*rows)
+        return instances[0] if instances else None
 
     def filter(self, **kwargs) -> QuerySet:
         """Similar to get but returns multiple rows if exists"""
-        self.model(**kwargs)
-        query, args = self.model._query_gen.generate_select_query(**kwargs)
-
-        return QuerySet(
-            self.model,
-            [
-                self._return_model(row)
-                for row in self.db.fetchall(query, *args)
-            ],
-        )
+        self._check_lock()
+        query, args = self.model._query_gen.generate_select_query(**self._select_options(), **kwargs)
+        rows = self._fetch_rows(query, args)
+        return QuerySet(self.model, self._return_models(*rows), query, args)
 
     def search(self, **kwargs) -> QuerySet:
-        """Runs a SQL search query with the given values"""
-        self.model(**kwargs)
-        params = [f"{key} LIKE %s" for key in kwargs.keys()]
-        query = "SELECT * FROM {0} WHERE {1};".format(
-            self.model.table_name, " AND ".join(params)
-        )
-        arguments = dict()
-        for key, value in kwargs.items():
-            arguments[key] = f"%{value}%"
+        """Searches the text columns with LIKE '%value%' and SearchVectorFields with full text search,
+        column__similar=value is a pg_trgm similarity search. Ranked results come first."""
+        self._check_lock()
+        query, args = self.model._query_gen.generate_search_query(**self._select_options(), **kwargs)
+        rows = self._fetch_rows(query, args)
+        return QuerySet(self.model, self._return_models(*rows), query, args)
+
+    def claim_batch(self, size: int, process, **kwargs) -> QuerySet:
+        """Claims up to ``size`` rows with the given values for a queue consumer: they are locked with
+        FOR UPDATE SKIP LOCKED (lowest id first) so concurrent workers get different rows, then
+        process(rows) is called and the transaction commits. If process raises, the transaction is rolled back
+        and the rows can be claimed again. Returns the claimed rows"""
+        manager = self.select_for_update(skip_locked=True)
+        order_by = "id" if "id" in self.model.fields else None
+        with self.db.transaction():
+            query, args = self.model._query_gen.generate_select_query(
+                columns=self._get_columns(), order_by=order_by, limit=size, lock=manager._lock, **kwargs
+            )
+            rows = QuerySet(self.model, self._return_models(*manager._fetch_rows(query, args)), query, args)
+            if rows:
+                process(rows)
+        return rows
+
+    def count(self, **kwargs) -> int:
+        """Counts the rows with the given values without loading them"""
+        query, args = self.model._query_gen.generate_count_query(**kwargs)
+        with deadline(self._timeout):
+            return self.db.fetchval(query, *args)
+
+    def estimated_count(self) -> int:
+        """The number of rows in the table according to the planner statistics (pg_class.reltuples),
+        it costs nothing on huge tables but is only as recent as the last VACUUM/ANALYZE"""
+        query, args = self.model._query_gen.generate_estimated_count_query()
+        with deadline(self._timeout):
+            return self.db.fetchval(query, *args)
+
+    def estimate_count(self, exact_below: int = None, **kwargs) -> int:
+        """Estimates the rows with the given values from the row estimate of their EXPLAIN.
+        When the estimate is below ``exact_below`` the rows are counted instead, small counts are exact"""
+        query, args = self.model._query_gen.generate_select_query(**kwargs)
+        with deadline(self._timeout):
+            _, rows = self.db.fetch_rows(_explain.explain_query(query), *args)
+            estimate = _explain.estimated_rows(_explain.parse_plan(rows))
+            if exact_below is not None and estimate < exact_below:
+                return self.count(**kwargs)
+        return estimate
 
-        return QuerySet(
-            self.model,
-            [
-                self._return_model(row)
-                for row in self.db.fetchall(query, *tuple(arguments.values()))
-            ],
-        )
+    def raw(self, sql: str, *params) -> QuerySet:
+        """Runs a hand written query and builds the instances from its rows, the selected columns
+        must be fields of the model. The parameters use the placeholders of the driver (%s or $1)"""
+        with deadline(self._timeout):
+            rows = self.db.fetch_rows(sql, *params)
+        return QuerySet(self.model, self.model._from_rows(*rows), sql, params)
 
     def create(self, **kwargs):
         """
@@ -73,63 +205,129 @@ class Manager:
                 kwargs[field_name] = field._get_default_python_val()
 
         query, values = self.model._query_gen.generate_insert_query(True, **kwargs)
-        new_instance_data = self.db.fetchone(query, *values, commit=True)
+        new_instance_data = {}
+        with deadline(self._timeout), self.model._change_feed("insert", new_instance_data):
+            new_instance_data.update(self.db.fetchone(query, *values, commit=True))
 
-        return self.model(**new_instance_data)
+        instance = self.model(**new_instance_data)
+        instance._mark_clean()
+        return instance
 
     def _return_model(self, query_set: dict):
         if bool(query_set):
-            return self.model(**query_set)
+            instance = self.model(**query_set)
+            instance._mark_clean()
+            return instance
         else:
             return None
 
+    def _return_models(self, columns, rows) -> list:
+        """Builds the model instances straight from the row tuples/records,
+        the columns are resolved against the fields once per result set"""
+        return self.model._from_rows(columns, rows, self._deferred)
+
 
 class AsyncManager(Manager):
+    async def _fetch_rows(self, query, args=()):
+        # Locking reads always go to the database
+        key = None if self._cache is None or self._lock else self._cache.key(self.model.table_name, query, args)
+        if key is None:
+            with deadline(self._timeout):
+                return await self.db.fetch_rows(query, *args)
+
+        rows = self._cache.get(key)
+        if rows is None:
+            version = _cache.table_version(self.model.table_name)
+            with deadline(self._timeout):
+                rows = await self.db.fetch_rows(query, *args)
+            self._cache.set(key, rows, version, self._cache_ttl)
+        return rows
+
     async def all(self) -> QuerySet:
         """Returns all rows in the table"""
-        query = "SELECT * FROM {0};".format(self.model.table_name)
-        return QuerySet(
-            self.model, [self._return_model(row) for row in await self.db.fetch(query)]
-        )
+        self._check_lock()
+        query, _ = self.model._query_gen.generate_select_query(True, **self._select_options())
+        rows = await self._fetch_rows(query)
+        return QuerySet(self.model, self._return_models(*rows), query)
 
     async def get(self, **kwargs):
         """Returns a single row with the given values"""
-        self.model(**kwargs)
-        query, args = self.model._query_gen.generate_select_query(True, **kwargs)
-        return self._return_model(
-            await self.db.fetchrow(query, *args)
-        )
+        self._check_lock()
+        query, args = self.model._query_gen.generate_select_query(True, **self._select_options(), **kwargs)
+        if self._cache is None or self._lock:
+            with deadline(self._timeout):
+                record = await self.db.fetchrow(query, *args)
+            if record is None:
+                return None
+            # asyncpg returns a Record and psycopg a dict
+            return self._return_models(record.keys(), (tuple(record.values()),))[0]
+
+        instances = self._return_models(*await self._fetch_rows(query, args))
+        return instances[0] if instances else None
 
     async def filter(self, **kwargs):
         """Similar to get but returns multiple rows if exists"""
-        self.model(**kwargs)
-        query, args = self.model._query_gen.generate_select_query(True, **kwargs)
-        return QuerySet(
-            self.model,
-            [
-                self._return_model(row)
-                for row in await self.db.fetch(query, *args)
-            ],
-        )
+        self._check_lock()
+        query, args = self.model._query_gen.generate_select_query(True, **self._select_options(), **kwargs)
+        rows = await self._fetch_rows(query, args)
+        return QuerySet(self.model, self._return_models(*rows), query, args)
 
     async def search(self, **kwargs) -> QuerySet:
-        """Runs a SQL search query with the given values"""
-        self.model(**kwargs)
-        count = 1
-        params = []
-        for key in kwargs.keys():
-            params.append(f"{key} LIKE '%' || ${count} || '%'")
-            count += 1
-        query = "SELECT * FROM {0} WHERE {1};".format(
-            self.model.table_name, " AND ".join(params)
-        )
-        return QuerySet(
-            self.model,
-            [
-                self._return_model(row)
-                for row in await self.db.fetch(query, *tuple(kwargs.values()))
-            ]
-          )
+        """Searches the text columns with LIKE '%value%' and SearchVectorFields with full text search,
+        column__similar=value is a pg_trgm similarity search. Ranked results come first."""
+        self._check_lock()
+        query, args = self.model._query_gen.generate_search_query(True, **self._select_options(), **kwargs)
+        rows = await self._fetch_rows(query, args)
+        return QuerySet(self.model, self._return_models(*rows), query, args)
+
+    async def claim_batch(self, size: int, process, **kwargs) -> QuerySet:
+        """Claims up to ``size`` rows with the given values for a queue consumer: they are locked with
+        FOR UPDATE SKIP LOCKED (lowest id first) so concurrent workers get different rows, then
+        process(rows) is called (and awaited when it is async) and the transaction commits.
+        If process raises, the transaction is rolled back and the rows can be claimed again. Returns the claimed rows"""
+        manager = self.select_for_update(skip_locked=True)
+        order_by = "id" if "id" in self.model.fields else None
+        async with self.db.transaction():
+            query, args = self.model._query_gen.generate_select_query(
+                True, columns=self._get_columns(), order_by=order_by, limit=size, lock=manager._lock, **kwargs
+            )
+            rows = QuerySet(self.model, self._return_models(*await manager._fetch_rows(query, args)), query, args)
+            if rows:
+                result = process(rows)
+                if inspect.isawaitable(result):
+                    await result
+        return rows
+
+    async def count(self, **kwargs) -> int:
+        """Counts the rows with the given values without loading them"""
+        query, args = self.model._query_gen.generate_count_query(True, **kwargs)
+        with deadline(self._timeout):
+            return await self.db.fetchval(query, *args)
+
+    async def estimated_count(self) -> int:
+        """The number of rows in the table according to the planner statistics (pg_class.reltuples),
+        it costs nothing on huge tables but is only as recent as the last VACUUM/ANALYZE"""
+        query, args = self.model._query_gen.generate_estimated_count_query(True)
+        with deadline(self._timeout):
+            return await self.db.fetchval(query, *args)
+
+    async def estimate_count(self, exact_below: int = None, **kwargs) -> int:
+        """Estimates the rows with the given values from the row estimate of their EXPLAIN.
+        When the estimate is below ``exact_below`` the rows are counted instead, small counts are exact"""
+        query, args = self.model._query_gen.generate_select_query(True, **kwargs)
+        with deadline(self._timeout):
+            _, rows = await self.db.fetch_rows(_explain.explain_query(query), *args)
+            estimate = _explain.estimated_rows(_explain.parse_plan(rows))
+            if exact_below is not None and estimate < exact_below:
+                return await self.count(**kwargs)
+        return estimate
+
+    async def raw(self, sql: str, *params) -> QuerySet:
+        """Runs a hand written query and builds the instances from its rows, the selected columns
+        must be fields of the model. The parameters use the placeholders of the driver (%s or $1)"""
+        with deadline(self._timeout):
+            rows = await self.db.fetch_rows(sql, *params)
+        return QuerySet(self.model, self.model._from_rows(*rows), sql, params)
 
     async def create(self, **kwargs):
         """
@@ -150,6 +348,11 @@ class AsyncManager(Manager):
                 kwargs[field_name] = field._get_default_python_val()
 
         query, values = self.model._query_gen.generate_insert_query(True, asyncpg=True, **kwargs)
-        new_instance_data = await self.db.fetchrow(query, *values)
+        new_instance_data = {}
+        with deadline(self._timeout):
+            async with self.model._change_feed("insert", new_instance_data):
+                new_instance_data.update(await self.db.fetchrow(query, *values))
 
-        return self.model(**new_instance_data)
+        instance = self.model(**new_instance_data)
+        instance._mark_clean()
+        return instance
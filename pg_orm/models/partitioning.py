@@ -0,0 +1,197 @@
+import datetime
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from pg_orm.errors import SchemaError
+
+
+def _literal(value):
+    """Renders a python value as a SQL literal for partition bounds and view definitions"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return "ARRAY[%s]" % ", ".join(_literal(v) for v in value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    return "'%s'" % str(value).replace("'", "''")
+
+
+class Partition:
+    """Base class of the native PostgreSQL partitioning declarations"""
+
+    method: str = None  # RANGE, LIST or HASH
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def to_sql(self):
+        return f"PARTITION BY {self.method} ({self.key})"
+
+    def validate(self, fields):
+        if self.key not in fields:
+            raise SchemaError(f"Partition key '{self.key}' is not a field of the model.")
+
+    def creation_statements(self, table_name: str, now: datetime.datetime = None) -> List[str]:
+        """Statements which create the partitions which should exist at the given time"""
+        raise NotImplementedError
+
+    def expiry_statements(self, table_name: str, existing: Iterable[str],
+                          now: datetime.datetime = None) -> List[str]:
+        """Statements which detach/drop the expired partitions"""
+        return []
+
+    def _partition_of(self, table_name, name, bounds):
+        return f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} {bounds}"
+
+    def __repr__(self):
+        return "<%s key=%s>" % (type(self).__name__, self.key)
+
+
+class RangePartition(Partition):
+    """Partitions a table by ranges of a DateTimeField.
+
+    One partition is created per ``interval`` ("day", "week", "month" or "year").
+    ``premake`` future partitions are created ahead of time and, when ``retention`` is set,
+    partitions older than ``retention`` intervals are dropped (or only detached if ``detach`` is True).
+    """
+
+    method = "RANGE"
+    intervals = ("day", "week", "month", "year")
+    name_pattern = re.compile(r"_p(\d{8})$")
+
+    def __init__(
+            self,
+            key: str,
+            interval: str = "month",
+            premake: int = 3,
+            retention: Optional[int] = None,
+            detach: bool = False,
+            default: bool = False,
+    ):
+        super().__init__(key)
+        if interval not in self.intervals:
+            raise SchemaError(f"Invalid partition interval. Choices are: {', '.join(self.intervals)}")
+
+        self.interval = interval
+        self.premake = premake
+        self.retention = retention
+        self.detach = detach
+        self.default = default
+
+    def validate(self, fields):
+        from pg_orm.models.fields import DateTimeField
+
+        super().validate(fields)
+        if not isinstance(fields[self.key], DateTimeField):
+            raise SchemaError("Range partitions can only be keyed by a DateTimeField.")
+
+    def floor(self, value: datetime.datetime) -> datetime.datetime:
+        """Returns the start of the interval which contains the given value"""
+        value = datetime.datetime(value.year, value.month, value.day)
+        if self.interval == "week":
+            return value - datetime.timedelta(days=value.weekday())
+        elif self.interval == "month":
+            return value.replace(day=1)
+        elif self.interval == "year":
+            return value.replace(month=1, day=1)
+        return value
+
+    def step(self, start: datetime.datetime, count: int = 1) -> datetime.datetime:
+        """Moves the start of an interval by ``count`` intervals"""
+        if self.interval == "day":
+            return start + datetime.timedelta(days=count)
+        elif self.interval == "week":
+            return start + datetime.timedelta(weeks=count)
+        elif self.interval == "month":
+            month = start.month - 1 + count
+            return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+        return start.replace(year=start.year + count)
+
+    def partition_name(self, table_name: str, start: datetime.datetime) -> str:
+        return f"{table_name}_p{start:%Y%m%d}"
+
+    def creation_statements(self, table_name, now=None):
+        start = self.floor(now or datetime.datetime.now())
+        statements = []
+
+        for _ in range(self.premake + 1):
+            end = self.step(start)
+            bounds = f"FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})"
+            statements.append(self._partition_of(table_name, self.partition_name(table_name, start), bounds))
+            start = end
+
+        if self.default:
+            statements.append(self._partition_of(table_name, f"{table_name}_default", "DEFAULT"))
+
+        return statements
+
+    def expiry_statements(self, table_name, existing, now=None):
+        if self.retention is None:
+            return []
+
+        cutoff = self.step(self.floor(now or datetime.datetime.now()), -self.retention)
+        statements = []
+
+        for name in sorted(existing):
+            match = self.name_pattern.search(name)
+            if match is None:
+                continue
+
+            start = datetime.datetime.strptime(match.group(1), "%Y%m%d")
+            if self.step(start) <= cutoff:
+                statements.append(f"ALTER TABLE {table_name} DETACH PARTITION {name}")
+                if not self.detach:
+                    statements.append(f"DROP TABLE IF EXISTS {name}")
+
+        return statements
+
+
+class ListPartition(Partition):
+    """Partitions a table by discrete values of a column.
+
+    ``values`` maps the suffix of each partition to the values it holds,
+    e.g. ``{"eu": ["de", "fr"], "us": ["us"]}``.
+    """
+
+    method = "LIST"
+
+    def __init__(self, key: str, values: Dict[str, Iterable[Any]], default: bool = True):
+        super().__init__(key)
+        self.values = values
+        self.default = default
+
+    def creation_statements(self, table_name, now=None):
+        statements = []
+        for suffix, values in self.values.items():
+            bounds = "FOR VALUES IN (%s)" % ", ".join(_literal(v) for v in values)
+            statements.append(self._partition_of(table_name, f"{table_name}_{suffix}", bounds))
+
+        if self.default:
+            statements.append(self._partition_of(table_name, f"{table_name}_default", "DEFAULT"))
+
+        return statements
+
+
+class HashPartition(Partition):
+    """Spreads the rows of a table over ``modulus`` partitions by the hash of a column"""
+
+    method = "HASH"
+
+    def __init__(self, key: str, modulus: int):
+        super().__init__(key)
+        if modulus < 1:
+            raise SchemaError("The modulus of a hash partition must be at least 1.")
+        self.modulus = modulus
+
+    def creation_statements(self, table_name, now=None):
+        return [
+            self._partition_of(
+                table_name, f"{table_name}_h{remainder}",
+                f"FOR VALUES WITH (MODULUS {self.modulus}, REMAINDER {remainder})"
+            )
+            for remainder in range(self.modulus)
+        ]
@@ -1,7 +1,8 @@
-import asyncio
 import pg_orm
-
-loop = asyncio.get_event_loop()
+from pg_orm.errors import FiledError, SchemaError, DBError
+from pg_orm.models import binary
+from pg_orm.models.codecs import json_dumps
+from pg_orm.models.partitioning import _literal
 
 
 class QueryGenerator:
@@ -10,11 +11,84 @@ class QueryGenerator:
 
     def generate_table_creation_query(self):
         model = self.model
-        columns = [f"{field.column_name} {field.to_sql()}" for field in model.fields.values()]
-        return "CREATE TABLE IF NOT EXISTS %s (%s)" % (model.table_name, ",\n".join(columns))
+        partitioning = model.partition_by
+
+        if model.view_query is not None:
+            return f"CREATE MATERIALIZED VIEW IF NOT EXISTS {model.table_name} AS {model.view_query} WITH DATA"
+
+        if partitioning is None:
+            columns = [f"{field.column_name} {field.to_sql()}" for field in model.fields.values()]
+            return "CREATE TABLE IF NOT EXISTS %s (%s)" % (model.table_name, ",\n".join(columns))
+
+        # Unique constraints of a partitioned table have to include the partition key
+        columns = [f"{field.column_name} {field.to_sql(constraints=False)}" for field in model.fields.values()]
+        for field in model.fields.values():
+            keys = ", ".join(dict.fromkeys((field.column_name, partitioning.key)))
+            if field.primary_key:
+                columns.append(f"PRIMARY KEY ({keys})")
+            elif field.is_unique:
+                columns.append(f"UNIQUE ({keys})")
+
+        return "CREATE TABLE IF NOT EXISTS %s (%s) %s" % (
+            model.table_name, ",\n".join(columns), partitioning.to_sql()
+        )
+
+    def generate_drop_query(self, table_name=None):
+        table_name = table_name or self.model.table_name
+        if self.model.view_query is not None:
+            return f"DROP MATERIALIZED VIEW IF EXISTS {table_name} CASCADE;"
+        return f"DROP TABLE {table_name} CASCADE;"
+
+    def generate_refresh_query(self, concurrently=False):
+        model = self.model
+        if concurrently and not any(index.unique and not index.where for index in model.indexes):
+            raise SchemaError(
+                f"REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index, "
+                f"give '{model.table_name}' a primary_key/unique field or a unique Index."
+            )
+        return f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{model.table_name};"
+
+    def generate_index_creation_queries(self, concurrently=False):
+        model = self.model
+        # Partitioned tables can't be indexed concurrently
+        concurrently = concurrently and model.partition_by is None
+        return [
+            statement for index in model.indexes
+            for statement in index.creation_statements(model.table_name, model.fields, concurrently)
+        ]
+
+    def generate_partition_creation_queries(self, now=None):
+        partitioning = self.model.partition_by
+        if partitioning is None:
+            return []
+        return partitioning.creation_statements(self.model.table_name, now)
+
+    def generate_partition_expiry_queries(self, existing, now=None):
+        partitioning = self.model.partition_by
+        if partitioning is None:
+            return []
+        return partitioning.expiry_statements(self.model.table_name, existing, now)
+
+    def generate_partition_list_query(self, asyncpg=False):
+        param = "$1" if asyncpg else "%s"
+        return (
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            f"WHERE i.inhparent = to_regclass({param});"
+        )
+
+    def _writable(self, data: dict):
+        """Leaves out the generated columns, they can't be written"""
+        fields = self.model.fields
+        return {k: v for k, v in data.items() if not (k in fields and fields[k].generated)}
+
+    def _check_writable(self):
+        if self.model.view_query is not None:
+            raise DBError(f"'{self.model.table_name}' is a materialized view, refresh() it instead of writing to it.")
 
     def generate_insert_query(self, return_inserted=False, asyncpg=False, **kwargs):
+        self._check_writable()
         model = self.model
+        kwargs = self._writable(kwargs)
         values = []
         for v in kwargs.values():
             if isinstance(v, pg_orm.models.base_model.Model):
@@ -44,44 +118,237 @@ class QueryGenerator:
 
             return query, values
 
-    def generate_update_query(self, asyncpg=False, **kwargs):
+    def generate_bulk_insert_query(self, columns, rows, asyncpg=False):
+        """One INSERT of many rows, the rows are tuples in the order of columns"""
+        self._check_writable()
+        args = []
+        param = self._param(args, asyncpg)
+        values = ", ".join(f"({', '.join(param(value) for value in row)})" for row in rows)
+        return f"INSERT INTO {self.model.table_name} ({', '.join(columns)}) VALUES {values}", args
+
+    def generate_update_query(self, asyncpg=False, *, fields=None, row=None, **kwargs):
+        """``fields`` limits the SET clause to those columns, the id and the partition key
+        of the row are still taken from kwargs. ``row`` are the values the row is stored with
+        (see BaseModel._row_values), the partition key is filtered on them instead when it changed"""
+        self._check_writable()
         self._check_id(kwargs, "update")
         model = self.model
         id = kwargs["id"]
+        values = self._writable(kwargs if fields is None else {k: kwargs[k] for k in fields})
+        args = tuple(values.values())
+        # The partition key goes before the id so the caller can keep passing the id last
+        key_filter, key_args = self._get_partition_key_filter(kwargs if row is None else row, len(args), asyncpg)
 
         if not asyncpg:
-            new_values = ", ".join([f"{k}=%s" for k in kwargs.keys()])
-            query = f"UPDATE {model.table_name} SET {new_values} WHERE id=%s"
-            return query, tuple(kwargs.values()), id
+            new_values = ", ".join(self._get_psycopg2_values(values))
+            query = f"UPDATE {model.table_name} SET {new_values} WHERE {key_filter}id=%s"
+            return query, args + key_args, id
         else:
-            values = self._get_asyncpg_values(kwargs)
-            new_values = ", ".join(values)
-            query = f"UPDATE {self.model.table_name} SET {new_values} WHERE id=${len(values) + 1}"
-            return query, tuple(kwargs.values()), id
+            new_values = ", ".join(self._get_asyncpg_values(values))
+            query = f"UPDATE {self.model.table_name} SET {new_values} " \
+                    f"WHERE {key_filter}id=${len(values) + len(key_args) + 1}"
+            return query, args + key_args, id
 
     def generate_row_deletion_query(self, asyncpg=False, *, column="id", **kwargs):
         # column is a key word argument to prevent it being accidentally passed in
+        self._check_writable()
         self._check_id(kwargs, "delete")
+        key_filter, key_args = self._get_partition_key_filter(kwargs, 0, asyncpg)
+        param = f"${len(key_args) + 1}" if asyncpg else "%s"
 
-        if not asyncpg:
-            return f"DELETE FROM {self.model.table_name} WHERE {column}=%s;", kwargs[column]
-        else:
-            return f"DELETE FROM {self.model.table_name} WHERE {column}=1$", kwargs[column]
+        return f"DELETE FROM {self.model.table_name} WHERE {key_filter}{column}={param};", \
+            key_args + (kwargs[column],)
 
-    def generate_select_query(self, asyncpg=False, **kwargs):
-        if not asyncpg:
-            params = [f"{key}=%s" for key in kwargs.keys()]
-            query = "SELECT * FROM {0} WHERE {1};".format(
-                self.model.table_name, " AND ".join(params)
-            )
-            return query, tuple(kwargs.values())
+    def generate_select_query(self, asyncpg=False, *, columns=None, order_by=None, limit=None, lock=None,
+                              **kwargs):
+        # columns, order_by, limit and lock are key word arguments for the same reason as in
+        # generate_row_deletion_query, lock is a locking clause from generate_lock_clause
+        where, args = self.compile_where(kwargs, asyncpg)
+        query = "SELECT {0} FROM {1}{2}{3}{4}{5};".format(
+            self.generate_select_list(columns), self.model.table_name, f" WHERE {where}" if where else "",
+            f" ORDER BY {order_by}" if order_by else "", f" LIMIT {int(limit)}" if limit is not None else "",
+            f" {lock}" if lock else "",
+        )
+        return query, tuple(args)
 
-        else:
-            params = self._get_asyncpg_values(kwargs)
-            query = "SELECT * FROM {0} WHERE {1};".format(
-                self.model.table_name, " AND ".join(params)
-            )
-            return query, tuple(kwargs.values())
+    def generate_lock_clause(self, skip_locked=False, nowait=False, of=()):
+        """FOR UPDATE [OF table, ...] [SKIP LOCKED | NOWAIT], ``of`` takes models and table names"""
+        if skip_locked and nowait:
+            raise ValueError("skip_locked and nowait can't be used together.")
+        if self.model.is_view:
+            raise DBError(f"The rows of the materialized view '{self.model.table_name}' can't be locked.")
+
+        tables = [table if isinstance(table, str) else table.table_name for table in of]
+        clause = "FOR UPDATE" + (f" OF {', '.join(tables)}" if tables else "")
+        if skip_locked:
+            clause += " SKIP LOCKED"
+        elif nowait:
+            clause += " NOWAIT"
+        return clause
+
+    def generate_count_query(self, asyncpg=False, **kwargs):
+        where, args = self.compile_where(kwargs, asyncpg)
+        query = f"SELECT count(*) FROM {self.model.table_name}{f' WHERE {where}' if where else ''};"
+        return query, tuple(args)
+
+    def generate_estimated_count_query(self, asyncpg=False):
+        """The rows of the table according to the statistics of the last VACUUM/ANALYZE,
+        the partitions of a partitioned table are summed. reltuples is -1 for a table which was never analyzed"""
+        param = "$1" if asyncpg else "%s"
+        return (
+            "SELECT coalesce(sum(greatest(c.reltuples, 0)), 0)::bigint FROM pg_class c "
+            f"WHERE c.oid = to_regclass({param}) "
+            f"OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass({param}));"
+        ), (self.model.table_name,) if asyncpg else (self.model.table_name,) * 2
+
+    def generate_literal_select_query(self, *, columns=None, **kwargs):
+        """generate_select_query with the values inlined, used as the query of a MaterializedView"""
+        where, _ = self.compile_where(kwargs, literal=True)
+        return "SELECT {0} FROM {1}{2}".format(
+            self.generate_select_list(columns), self.model.table_name, f" WHERE {where}" if where else ""
+        )
+
+    def generate_select_list(self, columns=None):
+        return ", ".join(columns) if columns else "*"
+
+    def generate_deferred_load_query(self, columns, asyncpg=False):
+        param = "$1" if asyncpg else "%s"
+        return f"SELECT id, {', '.join(columns)} FROM {self.model.table_name} WHERE id = ANY({param});"
+
+    def generate_notify_query(self, operation: str, data: dict, asyncpg=False):
+        """The pg_notify of a write made through the ORM, the payload is {"table", "op", "id"}"""
+        params = ("$1", "$2") if asyncpg else ("%s", "%s")
+        payload = json_dumps({"table": self.model.table_name, "op": operation, "id": data.get("id")})
+        return f"SELECT pg_notify({params[0]}, {params[1]});", (self.model.notify_channel, payload)
+
+    def generate_notify_trigger_queries(self):
+        """A row trigger which sends the same notifications as generate_notify_query for every write,
+        including the ones which don't go through the ORM"""
+        table = self.model.table_name
+        function = f"{table}_notify"[:63]
+        payload = "json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'id', {0}.id)::text"
+        channel = self.model.notify_channel
+        return [
+            f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+            f"BEGIN\n"
+            f"    IF TG_OP = 'DELETE' THEN\n"
+            f"        PERFORM pg_notify('{channel}', {payload.format('OLD')});\n"
+            f"    ELSE\n"
+            f"        PERFORM pg_notify('{channel}', {payload.format('NEW')});\n"
+            f"    END IF;\n"
+            f"    RETURN NULL;\n"
+            f"END $$;",
+            f"DROP TRIGGER IF EXISTS {function} ON {table};",
+            f"CREATE TRIGGER {function} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {function}();",
+        ]
+
+    def generate_notify_trigger_drop_queries(self):
+        function = f"{self.model.table_name}_notify"[:63]
+        return [
+            f"DROP TRIGGER IF EXISTS {function} ON {self.model.table_name};",
+            f"DROP FUNCTION IF EXISTS {function}();",
+        ]
+
+    def generate_binary_read_query(self, column, asyncpg=False, *, row=None):
+        """Reads a slice of a BYTEA column, returns the query and the partition key arguments of ``row``.
+        The arguments are the 1 based offset, the length, the partition key arguments and the id"""
+        key_filter, key_args = self._get_partition_key_filter(row or {}, 2, asyncpg)
+        offset, length, id = ("$1", "$2", f"${len(key_args) + 3}") if asyncpg else ("%s", "%s", "%s")
+        query = f"SELECT substring({column} FROM {offset} FOR {length}) FROM {self.model.table_name} " \
+                f"WHERE {key_filter}id={id};"
+        return query, key_args
+
+    def generate_binary_write_queries(self, column, asyncpg=False, *, row=None):
+        """Returns the statements which create the chunk table, insert a chunk (position, data),
+        write the concatenated chunks to the row and empty the chunk table, and the partition key arguments of ``row``.
+        The UPDATE takes the partition key arguments, then the id"""
+        param = (lambda i: f"${i}") if asyncpg else (lambda i: "%s")
+        table = binary.CHUNK_TABLE
+        key_filter, key_args = self._get_partition_key_filter(row or {}, 0, asyncpg)
+        return (
+            f"CREATE TEMP TABLE IF NOT EXISTS {table} (position INTEGER, data BYTEA) ON COMMIT DROP;",
+            f"INSERT INTO {table} (position, data) VALUES ({param(1)}, {param(2)});",
+            f"UPDATE {self.model.table_name} SET {column} = "
+            f"(SELECT coalesce(string_agg({table}.data, ''::bytea ORDER BY {table}.position), ''::bytea) "
+            f"FROM {table}) "
+            f"WHERE {key_filter}id={param(len(key_args) + 1)};",
+            f"TRUNCATE {table};",
+        ), key_args
+
+    def generate_search_query(self, asyncpg=False, *, columns=None, limit=None, lock=None, **kwargs):
+        """A column is matched with the search_lookup of its field (LIKE '%value%' for text, full text search
+        for a SearchVectorField), column__lookup is used as is. The rows are ordered by the ranks of the lookups
+        which have one (ts_rank, trigram similarity). limit and lock are the ones of generate_select_query."""
+        fields = self.model.fields
+        lookups = {}
+        for key, value in kwargs.items():
+            column, *lookup = key.split("__")
+            field = fields.get(column)
+            if field is None:
+                raise FiledError(key, fields.keys())
+            lookups[key if lookup else f"{column}__{field.search_lookup}"] = value
+
+        where, args = self.compile_where(lookups, asyncpg)
+        param = self._param(args, asyncpg)
+        ranks = []
+        for key, value in lookups.items():
+            column, *lookup = key.split("__")
+            rank = fields[column].compile_rank(column, lookup, value, param)
+            if rank is not None:
+                ranks.append(rank)
+
+        query = "SELECT {0} FROM {1}{2}{3}{4}{5};".format(
+            self.generate_select_list(columns),
+            self.model.table_name,
+            f" WHERE {where}" if where else "",
+            f" ORDER BY {' + '.join(ranks)} DESC" if ranks else "",
+            f" LIMIT {int(limit)}" if limit is not None else "",
+            f" {lock}" if lock else "",
+        )
+        return query, tuple(args)
+
+    @staticmethod
+    def _param(args: list, asyncpg=False, offset=0):
+        """Returns param(value), which adds an argument and returns its placeholder.
+        param.percent is the % operator escaped for the driver"""
+        def param(value):
+            args.append(value)
+            return f"${offset + len(args)}" if asyncpg else "%s"
+
+        param.percent = "%" if asyncpg else "%%"
+        return param
+
+    def compile_where(self, lookups: dict, asyncpg=False, offset=0, literal=False):
+        """Compiles the filter() keyword arguments (column or column__lookup) into a condition and its arguments,
+        literal=True inlines the values instead, for statements which can't take parameters"""
+        fields = self.model.fields
+        args = []
+        param = self._param(args, asyncpg, offset)
+        if literal:
+            def param(value):
+                return _literal(value)
+
+            param.percent = "%"
+
+        conditions = []
+        for key, value in lookups.items():
+            column, *lookup = key.split("__")
+            field = fields.get(column)
+            if field is None:
+                raise FiledError(key, fields.keys())
+            conditions.append(field.compile_lookup(column, lookup, value, param))
+
+        return " AND ".join(conditions), args
+
+    def _get_partition_key_filter(self, data: dict, offset: int, asyncpg=False):
+        """Returns a condition on the partition key so the planner only touches one partition"""
+        partitioning = self.model.partition_by
+        if partitioning is None or data.get(partitioning.key) is None:
+            return "", ()
+
+        param = f"${offset + 1}" if asyncpg else "%s"
+        return f"{partitioning.key}={param} AND ", (data[partitioning.key],)
 
     def _check_id(self, data: dict, operation: str = "operation"):
         if data.get("id") is None:
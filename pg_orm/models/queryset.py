@@ -1,7 +1,12 @@
+from pg_orm.models import explain as _explain
+
+
 class QuerySet(list):
-    """Subclass of list"""
-    def __init__(self, model, query_set):
+    """Subclass of list, ``query`` and ``args`` are the statement which loaded the rows"""
+    def __init__(self, model, query_set, query=None, args=()):
         self.model = model
+        self.query = query
+        self.args = tuple(args)
         super().__init__(query_set)
     
     def append(self, model):
@@ -19,6 +24,45 @@ class QuerySet(list):
         else:
             raise AttributeError(f"{self.model.__name__} has no attribute {attribute} to order by")
 
+    def load_deferred(self, *names):
+        """Loads the deferred fields (all of them by default) of every instance with one query per field set,
+        returns an awaitable for async models"""
+        groups = {id(g): g for g in (instance._deferred for instance in self) if g is not None}.values()
+        if self.model._is_sync:
+            for group in groups:
+                group.load(names)
+            return None
+
+        async def load():
+            for group in groups:
+                await group.async_load(names)
+
+        return load()
+
+    def explain(self, analyze=False, buffers=False, format="json", seq_scan_rows=None):
+        """Returns the plan of the query which loaded the QuerySet, the top level dict of the JSON plan
+        or the text of the other formats. analyze=True runs the query again.
+        With seq_scan_rows, sequential scans reading at least that many rows are logged as warnings.
+        Returns an awaitable for async models"""
+        if self.query is None:
+            raise ValueError("The QuerySet was not loaded by a query, there is nothing to explain.")
+
+        query = _explain.explain_query(self.query, analyze, buffers, format)
+
+        def parse(rows):
+            plan = _explain.parse_plan(rows, format)
+            if seq_scan_rows is not None and format.lower() == "json":
+                _explain.flag_seq_scans(plan, seq_scan_rows, self.query)
+            return plan
+
+        if self.model._is_sync:
+            return parse(self.model.db.fetch_rows(query, *self.args)[1])
+
+        async def run():
+            return parse((await self.model.db.fetch_rows(query, *self.args))[1])
+
+        return run()
+
     @property
     def raw(self):
         #  For backwards compatibility
@@ -1,6 +1,16 @@
-import inspect
-import asyncio
-from distutils.util import strtobool
+_TRUE_VALUES = ("y", "yes", "t", "true", "on", "1")
+_FALSE_VALUES = ("n", "no", "f", "false", "off", "0")
+
+
+def strtobool(value: str) -> int:
+    """Converts a string representation of truth to 1 or 0, like distutils.util.strtobool
+    (distutils is slow to import and was removed in python 3.12)"""
+    value = value.lower()
+    if value in _TRUE_VALUES:
+        return 1
+    elif value in _FALSE_VALUES:
+        return 0
+    raise ValueError("invalid truth value %r" % (value,))
 
 
 def quote(arg=None):
@@ -20,7 +30,25 @@ def quote(arg=None):
 
 
 def maybe_await(function, *args, **kwargs):
+    import inspect
+
     if inspect.iscoroutinefunction(function):
+        import asyncio
+
         return asyncio.get_event_loop().run_until_complete(function(*args, **kwargs))
     else:
         return function(*args, **kwargs)
+
+
+def qualified_name(value) -> str:
+    """module.qualname of a function or class, the name of its class for other callable objects"""
+    if not hasattr(value, "__qualname__"):
+        value = type(value)
+    return f"{value.__module__}.{value.__qualname__}"
+
+
+def locate(path):
+    """pydoc.locate, pydoc is only imported when a migration needs it since it is slow to import"""
+    import pydoc
+
+    return pydoc.locate(path)
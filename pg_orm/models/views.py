@@ -0,0 +1,60 @@
+import logging
+
+from pg_orm.models import cache
+from pg_orm.models.base_model import Model, AsyncModel
+
+log = logging.getLogger(__name__)
+
+
+class MaterializedView(Model, abstract=True):
+    """A model backed by a materialized view instead of a table, it is read through the manager like
+    any other model but can't be written to.
+
+    The view is defined by a query (SQL or ``Model.objects.sql(**filters)``), its fields describe the columns
+    the query returns. Fields declared as primary_key or unique get a unique index,
+    which refresh(concurrently=True) needs.
+
+        class DailySales(models.MaterializedView, table_name="daily_sales",
+                         query="SELECT date_trunc('day', created_at) AS day, sum(total) AS total "
+                               "FROM orders GROUP BY 1"):
+            day = models.DateTimeField(primary_key=True)
+            total = models.FloatField()
+    """
+
+    is_view = True
+
+    @classmethod
+    def refresh(cls, concurrently: bool = True):
+        """Recomputes the view, concurrently keeps it readable while it is refreshed"""
+        cls.db.execute(cls._query_gen.generate_refresh_query(concurrently))
+        cache.invalidate_after_commit(cls.db, cls.table_name)
+
+
+class AsyncMaterializedView(AsyncModel, abstract=True):
+    """MaterializedView for the async orm"""
+
+    is_view = True
+
+    @classmethod
+    async def refresh(cls, concurrently: bool = True):
+        """Recomputes the view, concurrently keeps it readable while it is refreshed"""
+        await cls.db.execute(cls._query_gen.generate_refresh_query(concurrently))
+        cache.invalidate_after_commit(cls.db, cls.table_name)
+
+    @classmethod
+    def schedule_refresh(cls, interval: float, concurrently: bool = True) -> "asyncio.Task":
+        """Starts a task on the running event loop which refreshes the view every ``interval`` seconds,
+        failed refreshes are logged and retried on the next interval. Cancel the returned task to stop it."""
+        import asyncio
+
+        cls._query_gen.generate_refresh_query(concurrently)  # Fails now rather than in the task
+
+        async def refresher():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await cls.refresh(concurrently)
+                except Exception:
+                    log.exception(f"Refreshing the materialized view '{cls.table_name}' failed")
+
+        return asyncio.get_running_loop().create_task(refresher())
@@ -0,0 +1,247 @@
+"""Write-behind buffers which coalesce the saves of a model into batched inserts, see Model.write_behind"""
+import atexit
+import logging
+import threading
+
+import pg_orm
+from pg_orm.errors import BufferFull, DBError
+from pg_orm.models import cache
+
+log = logging.getLogger(__name__)
+
+# PostgreSQL takes at most 65535 parameters per statement
+MAX_PARAMS = 65535
+
+
+def _log_error(rows, error):
+    log.error(f"Flushing {len(rows)} buffered rows failed, they were dropped", exc_info=error)
+
+
+class _BaseBuffer:
+    def __init__(self, model, max_rows=1000, flush_interval=1.0, max_pending=10000, put_timeout=None,
+                 use_copy=True, on_error=None):
+        if model.notify is True:
+            raise ValueError(f"{model.__name__} sends its notifications from save(), "
+                             f"use notify='trigger' to buffer its writes.")
+        if max_pending < max_rows:
+            raise ValueError("max_pending can't be smaller than max_rows.")
+        model._query_gen._check_writable()
+
+        self.model = model
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.use_copy = use_copy
+        self.on_error = on_error or _log_error
+        self.flushed = 0
+        self._rows = []
+        self._closed = False
+
+    def _row(self, instance) -> dict:
+        # A copy, the instance can change after save() returned
+        data = self.model._query_gen._writable(instance.attrs)
+        base_model = pg_orm.models.base_model.BaseModel
+        return {k: v.id if isinstance(v, base_model) else v for k, v in data.items()}
+
+    def _groups(self, rows):
+        """Splits the rows by the columns they have, in the order of the fields"""
+        groups = {}
+        for row in rows:
+            columns = tuple(name for name in self.model.fields if name in row)
+            groups.setdefault(columns, []).append(tuple(row[name] for name in columns))
+        return groups.items()
+
+    def _inserts(self, columns, records, asyncpg=False):
+        """Multi-row INSERTs of the records, split to stay under the parameter limit"""
+        size = max(MAX_PARAMS // max(len(columns), 1), 1)
+        for start in range(0, len(records), size):
+            yield self.model._query_gen.generate_bulk_insert_query(columns, records[start:start + size], asyncpg)
+
+    def _copy(self):
+        return self.use_copy and hasattr(self.model.db, "copy_records")
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class WriteBehindBuffer(_BaseBuffer):
+    """Collects the saves of a sync model and writes them from a background thread with multi-row INSERTs
+    (or COPY on drivers which support it) once ``max_rows`` are pending or every ``flush_interval`` seconds.
+
+    save() blocks while ``max_pending`` rows wait to be written (BufferFull is raised after ``put_timeout``).
+    The instances don't get their id and failed batches are passed to on_error(rows, error) and dropped,
+    the durability is eventual. close() (also called at exit) writes what is left."""
+
+    def __init__(self, model, **options):
+        super().__init__(model, **options)
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name=f"pg_orm-write-behind-{model.table_name}", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def save(self, instance):
+        row = self._row(instance)
+        with self._condition:
+            if self._closed:
+                raise DBError(f"The write-behind buffer of {self.model.__name__} is closed.")
+            if not self._condition.wait_for(lambda: len(self._rows) < self.max_pending, self.put_timeout):
+                raise BufferFull(f"{len(self._rows)} rows of {self.model.__name__} are waiting to be written.")
+
+            self._rows.append(row)
+            if len(self._rows) >= self.max_rows:
+                self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or len(self._rows) >= self.max_rows,
+                                         self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                pass  # Passed to on_error by flush
+            if closed:
+                return
+
+    def flush(self) -> int:
+        """Writes the pending rows now, returns their number"""
+        with self._flush_lock:
+            with self._condition:
+                rows, self._rows = self._rows, []
+                self._condition.notify_all()
+            if not rows:
+                return 0
+
+            try:
+                self._write(rows)
+            except Exception as e:
+                self.on_error(rows, e)
+                raise
+            self.flushed += len(rows)
+            return len(rows)
+
+    def _write(self, rows):
+        db = self.model.db
+        table = self.model.table_name
+        with db.transaction():
+            for columns, records in self._groups(rows):
+                if self._copy():
+                    db.copy_records(table, columns, records)
+                    continue
+                for query, args in self._inserts(columns, records):
+                    db.execute(query, *args)
+        cache.invalidate_after_commit(db, table)
+
+    def close(self):
+        """Writes the pending rows and stops the background thread"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        atexit.unregister(self.close)
+        self._thread.join()
+        if self.model._write_behind is self:
+            self.model._write_behind = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncWriteBehindBuffer(_BaseBuffer):
+    """WriteBehindBuffer of async models, the rows are written by a task of the running event loop.
+    await close() on shutdown to write what is left."""
+
+    def __init__(self, model, **options):
+        import asyncio
+
+        super().__init__(model, **options)
+        self._condition = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def save(self, instance):
+        import asyncio
+
+        row = self._row(instance)
+        async with self._condition:
+            if self._closed:
+                raise DBError(f"The write-behind buffer of {self.model.__name__} is closed.")
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: len(self._rows) < self.max_pending), self.put_timeout
+                )
+            except asyncio.TimeoutError:
+                raise BufferFull(f"{len(self._rows)} rows of {self.model.__name__} are waiting to be written.")
+
+            self._rows.append(row)
+            if len(self._rows) >= self.max_rows:
+                self._condition.notify_all()
+
+    async def _run(self):
+        import asyncio
+
+        while True:
+            async with self._condition:
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: self._closed or len(self._rows) >= self.max_rows),
+                        self.flush_interval,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                closed = self._closed
+            try:
+                await self.flush()
+            except Exception:
+                pass  # Passed to on_error by flush
+            if closed:
+                return
+
+    async def flush(self) -> int:
+        """Writes the pending rows now, returns their number"""
+        async with self._flush_lock:
+            async with self._condition:
+                rows, self._rows = self._rows, []
+                self._condition.notify_all()
+            if not rows:
+                return 0
+
+            try:
+                await self._write(rows)
+            except Exception as e:
+                self.on_error(rows, e)
+                raise
+            self.flushed += len(rows)
+            return len(rows)
+
+    async def _write(self, rows):
+        db = self.model.db
+        table = self.model.table_name
+        async with db.transaction():
+            for columns, records in self._groups(rows):
+                if self._copy():
+                    await db.copy_records(table, columns, records)
+                    continue
+                for query, args in self._inserts(columns, records, True):
+                    await db.execute(query, *args)
+        cache.invalidate_after_commit(db, table)
+
+    async def close(self):
+        """Writes the pending rows and stops the background task"""
+        async with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        await self._task
+        if self.model._write_behind is self:
+            self.model._write_behind = None
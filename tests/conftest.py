@@ -0,0 +1,128 @@
+import contextlib
+
+import pytest
+
+
+class RecordingDriver:
+    """Stands in for the database: records the statements sent through it as (query, args)
+    and answers every read with ``rows`` of ``columns``.
+
+    ``responses`` maps a part of a statement to the (columns, rows) returned for it instead, or to a function
+    of the arguments which returns them. fetchval returns ``value``. transaction() records BEGIN and
+    COMMIT/ROLLBACK around the outermost block and runs the after_transaction callbacks once it ends."""
+
+    def __init__(self, columns=("id",), rows=(), value=None, responses=None):
+        self.columns = tuple(columns)
+        self.rows = list(rows)
+        self.value = value
+        self.responses = dict(responses or {})
+        self.queries = []
+        self.depth = 0
+        self._after_transaction = []
+
+    def _respond(self, query, args):
+        self.queries.append((query, args))
+        for part, response in self.responses.items():
+            if part in query:
+                return response(*args) if callable(response) else response
+        return self.columns, self.rows
+
+    def _begin(self):
+        self.depth += 1
+        if self.depth == 1:
+            self.queries.append("BEGIN")
+
+    def _end(self, status):
+        self.depth -= 1
+        if self.depth == 0:
+            self.queries.append(status)
+            callbacks, self._after_transaction = self._after_transaction, []
+            for callback in callbacks:
+                callback()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self._begin()
+        try:
+            yield self
+        except BaseException:
+            self._end("ROLLBACK")
+            raise
+        self._end("COMMIT")
+
+    def in_transaction(self):
+        return self.depth > 0
+
+    def after_transaction(self, callback):
+        if self.depth:
+            self._after_transaction.append(callback)
+        else:
+            callback()
+
+    def execute(self, query, *args, **kwargs):
+        self.queries.append((query, args))
+
+    def fetch_rows(self, query, *args):
+        return self._respond(query, args)
+
+    def fetchall(self, query, *args):
+        columns, rows = self._respond(query, args)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetchone(self, query, *args, **kwargs):
+        rows = self.fetchall(query, *args)
+        return rows[0] if rows else {}
+
+    def fetchval(self, query, *args, **kwargs):
+        self.queries.append((query, args))
+        return self.value
+
+
+class AsyncRecordingDriver(RecordingDriver):
+    """RecordingDriver of async models"""
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        self._begin()
+        try:
+            yield self
+        except BaseException:
+            self._end("ROLLBACK")
+            raise
+        self._end("COMMIT")
+
+    async def execute(self, query, *args, **kwargs):
+        super().execute(query, *args)
+
+    async def fetch_rows(self, query, *args):
+        return super().fetch_rows(query, *args)
+
+    async def fetch(self, query, *args):
+        return super().fetchall(query, *args)
+
+    async def fetchrow(self, query, *args):
+        return super().fetchone(query, *args) or None
+
+    async def fetchval(self, query, *args):
+        return super().fetchval(query, *args)
+
+
+@pytest.fixture
+def recording_db():
+    """Returns use(*models, driver_class=None, **options), which sets a RecordingDriver (an AsyncRecordingDriver
+    for async models) built with the options as the driver of the models and returns it.
+    The models are left without a driver after the test."""
+    used = []
+
+    def use(*models, driver_class=None, **options):
+        if driver_class is None:
+            driver_class = RecordingDriver if models[0]._is_sync else AsyncRecordingDriver
+        driver = driver_class(**options)
+        for model in models:
+            model.set_db(driver)
+            used.append(model)
+        return driver
+
+    yield use
+    for model in used:
+        model.set_db(None)
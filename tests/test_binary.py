@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+import io
+
+from conftest import RecordingDriver, AsyncRecordingDriver
+from pg_orm import models
+from pg_orm.models.binary import CHUNK_TABLE, iter_chunks, aiter_chunks
+
+DATA = bytes(range(256)) * 4
+MAY = datetime.datetime(2024, 5, 3)
+
+
+class Attachment(models.Model, table_name="bin_attachments"):
+    content = models.BinaryField(deferred=True)
+
+
+class Scan(models.Model, table_name="bin_scans", partition_by=models.RangePartition("created_at")):
+    created_at = models.DateTimeField()
+    content = models.BinaryField(deferred=True)
+
+
+class AsyncScan(models.AsyncModel, table_name="bin_async_scans", partition_by=models.RangePartition("created_at")):
+    created_at = models.DateTimeField()
+    content = models.BinaryField(deferred=True)
+
+
+def read_chunk(db, query, offset, length, *args):
+    """Answers a substring() read with the slice of DATA"""
+    db.queries.append((query, (offset, length) + args))
+    return DATA[offset - 1:offset - 1 + length]
+
+
+class ChunkDriver(RecordingDriver):
+    def fetchval(self, query, *args):
+        return read_chunk(self, query, *args)
+
+
+class AsyncChunkDriver(AsyncRecordingDriver):
+    async def fetchval(self, query, *args):
+        return read_chunk(self, query, *args)
+
+
+def test_bytes_are_sliced_without_copies():
+    chunks = list(iter_chunks(DATA, 300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 124]
+    assert all(isinstance(chunk, memoryview) and chunk.obj is DATA for chunk in chunks)
+    assert b"".join(chunks) == DATA
+
+
+def test_file_like_objects_are_read_in_chunks():
+    assert b"".join(iter_chunks(io.BytesIO(DATA), 100)) == DATA
+    assert list(iter_chunks(io.BytesIO(b""), 100)) == []
+
+
+def test_async_sources():
+    async def generator():
+        yield b"ab"
+        yield b""
+        yield b"cd"
+
+    async def collect(source):
+        return [bytes(chunk) async for chunk in aiter_chunks(source, 2)]
+
+    assert asyncio.run(collect(generator())) == [b"ab", b"cd"]
+    assert asyncio.run(collect(b"abcde")) == [b"ab", b"cd", b"e"]
+
+
+def test_iter_binary(recording_db):
+    db = recording_db(Attachment, driver_class=ChunkDriver)
+    attachment = Attachment._from_rows(("id",), [(7,)])[0]
+
+    # The last read is empty when the length is a multiple of the chunk size
+    assert b"".join(attachment.iter_binary("content", 256)) == DATA
+    assert db.queries == [
+        ("SELECT substring(content FROM %s FOR %s) FROM bin_attachments WHERE id=%s;", (offset, 256, 7))
+        for offset in (1, 257, 513, 769, 1025)
+    ]
+
+    db.queries.clear()
+    assert [len(chunk) for chunk in attachment.iter_binary("content", 300)] == [300, 300, 300, 124]
+    assert [args[0] for _, args in db.queries] == [1, 301, 601, 901]
+
+
+def test_partitioned_binary_reads(recording_db):
+    db = recording_db(Scan, driver_class=ChunkDriver)
+    scan = Scan._from_rows(("id", "created_at"), [(7, MAY)])[0]
+    assert b"".join(scan.iter_binary("content", 1000)) == DATA
+    assert db.queries[0] == (
+        "SELECT substring(content FROM %s FOR %s) FROM bin_scans WHERE created_at=%s AND id=%s;", (1, 1000, MAY, 7)
+    )
+
+    async_db = recording_db(AsyncScan, driver_class=AsyncChunkDriver)
+    async_scan = AsyncScan._from_rows(("id", "created_at"), [(7, MAY)])[0]
+
+    async def read():
+        return [chunk async for chunk in async_scan.iter_binary("content", 1000)]
+
+    assert b"".join(asyncio.run(read())) == DATA
+    assert async_db.queries[0] == (
+        "SELECT substring(content FROM $1 FOR $2) FROM bin_async_scans WHERE created_at=$3 AND id=$4;",
+        (1, 1000, MAY, 7),
+    )
+
+
+def test_write_binary(recording_db):
+    db = recording_db(Attachment)
+    attachment = Attachment._from_rows(("id", "content"), [(7, b"old")])[0]
+    attachment.write_binary("content", io.BytesIO(DATA), 300)
+
+    statements = db.queries[1:-1]
+    assert statements[0][0].startswith(f"CREATE TEMP TABLE IF NOT EXISTS {CHUNK_TABLE}")
+    inserts = statements[1:-2]
+    # The chunks are numbered in the order they were read, the server concatenates them by position
+    assert [args[0] for _, args in inserts] == [0, 1, 2, 3]
+    assert b"".join(bytes(args[1]) for _, args in inserts) == DATA
+    assert statements[-2][0].endswith(f"FROM {CHUNK_TABLE}) WHERE id=%s;") and statements[-2][1] == (7,)
+    assert statements[-1] == (f"TRUNCATE {CHUNK_TABLE};", ())
+    assert db.queries[0] == "BEGIN" and db.queries[-1] == "COMMIT"
+    # The value loaded with the row is out of date
+    assert "content" not in attachment.attrs
+
+
+def test_partitioned_binary_writes(recording_db):
+    db = recording_db(Scan)
+    scan = Scan._from_rows(("id", "created_at"), [(7, MAY)])[0]
+    scan.write_binary("content", b"")
+    assert db.queries[-3] == (
+        f"UPDATE bin_scans SET content = (SELECT coalesce(string_agg({CHUNK_TABLE}.data, ''::bytea "
+        f"ORDER BY {CHUNK_TABLE}.position), ''::bytea) FROM {CHUNK_TABLE}) WHERE created_at=%s AND id=%s;",
+        (MAY, 7),
+    )
+
+    async_db = recording_db(AsyncScan)
+    async_scan = AsyncScan._from_rows(("id", "created_at"), [(7, MAY)])[0]
+    asyncio.run(async_scan.write_binary("content", b"abc", 2))
+    assert [args for _, args in async_db.queries[2:4]] == [(0, b"ab"), (1, b"c")]
+    assert async_db.queries[-3][0].endswith("WHERE created_at=$1 AND id=$2;") and async_db.queries[-3][1] == (MAY, 7)
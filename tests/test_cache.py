@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import pytest
+
+from pg_orm import models
+from pg_orm.models.cache import QueryCache
+
+
+class Currency(models.Model, table_name="cache_currencies"):
+    code = models.CharField(max_length=3)
+
+
+class AsyncCurrency(models.AsyncModel, table_name="cache_async_currencies"):
+    code = models.CharField(max_length=3)
+
+
+@pytest.fixture(autouse=True)
+def db(recording_db):
+    recording_db(AsyncCurrency, columns=("id", "code"), rows=[(1, "EUR"), (2, "USD")])
+    return recording_db(Currency, columns=("id", "code"), rows=[(1, "EUR"), (2, "USD")])
+
+
+def test_cached_results_are_invalidated_by_writes():
+    cache = QueryCache(max_size=2)
+    objects = Currency.objects.cached(cache=cache)
+
+    first = objects.filter(code__in=["EUR", "USD"])
+    second = objects.filter(code__in=["EUR", "USD"])
+    assert len(Currency.db.queries) == 1
+    assert [c.code for c in second] == ["EUR", "USD"] and first[0] is not second[0]
+    assert objects.get(id=1).code == "EUR"
+
+    Currency.objects.create(code="GBP")
+    objects.filter(code__in=["EUR", "USD"])
+    assert len(Currency.db.queries) == 4
+    assert cache.stats()["hits"] == 1 and cache.stats()["stale"] == 1
+
+    objects.all()
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+
+
+def test_writes_in_a_transaction_invalidate_after_commit(db):
+    objects = Currency.objects.cached(cache=QueryCache())
+    with db.transaction():
+        Currency.objects.create(code="GBP")
+        # Stands in for another connection, which still reads the rows from before the commit
+        objects.all()
+    objects.all()
+    assert db.queries.count(("SELECT * FROM cache_currencies;", ())) == 2
+
+
+def test_cached_values_changed_in_place(recording_db):
+    class Profile(models.Model, table_name="cache_profiles"):
+        data = models.JsonField()
+
+    recording_db(Profile, columns=("id", "data"), rows=[(1, {"tags": ["a"]})])
+    objects = Profile.objects.cached(cache=QueryCache())
+
+    # Neither the instances of the read which filled the cache nor the ones of a hit share its values
+    for _ in range(2):
+        profile = objects.get(id=1)
+        profile.data["tags"].append("b")
+        profile.data["theme"] = "dark"
+    assert objects.get(id=1).data == {"tags": ["a"]}
+    assert len(Profile.db.queries) == 1
+
+
+def test_ttl_and_async():
+    cache = QueryCache(ttl=0.01)
+    objects = AsyncCurrency.objects.cached(cache=cache)
+
+    async def run():
+        await objects.get(code="EUR")
+        await objects.get(code="EUR")
+        time.sleep(0.02)
+        await objects.get(code="EUR")
+
+    asyncio.run(run())
+    assert len(AsyncCurrency.db.queries) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
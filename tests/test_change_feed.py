@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import RecordingDriver, AsyncRecordingDriver
+from pg_orm import models
+from pg_orm.errors import SchemaError
+
+CHANGE = json.dumps({"table": "feed_items", "op": "update", "id": 7})
+
+
+class ListeningDriver(RecordingDriver):
+    def listen(self, channel, timeout=None):
+        yield CHANGE
+
+
+class AsyncListeningDriver(AsyncRecordingDriver):
+    async def listen(self, channel):
+        yield CHANGE
+
+
+class Item(models.Model, table_name="feed_items", notify=True):
+    name = models.CharField(max_length=64)
+
+
+class AsyncItem(models.AsyncModel, table_name="feed_async_items", notify="trigger"):
+    name = models.CharField(max_length=64)
+
+
+@pytest.fixture(autouse=True)
+def db(recording_db):
+    recording_db(AsyncItem, driver_class=AsyncListeningDriver)
+    return recording_db(Item, driver_class=ListeningDriver, columns=("id", "name"), rows=[(7, "new")])
+
+
+def test_writes_notify_in_their_transaction():
+    item = Item.objects.create(name="new")
+    item.name = "changed"
+    item.update()
+    begin, update, (notify, (channel, payload)), commit = Item.db.queries[-4:]
+    assert (begin, commit) == ("BEGIN", "COMMIT")
+    assert update == ("UPDATE feed_items SET name=%s WHERE id=%s", ("changed", 7))
+    assert (notify, channel) == ("SELECT pg_notify(%s, %s);", "feed_items_changes")
+    assert json.loads(payload) == {"table": "feed_items", "op": "update", "id": 7}
+    assert json.loads(Item.db.queries[2][1][1]) == {"table": "feed_items", "op": "insert", "id": 7}
+
+
+def test_listen():
+    assert list(Item.listen()) == [{"table": "feed_items", "op": "update", "id": 7}]
+
+    async def collect():
+        return [change async for change in AsyncItem.listen()]
+
+    assert asyncio.run(collect())[0]["op"] == "update"
+
+
+def test_trigger():
+    create_function, drop_trigger, create_trigger = AsyncItem._query_gen.generate_notify_trigger_queries()
+    assert "PERFORM pg_notify('feed_async_items_changes', json_build_object(" in create_function
+    assert create_trigger == "CREATE TRIGGER feed_async_items_notify AFTER INSERT OR UPDATE OR DELETE " \
+                             "ON feed_async_items FOR EACH ROW EXECUTE FUNCTION feed_async_items_notify();"
+    assert AsyncItem.to_dict()["notify"] == "trigger"
+
+    with pytest.raises(SchemaError):
+        class Invalid(models.Model, table_name="invalid", notify="yes"):
+            name = models.CharField(max_length=64)
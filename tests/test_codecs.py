@@ -0,0 +1,52 @@
+import json
+
+import psycopg2.extensions
+import pytest
+
+import pg_orm
+from pg_orm import models
+from pg_orm.models import codecs
+
+
+@pytest.fixture(autouse=True)
+def default_library():
+    db = models.Model.db
+    yield
+    models.Model.set_db(db)
+    # The registration is global, leave the default library registered for the other tests
+    codecs._library = None
+    codecs.register_psycopg2()
+
+
+def upper_dumps(value):
+    return json.dumps(value).upper()
+
+
+def test_set_json_library():
+    assert codecs.json_loads(codecs.json_dumps({"a": [1, 2]})) == {"a": [1, 2]}
+
+    loaded = []
+    codecs.set_json_library(upper_dumps, lambda value: loaded.append(value) or json.loads(value))
+    assert codecs.json_dumps({"a": "b"}) == '{"A": "B"}'
+    assert codecs.json_loads('{"a": 1}') == {"a": 1} and loaded == ['{"a": 1}']
+
+
+def test_psycopg2_round_trip():
+    codecs.set_json_library(upper_dumps, lambda value: {"loaded": json.loads(value)})
+    codecs.register_psycopg2()
+
+    assert psycopg2.extensions.adapt({"a": "b"}).getquoted() == b"""'{"A": "B"}'"""
+    for oid in (114, 3802):  # json, jsonb
+        assert psycopg2.extensions.string_types[oid]('{"a": 1}', None) == {"loaded": {"a": 1}}
+
+
+def test_json_codecs_are_opt_out(monkeypatch):
+    calls = []
+    db = models.Model.db
+    monkeypatch.setattr(codecs, "register_psycopg2", lambda: calls.append("psycopg2"))
+    monkeypatch.setattr(codecs, "register_psycopg", lambda: calls.append("psycopg"))
+
+    pg_orm.init_db(psycopg2_pool=object(), json_codecs=False)
+    assert calls == [] and models.Model.db is not db
+    pg_orm.init_db(psycopg2_pool=object())
+    assert calls == ["psycopg2"]
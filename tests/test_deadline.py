@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+
+from pg_orm.errors import QueryTimeout
+from pg_orm.models import deadline
+from pg_orm.models.database import Psycopg2Driver, AsyncpgDriver, _remaining
+
+
+def test_nested_deadlines_only_shorten():
+    assert _remaining() is None
+    with deadline(10):
+        with deadline(60):
+            assert _remaining() <= 10
+        with deadline(1):
+            assert _remaining() <= 1
+        with deadline(None):
+            assert 1 < _remaining() <= 10
+    assert _remaining() is None
+
+
+def test_passed_deadline_raises():
+    with deadline(0.001):
+        time.sleep(0.01)
+        with pytest.raises(QueryTimeout):
+            _remaining()
+
+
+class CancelledError(Exception):
+    pgcode = "57014"
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, args=None):
+        self.conn.log.append((query, args))
+        if "pg_sleep" in query:
+            raise CancelledError("canceling statement due to statement timeout")
+
+
+class FakeConnection:
+    autocommit = False
+
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn):
+        pass
+
+
+def test_psycopg2_statement_timeout():
+    pool = FakePool()
+    driver = Psycopg2Driver(pool)
+    with deadline(5):
+        driver.execute("DELETE FROM t WHERE id = %s", 1)
+    query, args = pool.conn.log[0]
+    # Sent with the statement, set_config(..., true) only lasts until the end of its transaction
+    assert query == "SELECT set_config('statement_timeout', %s, true); DELETE FROM t WHERE id = %s"
+    assert args[1:] == (1,) and args[0].endswith("ms") and 4000 < int(args[0][:-2]) <= 5000
+
+    pool.conn.log.clear()
+    with deadline(5):
+        driver.execute("CREATE INDEX CONCURRENTLY i ON t (a)", autocommit=True)
+    # Statements which can't run in a transaction block get a session timeout which is reset afterwards
+    assert [query for query, _ in pool.conn.log] == [
+        "SET statement_timeout = %s", "CREATE INDEX CONCURRENTLY i ON t (a)", "RESET statement_timeout",
+    ]
+    assert pool.conn.autocommit is False
+
+
+def test_psycopg2_timeout_is_reset_in_the_outer_transaction():
+    pool = FakePool()
+    driver = Psycopg2Driver(pool)
+    with driver.transaction():
+        with deadline(5):
+            driver.execute("UPDATE t SET a = 1")
+        driver.execute("UPDATE t SET a = 2")
+        driver.execute("UPDATE t SET a = 3")
+
+    assert pool.conn.log[0][0].startswith("SELECT set_config('statement_timeout', %s, true); ")
+    # The timeout of the deadline is dropped once, by the first statement after it
+    assert pool.conn.log[1:] == [
+        ("SET LOCAL statement_timeout TO DEFAULT; UPDATE t SET a = 2", ()), ("UPDATE t SET a = 3", ()), "COMMIT",
+    ]
+    assert driver._local_timeouts == set()
+
+
+def test_psycopg2_cancelled_statement():
+    driver = Psycopg2Driver(FakePool())
+    with deadline(5), pytest.raises(QueryTimeout) as error:
+        driver.execute("SELECT pg_sleep(10)")
+    assert isinstance(error.value.__cause__, CancelledError)
+    # Without a deadline the error of the database is left as it is
+    with pytest.raises(CancelledError):
+        driver.execute("SELECT pg_sleep(10)")
+
+
+class FakeAsyncpgPool:
+    def __init__(self):
+        self.log = []
+
+    async def execute(self, query, *args, timeout=None):
+        self.log.append((query, args, timeout))
+        if "pg_sleep" in query:
+            raise asyncio.TimeoutError()
+        return "OK"
+
+
+def test_asyncpg_timeout():
+    pool = FakeAsyncpgPool()
+    driver = AsyncpgDriver(pool)
+
+    async def run():
+        await driver.execute("DELETE FROM t")
+        with deadline(5):
+            await driver.execute("DELETE FROM t WHERE id = $1", 1)
+            with pytest.raises(QueryTimeout):
+                await driver.execute("SELECT pg_sleep(10)")
+
+    asyncio.run(run())
+    assert pool.log[0] == ("DELETE FROM t", (), None)
+    query, args, timeout = pool.log[1]
+    assert (query, args) == ("DELETE FROM t WHERE id = $1", (1,)) and 4 < timeout <= 5
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+import pytest
+
+from pg_orm.debug import assert_max_queries, detect_n_plus_one, normalize
+from pg_orm.errors import NPlusOneError
+from pg_orm.models.database import _notify
+
+
+def run_queries(*queries):
+    for query in queries:
+        _notify(query)
+
+
+def test_normalize():
+    assert normalize("SELECT * FROM posts WHERE id = 12 AND title = 'it''s'") == \
+        "SELECT * FROM posts WHERE id = ? AND title = ?"
+    assert normalize("SELECT *\n  FROM posts WHERE id IN ($1, $2, $3)") == "SELECT * FROM posts WHERE id IN (?)"
+
+
+def test_assert_max_queries():
+    with assert_max_queries(2) as counter:
+        run_queries("SELECT 1", "SELECT 2")
+    assert counter.queries == ["SELECT 1", "SELECT 2"]
+
+    with pytest.raises(AssertionError) as error:
+        with assert_max_queries(1):
+            run_queries("SELECT 1", "SELECT 2")
+    assert "2 queries executed, 1 allowed" in str(error.value) and "2. SELECT 2" in str(error.value)
+
+    # Statements sent after the block aren't counted
+    run_queries("SELECT 3")
+    assert counter.count == 2
+
+
+def test_assert_max_queries_decorator():
+    @assert_max_queries(1)
+    def view():
+        run_queries("SELECT 1", "SELECT 2")
+
+    @assert_max_queries(1)
+    async def async_view():
+        run_queries("SELECT 1")
+        return "ok"
+
+    with pytest.raises(AssertionError):
+        view()
+    assert asyncio.run(async_view()) == "ok"
+
+
+def test_detect_n_plus_one(caplog):
+    with caplog.at_level(logging.WARNING, logger="pg_orm.debug"):
+        with detect_n_plus_one(threshold=3) as detector:
+            for i in range(2):
+                run_queries(f"SELECT * FROM comments WHERE post_id = {i}")
+            assert detector.reports == []
+
+            for i in range(4):
+                run_queries(f"SELECT * FROM comments WHERE post_id = {i}")
+
+    # Reported once when the threshold is reached, from the line of this file which sent the statements
+    assert len(detector.reports) == 1
+    assert "SELECT * FROM comments WHERE post_id = ?" in detector.reports[0]
+    assert f"{__file__}:{run_queries.__code__.co_firstlineno + 2}" in detector.reports[0]
+    assert caplog.records[0].getMessage() == detector.reports[0]
+
+
+def test_call_sites_are_counted_apart():
+    with detect_n_plus_one(threshold=2) as detector:
+        _notify("SELECT * FROM users WHERE id = 1")
+        _notify("SELECT * FROM users WHERE id = 2")
+    assert detector.reports == []
+
+
+def test_raise_error():
+    @detect_n_plus_one(threshold=2, raise_error=True)
+    def view():
+        for i in range(3):
+            run_queries(f"SELECT * FROM users WHERE id = {i}")
+
+    with pytest.raises(NPlusOneError) as error:
+        view()
+    assert "executed 2 times" in str(error.value)
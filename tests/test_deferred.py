@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import DeferredFieldError
+
+BODIES = {1: "first body", 2: "second body"}
+
+
+class Post(models.Model, table_name="deferred_posts"):
+    title = models.CharField(max_length=64)
+    body = models.TextField(deferred=True)
+
+
+class AsyncPost(models.AsyncModel, table_name="deferred_async_posts"):
+    title = models.CharField(max_length=64)
+    body = models.TextField(deferred=True)
+
+
+@pytest.fixture(autouse=True)
+def db(recording_db):
+    options = dict(
+        columns=("id", "title"), rows=[(1, "First"), (2, "Second")],
+        responses={"= ANY(": lambda ids: (("id", "body"), [(i, BODIES[i]) for i in ids])},
+    )
+    recording_db(AsyncPost, **options)
+    return recording_db(Post, **options)
+
+
+def sent(db):
+    return [query for query, _ in db.queries]
+
+
+def test_deferred_fields_are_left_out():
+    Post.objects.filter(title="First")
+    assert sent(Post.db)[-1] == "SELECT id, title FROM deferred_posts WHERE title=%s;"
+    Post.objects.undefer().all()
+    assert sent(Post.db)[-1] == "SELECT * FROM deferred_posts;"
+    Post.objects.undefer("body").defer("title").all()
+    assert sent(Post.db)[-1] == "SELECT id, body FROM deferred_posts;"
+
+
+def test_deferred_loads_are_batched():
+    posts = Post.objects.all()
+    count = len(Post.db.queries)
+    assert [post.body for post in posts] == ["first body", "second body"]
+    assert sent(Post.db)[count:] == ["SELECT id, body FROM deferred_posts WHERE id = ANY(%s);"]
+
+
+def test_async_deferred_fields():
+    async def run():
+        posts = await AsyncPost.objects.all()
+        with pytest.raises(DeferredFieldError):
+            posts[0].body
+        await posts.load_deferred()
+        return [post.body for post in posts]
+
+    assert asyncio.run(run()) == ["first body", "second body"]
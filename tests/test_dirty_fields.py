@@ -0,0 +1,42 @@
+import pytest
+
+from pg_orm import models
+
+
+class Article(models.Model, table_name="dirty_articles"):
+    title = models.CharField(max_length=64)
+    body = models.TextField()
+
+
+@pytest.fixture(autouse=True)
+def db(recording_db):
+    return recording_db(Article, columns=("id", "title", "body"), rows=[(1, "Title", "A long body")])
+
+
+def test_update_sends_only_changed_columns():
+    article = Article.objects.get(id=1)
+    article.title = "New title"
+    article.update()
+    assert Article.db.queries[-1] == ("UPDATE dirty_articles SET title=%s WHERE id=%s", ("New title", 1))
+
+
+def test_update_without_changes_sends_nothing():
+    article = Article.objects.get(id=1)
+    sent = len(Article.db.queries)
+    article.title = "Title"  # the loaded value
+    article.update()
+    assert len(Article.db.queries) == sent
+
+    article.body = "Changed"
+    article.update()
+    article.update()
+    assert len(Article.db.queries) == sent + 1
+
+
+def test_forced_and_untracked_fields():
+    article = Article.objects.get(id=1)
+    article.update(fields=["body"])
+    assert Article.db.queries[-1][0] == "UPDATE dirty_articles SET body=%s WHERE id=%s"
+
+    Article(id=2, title="x", body="y").update()
+    assert Article.db.queries[-1][0] == "UPDATE dirty_articles SET title=%s, body=%s WHERE id=%s"
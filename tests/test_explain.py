@@ -0,0 +1,78 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from pg_orm import models
+
+PLAN = [{
+    "Plan": {
+        "Node Type": "Hash Join", "Plan Rows": 500,
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "explain_posts", "Plan Rows": 200000},
+            {"Node Type": "Seq Scan", "Relation Name": "explain_tags", "Plan Rows": 20},
+        ],
+    },
+    "Planning Time": 0.1,
+}]
+
+
+class Post(models.Model, table_name="explain_posts"):
+    title = models.CharField(max_length=64)
+
+
+class AsyncPost(models.AsyncModel, table_name="explain_async_posts"):
+    title = models.CharField(max_length=64)
+
+
+@pytest.fixture(autouse=True)
+def db(recording_db):
+    def use(model, plan):
+        return recording_db(
+            model, columns=("id", "title"), rows=[(1, "first"), (2, "second")], value=42,
+            responses={"EXPLAIN": (("QUERY PLAN",), [(plan,)])},
+        )
+
+    use(AsyncPost, json.dumps(PLAN))  # asyncpg returns json as text
+    return use(Post, PLAN)
+
+
+def test_raw_hydrates_and_explains(caplog):
+    posts = Post.objects.raw("SELECT id, title FROM explain_posts WHERE title <> %s", "x")
+    assert [p.title for p in posts] == ["first", "second"]
+    assert posts[0].get_dirty_fields() == {}
+
+    with caplog.at_level(logging.WARNING):
+        plan = posts.explain(analyze=True, buffers=True, seq_scan_rows=10000)
+    assert plan["Plan"]["Node Type"] == "Hash Join"
+    assert Post.db.queries[-1] == (
+        "EXPLAIN (FORMAT JSON, ANALYZE, BUFFERS) SELECT id, title FROM explain_posts WHERE title <> %s", ("x",)
+    )
+    assert "explain_posts" in caplog.text and "explain_tags" not in caplog.text
+
+
+def test_async_explain_of_filter():
+    async def run():
+        posts = await AsyncPost.objects.filter(title="first")
+        return posts, await posts.explain()
+
+    posts, plan = asyncio.run(run())
+    assert len(posts) == 2
+    assert plan["Planning Time"] == 0.1
+    assert AsyncPost.db.queries[-1][0].startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert AsyncPost.db.queries[-1][1] == ("first",)
+
+
+def test_count_estimates():
+    assert Post.objects.estimate_count(title="first") == 500
+    assert Post.db.queries[-1] == ("EXPLAIN (FORMAT JSON) SELECT * FROM explain_posts WHERE title=%s;", ("first",))
+
+    assert Post.objects.estimate_count(exact_below=1000, title="first") == 42
+    assert Post.db.queries[-1] == ("SELECT count(*) FROM explain_posts WHERE title=%s;", ("first",))
+
+    assert Post.objects.estimated_count() == 42
+    assert "pg_class" in Post.db.queries[-1][0] and Post.db.queries[-1][1] == ("explain_posts", "explain_posts")
+
+    assert asyncio.run(AsyncPost.objects.estimate_count(exact_below=100, title="x")) == 500
+    assert asyncio.run(AsyncPost.objects.estimated_count()) == 42
@@ -0,0 +1,53 @@
+import pytest
+from asyncpg.protocol.protocol import _create_record
+
+from pg_orm import models
+from pg_orm.errors import FiledError
+
+
+class Article(models.Model, table_name="hydration_articles"):
+    title = models.CharField(max_length=64)
+    body = models.TextField(deferred=True)
+
+
+class AsyncArticle(models.AsyncModel, table_name="hydration_async_articles"):
+    title = models.CharField(max_length=64)
+
+
+@pytest.fixture(autouse=True)
+def db(recording_db):
+    recording_db(AsyncArticle)
+    return recording_db(Article)
+
+
+def test_rows_are_hydrated_in_column_order():
+    articles = Article._from_rows(("title", "id"), [("First", 1), ("Second", 2)])
+    assert [article.attrs for article in articles] == [{"title": "First", "id": 1}, {"title": "Second", "id": 2}]
+    # The instances are tracked like the ones built from a dict and aren't deferred
+    assert articles[0].get_dirty_fields() == {}
+    assert articles[0]._deferred is None
+    assert Article._from_rows(("id",), []) == []
+
+
+def test_asyncpg_records():
+    records = [_create_record({"id": 0, "title": 1}, (1, "First"))]
+    articles = AsyncArticle._from_rows(("id", "title"), records)
+    assert articles[0].attrs == {"id": 1, "title": "First"}
+    assert articles[0].get_dirty_fields() == {}
+
+
+def test_unknown_columns():
+    with pytest.raises(FiledError) as error:
+        Article._from_rows(("id", "author"), [(1, "someone")])
+    assert error.value.key == "author"
+    # The columns are checked even when there is no row
+    with pytest.raises(FiledError):
+        Article._from_rows(("author",), [])
+
+
+def test_deferred_group():
+    articles = Article._from_rows(("id", "title"), [(1, "First"), (2, "Second")], ("body",))
+    group = articles[0]._deferred
+    assert group is articles[1]._deferred
+    assert group.model is Article and group.names == {"body"}
+    assert group.instances == articles
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+# Seconds `import pg_orm.models` may take in a fresh interpreter, override it on slow machines
+IMPORT_BUDGET = float(os.environ.get("PG_ORM_IMPORT_BUDGET", "0.15"))
+
+CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def import_in_subprocess(module):
+    output = subprocess.run(
+        [sys.executable, "-c", CODE.format(module=module)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def test_models_import_does_not_load_drivers():
+    modules = import_in_subprocess("pg_orm.models")["modules"]
+    for module in ("psycopg2", "asyncpg", "asyncio", "distutils"):
+        assert module not in modules, f"importing pg_orm.models loaded {module}"
+
+
+def test_migrations_import_does_not_load_drivers():
+    modules = import_in_subprocess("pg_orm.migrations")["modules"]
+    assert "psycopg2" not in modules and "asyncpg" not in modules
+
+
+def test_models_import_time_budget():
+    elapsed = min(import_in_subprocess("pg_orm.models")["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f"importing pg_orm.models took {elapsed:.3f}s (budget {IMPORT_BUDGET}s)"
@@ -0,0 +1,74 @@
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import SchemaError
+from pg_orm.migrations.schema_diff import SchemaDifference
+
+
+class Doc(models.Model, table_name="idx_docs", indexes=[
+        models.Index("title", "created_at", include=["body"], where="deleted IS FALSE"),
+        models.GinIndex("data"),
+        models.TrigramIndex("title", name="idx_docs_title_trgm")]):
+    title = models.CharField(max_length=64)
+    body = models.TextField()
+    created_at = models.DateTimeField()
+    deleted = models.BooleanField()
+    data = models.JsonField()
+
+
+def test_index_creation_sql():
+    assert Doc._query_gen.generate_index_creation_queries(concurrently=True) == [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_docs_title_created_at_idx ON idx_docs "
+        "USING btree (title, created_at) INCLUDE (body) WHERE deleted IS FALSE",
+        # JSON has no GIN operator class, its jsonb representation is indexed
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_docs_data_idx ON idx_docs USING gin ((data::jsonb))",
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_docs_title_trgm ON idx_docs USING gin (title gin_trgm_ops)",
+    ]
+
+    unique = models.Index("title", unique=True)
+    unique.validate("idx_docs", Doc.fields)
+    assert unique.to_sql("idx_docs", Doc.fields) == (
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_docs_title_key ON idx_docs USING btree (title)"
+    )
+    assert unique.to_drop_sql() == "DROP INDEX IF EXISTS idx_docs_title_key"
+    assert Doc.indexes[0].to_drop_sql(True) == "DROP INDEX CONCURRENTLY IF EXISTS idx_docs_title_created_at_idx"
+
+
+def test_invalid_indexes():
+    with pytest.raises(SchemaError):
+        models.Index()
+    with pytest.raises(SchemaError):
+        models.Index("title", method="bitmap")
+    with pytest.raises(SchemaError):
+        models.GinIndex("data", unique=True)
+    with pytest.raises(SchemaError):
+        models.Index("missing").validate("idx_docs", Doc.fields)
+
+
+def test_indexes_compare_and_hash_by_value():
+    copies = [models.Index.from_dict(index.to_dict()) for index in Doc.indexes]
+    assert copies == Doc.indexes
+    assert type(copies[2]) is models.TrigramIndex
+    assert set(copies) == set(Doc.indexes) and len(set(copies + Doc.indexes)) == 3
+    assert {copies[0]: "x"}[Doc.indexes[0]] == "x"
+
+
+def test_index_diff(recording_db):
+    recording_db(Doc)
+    before = Doc.to_dict()
+    brin = models.BrinIndex("created_at", name="idx_docs_old_brin")
+    before["indexes"] = [index for index in before["indexes"] if index["name"] != "idx_docs_title_trgm"]
+    before["indexes"].append(brin.to_dict())
+    before["indexes"][0]["where"] = None
+
+    assert SchemaDifference(Doc, before).index_sql() == [
+        # Changed indexes are dropped and created again
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_docs_title_created_at_idx",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_docs_old_brin",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_docs_title_created_at_idx ON idx_docs "
+        "USING btree (title, created_at) INCLUDE (body) WHERE deleted IS FALSE",
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_docs_title_trgm ON idx_docs USING gin (title gin_trgm_ops)",
+    ]
+    assert SchemaDifference(Doc, Doc.to_dict()).index_sql() == []
@@ -0,0 +1,79 @@
+import json
+
+from pg_orm import models
+from pg_orm.migrations import catalog, ledger
+from pg_orm.migrations.migration import _pending, _apply_pending
+from pg_orm.validators import ValueValidator
+
+
+def positive(value):
+    return value > 0
+
+
+class Customer(models.Model, table_name="ledger_customers"):
+    name = models.CharField(max_length=64)
+    age = models.IntegerField(validators=[positive, ValueValidator(max_value=150)])
+
+
+class Store(models.Model, table_name="ledger_stores"):
+    city = models.CharField(max_length=64, null=True)
+
+
+def entry(model, state=None, key=None):
+    state = state or model.to_dict()
+    return {"model": key or ledger.model_key(model), "table_name": state["name"],
+            "checksum": ledger.checksum(state), "state": ledger.dumps(state)}
+
+
+def test_validators_are_stored_by_name():
+    assert Customer.fields["age"].to_dict()["validators"] == [
+        "test_ledger.positive", "pg_orm.validators.ValueValidator"
+    ]
+
+
+def test_pending_models(tmp_path):
+    old_state = Store.to_dict()
+    old_state["fields"] = old_state["fields"][:1]
+    legacy = {"name": "ledger_customers", "fields": []}
+    (tmp_path / "Customer.json").write_text(json.dumps(legacy))
+
+    # Unchanged models are skipped by their checksum
+    entries = {"test_ledger.Customer": entry(Customer), "test_ledger.Store": entry(Store)}
+    assert _pending([Customer, Store], entries, tmp_path) == {}
+    # A changed model comes with its recorded state, a model without an entry with its legacy json file
+    assert _pending([Customer, Store], {"test_ledger.Store": entry(Store, old_state)}, tmp_path) == {
+        Customer: legacy, Store: old_state,
+    }
+    # Without either the live table is introspected by _apply
+    assert _pending([Store], {}, tmp_path) == {Store: None}
+
+
+def test_models_with_the_same_class_name(tmp_path):
+    def account(module, table_name):
+        return type("Account", (models.Model,), {"__module__": module, "balance": models.IntegerField()},
+                    table_name=table_name)
+
+    billing, auth = account("billing", "ledger_billing_accounts"), account("auth", "ledger_auth_accounts")
+    assert ledger.model_key(billing) == "billing.Account" and ledger.model_key(auth) == "auth.Account"
+    assert _pending([billing, auth], {"billing.Account": entry(billing)}, tmp_path) == {auth: None}
+
+    # A row recorded under the class name only is used by the model of its table
+    legacy = {"Account": entry(billing, key="Account")}
+    assert _pending([billing, auth], legacy, tmp_path) == {auth: None}
+    assert ledger.deletion_args(auth) == ("auth.Account", "Account", "ledger_auth_accounts")
+
+
+def test_live_table_fallback(recording_db, tmp_path):
+    db = recording_db(Store, responses={
+        "FROM pg_orm_migrations": (("model", "table_name", "checksum", "state"), []),
+        "unnest(": (("name",), [("ledger_stores",)]),
+        "pg_attribute": (("attname",), [("id",)]),
+    })
+    _apply_pending([Store], tmp_path)
+
+    assert db.queries[0] == (ledger.creation_query(), ())
+    assert (catalog.table_columns_query(), ("ledger_stores",)) in db.queries
+    # The column missing from the live table is added and the state is recorded
+    assert ("ALTER TABLE ledger_stores\nADD COLUMN IF NOT EXISTS city VARCHAR(64)", ()) in db.queries
+    assert db.queries[-2] == (ledger.upsert_query(), ledger.upsert_args(Store, Store.to_dict()))
+    assert db.queries[-1] == "COMMIT"
@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import FiledError
+
+
+class Order(models.Model, table_name="lookup_orders"):
+    customer = models.CharField(max_length=64, null=True)
+    total = models.FloatField()
+    placed_at = models.DateTimeField()
+    payload = models.JsonbField(null=True)
+
+
+query_gen = Order._query_gen
+
+
+def test_exact_and_null():
+    assert query_gen.generate_select_query(customer="a", total=1) == (
+        "SELECT * FROM lookup_orders WHERE customer=%s AND total=%s;", ("a", 1)
+    )
+    assert query_gen.generate_select_query(customer=None)[0] == "SELECT * FROM lookup_orders WHERE customer IS NULL;"
+    assert query_gen.generate_select_query(customer__isnull=False)[0].endswith("WHERE customer IS NOT NULL;")
+
+
+def test_in_uses_one_array_parameter():
+    ids = list(range(10000))
+    query, args = query_gen.generate_select_query(True, id__in=ids, total__gt=5)
+    assert query == "SELECT * FROM lookup_orders WHERE id = ANY($1) AND total > $2;"
+    assert args == (ids, 5)
+    assert query_gen.generate_select_query(True, id__in=[1, 2])[0] == query_gen.generate_select_query(True, id__in=[1])[0]
+    assert query_gen.generate_select_query(id__in=[])[0] == "SELECT * FROM lookup_orders WHERE FALSE;"
+
+
+def test_range():
+    start, end = datetime.datetime(2021, 1, 1), datetime.datetime(2021, 2, 1)
+    query, args = query_gen.generate_select_query(True, placed_at__range=(start, end), total__lte=10)
+    assert query == "SELECT * FROM lookup_orders WHERE placed_at BETWEEN $1 AND $2 AND total <= $3;"
+    assert args == (start, end, 10)
+
+
+def test_json_lookups():
+    query, args = query_gen.generate_select_query(True, payload__contains={"a": 1}, payload__user__id=2)
+    assert query == "SELECT * FROM lookup_orders WHERE payload @> $1::text::jsonb AND payload @> $2::text::jsonb;"
+    assert [arg.replace(" ", "") for arg in args] == ['{"a":1}', '{"user":{"id":2}}']
+    assert query_gen.generate_select_query(payload__has_key="a")[0].endswith("WHERE payload ? %s;")
+    assert query_gen.generate_select_query(payload__isnull=True)[0].endswith("WHERE payload IS NULL;")
+
+
+def test_json_keys_named_like_lookups():
+    # Every part of a longer path is a key, a single lookup name is the lookup
+    _, args = query_gen.generate_select_query(payload__tags__contains=1, payload__user__in=2)
+    assert [arg.replace(" ", "") for arg in args] == ['{"tags":{"contains":1}}', '{"user":{"in":2}}']
+    query, args = query_gen.generate_select_query(payload__in=[{"a": 1}])
+    assert query.endswith("WHERE payload = ANY(%s);") and args == ([{"a": 1}],)
+    # A top level key with the name of a lookup goes through contains
+    query, args = query_gen.generate_select_query(payload__contains={"in": 1})
+    assert query.endswith("WHERE payload @> %s::text::jsonb;") and args[0].replace(" ", "") == '{"in":1}'
+
+
+def test_unknown_lookup():
+    with pytest.raises(FiledError):
+        query_gen.generate_select_query(total__foo=1)
+    with pytest.raises(FiledError):
+        query_gen.generate_select_query(missing=1)
+
+
+class Article(models.Model, table_name="lookup_articles", indexes=[models.TrigramIndex("title")]):
+    title = models.CharField(max_length=200)
+    body = models.TextField()
+    document = models.SearchVectorField("title", "body", weights="AB")
+
+
+def test_search_vector_field():
+    query_gen = Article._query_gen
+    assert "document TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('english', coalesce(title, '')), 'A') || " \
+           "setweight(to_tsvector('english', coalesce(body, '')), 'B')) STORED" in query_gen.generate_table_creation_query()
+    assert query_gen.generate_index_creation_queries() == [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS lookup_articles_title_idx ON lookup_articles USING gin (title gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS lookup_articles_document_idx ON lookup_articles USING gin (document)",
+    ]
+    assert query_gen.generate_insert_query(title="a", body="b", document="c")[0] == \
+        "INSERT INTO lookup_articles (title, body) VALUES(%s, %s)"
+
+
+def test_search_query():
+    query_gen = Article._query_gen
+    query, args = query_gen.generate_search_query(True, document="fox", title="50%")
+    assert query == (
+        "SELECT * FROM lookup_articles WHERE document @@ websearch_to_tsquery('english', $1) AND title LIKE $2 "
+        "ORDER BY ts_rank(document, websearch_to_tsquery('english', $3)) DESC;"
+    )
+    assert args == ("fox", "%50\\%%", "fox")
+    assert query_gen.generate_search_query(title__similar="fx") == (
+        "SELECT * FROM lookup_articles WHERE title %% %s ORDER BY similarity(title, %s) DESC;", ("fx", "fx")
+    )
@@ -0,0 +1,94 @@
+import contextlib
+
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import LockTimeout
+from pg_orm.migrations import MigrationLock, ledger
+from pg_orm.migrations.lock import DEFAULT_LOCK_KEY, lock_key
+from pg_orm.migrations.migration import _migrate
+from pg_orm.models.database import Psycopg2Driver
+
+
+class LockingDriver:
+    def __init__(self, available):
+        self.available = available
+        self.calls = []
+
+    @contextlib.contextmanager
+    def advisory_lock(self, key, timeout=None, wait=True):
+        self.calls.append(("lock", key, timeout, wait))
+        yield self.available
+
+    def execute(self, query, *args, **kwargs):
+        self.calls.append(("execute", query))
+
+    def fetchall(self, query, *args):
+        self.calls.append(("fetchall", query))
+        return [{"model": ledger.model_key(Tenant), "checksum": ledger.checksum(Tenant.to_dict()), "state": "{}"}]
+
+
+class Tenant(models.Model, table_name="lock_tenants"):
+    name = models.CharField(max_length=64)
+
+
+def test_only_the_lock_holder_migrates():
+    Tenant.set_db(LockingDriver(available=False))
+    _migrate([Tenant], "migrations", lock=MigrationLock(wait=False))
+    assert Tenant.db.calls == [("lock", DEFAULT_LOCK_KEY, None, False)]
+
+    Tenant.set_db(LockingDriver(available=True))
+    _migrate([Tenant], "migrations", lock=MigrationLock("deploy", timeout=30))
+    assert Tenant.db.calls[0] == ("lock", lock_key("deploy"), 30, True)
+    assert Tenant.db.calls[1] == ("execute", ledger.creation_query())
+    assert len(Tenant.db.calls) == 3  # The ledger read under the lock has nothing pending
+
+
+class LockNotAvailable(Exception):
+    pgcode = "55P03"
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, args=None):
+        self.conn.queries.append(query)
+        if query.startswith("SELECT pg_advisory_lock"):
+            raise LockNotAvailable()
+
+
+class FakeConnection:
+    autocommit = False
+
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn):
+        pass
+
+
+def test_lock_timeout():
+    driver = Psycopg2Driver(FakePool())
+    with pytest.raises(LockTimeout):
+        with driver.advisory_lock(1, timeout=0.5):
+            pass
+    assert driver.pool.conn.queries[-1] == "RESET lock_timeout"
+    assert driver.pool.conn.autocommit is False
@@ -0,0 +1,44 @@
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import SchemaError
+from pg_orm.migrations.migration import _dependency_levels
+
+
+class Country(models.Model, table_name="dep_countries"):
+    name = models.CharField(max_length=64)
+
+
+class Currency(models.Model, table_name="dep_currencies"):
+    code = models.CharField(max_length=3)
+
+
+class City(models.Model, table_name="dep_cities"):
+    country = models.ForeignKey(Country, on_delete="CASCADE", sql_type="INTEGER")
+    # References to its own table don't order it after itself
+    twin = models.ForeignKey("dep_cities", on_delete="SET NULL", sql_type="INTEGER", null=True)
+
+
+class Shop(models.Model, table_name="dep_shops"):
+    city = models.ForeignKey(City, on_delete="CASCADE", sql_type="INTEGER")
+    currency = models.ForeignKey("DEP_CURRENCIES", on_delete="RESTRICT", sql_type="INTEGER")
+    # Tables which aren't migrated with the models don't order them
+    owner = models.ForeignKey("users", on_delete="CASCADE", sql_type="INTEGER")
+
+
+def test_models_are_ordered_by_their_foreign_keys():
+    assert _dependency_levels([Shop, City, Currency, Country]) == [[Currency, Country], [City], [Shop]]
+    assert _dependency_levels([Shop, Currency]) == [[Currency], [Shop]]
+    assert _dependency_levels([]) == []
+
+
+def test_circular_foreign_keys():
+    class Author(models.Model, table_name="dep_authors"):
+        favourite_book = models.ForeignKey("dep_books", on_delete="SET NULL", sql_type="INTEGER", null=True)
+
+    class Book(models.Model, table_name="dep_books"):
+        author = models.ForeignKey(Author, on_delete="CASCADE", sql_type="INTEGER")
+
+    with pytest.raises(SchemaError) as error:
+        _dependency_levels([Country, Author, Book])
+    assert "Author" in str(error.value) and "Book" in str(error.value) and "Country" not in str(error.value)
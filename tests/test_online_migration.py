@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import RecordingDriver
+from pg_orm import models
+from pg_orm.errors import DBError
+from pg_orm.migrations import OnlineMigration
+from pg_orm.migrations.schema_diff import SchemaDifference
+
+
+class BackfillDriver(RecordingDriver):
+    """Returns the given values from fetchval, in order, for the statements of the steps"""
+
+    def __init__(self, values, **options):
+        super().__init__(**options)
+        self.values = iter(values)
+
+    def fetchval(self, query, *args, **kwargs):
+        super().fetchval(query, *args)
+        return None if query.startswith("SELECT set_config") else next(self.values)
+
+
+class Account(models.Model, table_name="online_accounts"):
+    plan = models.CharField(max_length=16, default="free")
+
+
+def backfill():
+    return SchemaDifference(Account, Account.to_dict())._backfill_step("online_accounts", Account.fields["plan"], 2)
+
+
+def test_backfill_step(recording_db):
+    recording_db(Account)
+    step = backfill()
+    assert step.statements[0] == (
+        "WITH batch AS (UPDATE online_accounts SET plan = %s WHERE id IN "
+        "(SELECT id FROM online_accounts WHERE plan IS NULL LIMIT 2 FOR UPDATE SKIP LOCKED) RETURNING 1) "
+        "SELECT count(*) FROM batch"
+    )
+    assert step.args == ("free",)
+    assert step.remaining == "SELECT EXISTS(SELECT 1 FROM online_accounts WHERE plan IS NULL)"
+
+
+def test_backfill_waits_for_locked_rows(recording_db):
+    # 2 rows updated, then an empty batch while locked rows are left, then the last row
+    db = recording_db(Account, driver_class=BackfillDriver, values=[2, 0, True, 1, 0, False])
+    OnlineMigration(retry_delay=0).run(Account, [backfill()])
+    step = backfill()
+    assert db.queries.count((step.statements[0], step.args)) == 4
+    assert db.queries[-1] == (step.remaining, ())
+
+
+def test_backfill_gives_up_on_rows_which_stay_locked(recording_db):
+    recording_db(Account, driver_class=BackfillDriver, values=[0, True, 0, True])
+    with pytest.raises(DBError):
+        OnlineMigration(retries=1, retry_delay=0).run(Account, [backfill()])
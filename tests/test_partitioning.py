@@ -0,0 +1,180 @@
+import asyncio
+import datetime
+
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import SchemaError
+from pg_orm.migrations import ledger
+from pg_orm.migrations.migration import migrate, async_migrate
+
+MAY = datetime.datetime(2024, 5, 3)
+JUNE = datetime.datetime(2024, 6, 1)
+DECEMBER = datetime.datetime(2024, 12, 15)
+
+
+class Reading(models.Model, table_name="part_readings", partition_by=models.RangePartition("created_at")):
+    created_at = models.DateTimeField()
+    value = models.IntegerField()
+
+
+class AsyncReading(models.AsyncModel, table_name="part_async_readings",
+                   partition_by=models.RangePartition("created_at")):
+    created_at = models.DateTimeField()
+    value = models.IntegerField()
+
+
+@pytest.fixture(autouse=True)
+def db(recording_db):
+    recording_db(AsyncReading, columns=("id", "created_at", "value"), rows=[(1, MAY, 10)])
+    return recording_db(Reading, columns=("id", "created_at", "value"), rows=[(1, MAY, 10)])
+
+
+def test_writes_find_the_row_by_its_stored_partition_key():
+    reading = Reading.objects.get(id=1)
+    reading.value = 11
+    reading.update()
+    assert Reading.db.queries[-1] == (
+        "UPDATE part_readings SET value=%s WHERE created_at=%s AND id=%s", (11, MAY, 1)
+    )
+
+    reading.created_at = JUNE
+    reading.update()
+    assert Reading.db.queries[-1] == (
+        "UPDATE part_readings SET created_at=%s WHERE created_at=%s AND id=%s", (JUNE, MAY, 1)
+    )
+    # The row moved to the new key once the update succeeded
+    reading.delete()
+    assert Reading.db.queries[-1] == ("DELETE FROM part_readings WHERE created_at=%s AND id=%s;", (JUNE, 1))
+
+    moved = Reading.objects.get(id=1)
+    moved.created_at = JUNE
+    moved.delete()
+    assert Reading.db.queries[-1] == ("DELETE FROM part_readings WHERE created_at=%s AND id=%s;", (MAY, 1))
+
+
+def test_unloaded_partition_key_is_left_out(recording_db):
+    recording_db(Reading, columns=("id", "value"), rows=[(1, 10)])
+    reading = Reading.objects.defer("created_at").get(id=1)
+    reading.created_at = JUNE
+    reading.update()
+    assert Reading.db.queries[-1] == ("UPDATE part_readings SET created_at=%s WHERE id=%s", (JUNE, 1))
+
+
+def test_async_update_after_partition_key_change():
+    async def run():
+        reading = await AsyncReading.objects.get(id=1)
+        reading.created_at = JUNE
+        await reading.update()
+
+    asyncio.run(run())
+    assert AsyncReading.db.queries[-1] == (
+        "UPDATE part_async_readings SET created_at=$1 WHERE created_at=$2 AND id=$3", (JUNE, MAY, 1)
+    )
+
+
+def test_partitioned_table_creation():
+    class Order(models.Model, table_name="part_orders", partition_by=models.ListPartition("region", {"eu": ["de"]})):
+        region = models.CharField(max_length=2)
+        number = models.IntegerField(unique=True)
+
+    assert Order._query_gen.generate_table_creation_query() == (
+        "CREATE TABLE IF NOT EXISTS part_orders (id SERIAL NOT NULL,\n"
+        "region VARCHAR(2) NOT NULL,\n"
+        "number INTEGER NOT NULL,\n"
+        "PRIMARY KEY (id, region),\n"
+        "UNIQUE (number, region)) PARTITION BY LIST (region)"
+    )
+
+    with pytest.raises(SchemaError):
+        models.RangePartition("created_at", interval="hour")
+    with pytest.raises(SchemaError):
+        models.HashPartition("id", 0)
+    with pytest.raises(SchemaError):
+        class Unkeyed(models.Model, table_name="part_unkeyed", partition_by=models.RangePartition("created_at")):
+            value = models.IntegerField()
+    with pytest.raises(SchemaError):
+        class NotADate(models.Model, table_name="part_not_a_date", partition_by=models.RangePartition("value")):
+            value = models.IntegerField()
+
+
+def test_range_partitions():
+    partitioning = models.RangePartition("created_at", premake=1, retention=2, default=True)
+    assert partitioning.creation_statements("ev", DECEMBER) == [
+        "CREATE TABLE IF NOT EXISTS ev_p20241201 PARTITION OF ev "
+        "FOR VALUES FROM ('2024-12-01 00:00:00') TO ('2025-01-01 00:00:00')",
+        "CREATE TABLE IF NOT EXISTS ev_p20250101 PARTITION OF ev "
+        "FOR VALUES FROM ('2025-01-01 00:00:00') TO ('2025-02-01 00:00:00')",
+        "CREATE TABLE IF NOT EXISTS ev_default PARTITION OF ev DEFAULT",
+    ]
+    assert models.RangePartition("created_at", interval="week").floor(MAY) == datetime.datetime(2024, 4, 29)
+    assert models.RangePartition("created_at", interval="year").step(MAY, -1) == datetime.datetime(2023, 5, 3)
+
+    # Partitions which ended before the last 2 months are expired
+    existing = ["ev_p20240901", "ev_p20241001", "ev_p20241201", "ev_default", "ev_archive"]
+    assert partitioning.expiry_statements("ev", existing, DECEMBER) == [
+        "ALTER TABLE ev DETACH PARTITION ev_p20240901",
+        "DROP TABLE IF EXISTS ev_p20240901",
+    ]
+    detaching = models.RangePartition("created_at", retention=2, detach=True)
+    assert detaching.expiry_statements("ev", existing, DECEMBER) == ["ALTER TABLE ev DETACH PARTITION ev_p20240901"]
+    assert models.RangePartition("created_at").expiry_statements("ev", existing, DECEMBER) == []
+
+
+def test_list_and_hash_partitions():
+    partitioning = models.ListPartition("region", {"eu": ["de", "fr"], "us": ["us"]})
+    assert partitioning.to_sql() == "PARTITION BY LIST (region)"
+    assert partitioning.creation_statements("t") == [
+        "CREATE TABLE IF NOT EXISTS t_eu PARTITION OF t FOR VALUES IN ('de', 'fr')",
+        "CREATE TABLE IF NOT EXISTS t_us PARTITION OF t FOR VALUES IN ('us')",
+        "CREATE TABLE IF NOT EXISTS t_default PARTITION OF t DEFAULT",
+    ]
+
+    partitioning = models.HashPartition("id", 2)
+    assert partitioning.to_sql() == "PARTITION BY HASH (id)"
+    assert partitioning.creation_statements("t") == [
+        "CREATE TABLE IF NOT EXISTS t_h0 PARTITION OF t FOR VALUES WITH (MODULUS 2, REMAINDER 0)",
+        "CREATE TABLE IF NOT EXISTS t_h1 PARTITION OF t FOR VALUES WITH (MODULUS 2, REMAINDER 1)",
+    ]
+
+
+def test_maintain_partitions(recording_db):
+    class Log(models.Model, table_name="part_logs", indexes=[models.BrinIndex("created_at")],
+              partition_by=models.RangePartition("created_at", premake=0, retention=1)):
+        created_at = models.DateTimeField()
+
+    db = recording_db(Log, columns=("relname",), rows=[("part_logs_p20241001",), ("part_logs_p20241201",)])
+    Log.maintain_partitions(DECEMBER)
+    assert [query for query, _ in db.queries] == [
+        "CREATE TABLE IF NOT EXISTS part_logs_p20241201 PARTITION OF part_logs "
+        "FOR VALUES FROM ('2024-12-01 00:00:00') TO ('2025-01-01 00:00:00')",
+        Log._query_gen.generate_partition_list_query(),
+        "ALTER TABLE part_logs DETACH PARTITION part_logs_p20241001",
+        "DROP TABLE IF EXISTS part_logs_p20241001",
+    ]
+    # Partitioned tables can't be indexed concurrently
+    assert Log._query_gen.generate_index_creation_queries(concurrently=True) == [
+        "CREATE INDEX IF NOT EXISTS part_logs_created_at_idx ON part_logs USING brin (created_at)"
+    ]
+
+
+def migrated(model):
+    """The ledger of a database in which the model is migrated and unchanged since"""
+    key, _, checksum, state = ledger.upsert_args(model, model.to_dict())
+    return {"FROM pg_orm_migrations": (("model", "checksum", "state"), [(key, checksum, state)])}
+
+
+def partition_statements(db):
+    return [query for query, _ in db.queries if "PARTITION OF" in query]
+
+
+def test_unchanged_models_maintain_their_partitions(recording_db, tmp_path):
+    db = recording_db(Reading, responses=migrated(Reading))
+    migrate(Reading, tmp_path, lock=False)
+    first_run = partition_statements(db)
+    migrate(Reading, tmp_path, lock=False)
+    assert first_run and partition_statements(db) == first_run * 2
+
+    async_db = recording_db(AsyncReading, responses=migrated(AsyncReading))
+    asyncio.run(async_migrate(AsyncReading, tmp_path, lock=False))
+    assert len(partition_statements(async_db)) == len(first_run)
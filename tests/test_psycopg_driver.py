@@ -0,0 +1,156 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+from pg_orm.models import deadline
+from pg_orm.models.database import PsycopgDriver, AsyncPsycopgDriver, _dollar_to_format
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        self.conn.log.append(("pipeline" if self.conn.pipelined else "execute", query, params))
+        self.description = [SimpleNamespace(name="id"), SimpleNamespace(name="name")]
+        return self
+
+    def fetchall(self):
+        return [(1, "a"), (2, "b")]
+
+
+class FakeConnection:
+    autocommit = False
+
+    def __init__(self):
+        self.log = []
+        self.pipelined = False
+
+    def cursor(self, binary=False, row_factory=None):
+        return FakeCursor(self)
+
+    def execute(self, query, params=None):
+        return self.cursor().execute(query, params)
+
+    @contextlib.contextmanager
+    def pipeline(self):
+        self.pipelined = True
+        yield
+        self.pipelined = False
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        self.conn.log.append(("acquire", timeout))
+        yield self.conn
+
+
+class AsyncFakeCursor(FakeCursor):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, query, params=None):
+        return super().execute(query, params)
+
+    async def fetchall(self):
+        return super().fetchall()
+
+    @property
+    def statusmessage(self):
+        return "OK"
+
+
+class AsyncFakeConnection(FakeConnection):
+    def cursor(self, binary=False, row_factory=None):
+        return AsyncFakeCursor(self)
+
+    async def execute(self, query, params=None):
+        return await self.cursor().execute(query, params)
+
+    async def set_autocommit(self, value):
+        self.log.append(("autocommit", value))
+        self.autocommit = value
+
+    @contextlib.asynccontextmanager
+    async def pipeline(self):
+        self.pipelined = True
+        yield
+        self.pipelined = False
+
+
+class AsyncFakePool:
+    def __init__(self):
+        self.connections = []
+
+    @contextlib.asynccontextmanager
+    async def connection(self, timeout=None):
+        conn = AsyncFakeConnection()
+        self.connections.append(conn)
+        yield conn
+
+
+def test_dollar_parameters_are_rewritten():
+    query, args = _dollar_to_format("SELECT * FROM t WHERE a = $2 AND b % $1 AND c = $2", ("x", "y"))
+    assert query == "SELECT * FROM t WHERE a = %s AND b %% %s AND c = %s"
+    assert args == ["y", "x", "y"]
+    assert _dollar_to_format("SELECT 100 % 7", ()) == ("SELECT 100 % 7", None)
+
+
+def test_deadline_is_pipelined_with_the_query():
+    pool = FakePool()
+    driver = PsycopgDriver(pool)
+    assert driver.fetch_rows("SELECT * FROM t WHERE id = %s", 1) == (("id", "name"), [(1, "a"), (2, "b")])
+    assert pool.conn.log[-1] == ("execute", "SELECT * FROM t WHERE id = %s", (1,))
+
+    with deadline(5):
+        driver.execute("DELETE FROM t")
+    _, set_timeout, delete = pool.conn.log[-3:]
+    assert set_timeout[0] == "pipeline" and "statement_timeout" in set_timeout[1]
+    assert delete == ("pipeline", "DELETE FROM t", ())
+
+
+def test_async_driver():
+    pool = AsyncFakePool()
+    driver = AsyncPsycopgDriver(pool)
+
+    async def run():
+        async with driver.transaction() as conn:
+            await driver.execute("UPDATE t SET a = $1 WHERE b = $1", 5)
+            assert await driver.fetch_rows("SELECT * FROM t") == (("id", "name"), [(1, "a"), (2, "b")])
+            # Runs on a connection of its own, CREATE INDEX CONCURRENTLY can't run in the transaction
+            await driver.execute("CREATE INDEX CONCURRENTLY i ON t (a)", autocommit=True)
+        return conn
+
+    transaction = asyncio.run(run())
+    assert transaction.log == [
+        ("execute", "UPDATE t SET a = %s WHERE b = %s", [5, 5]),
+        ("execute", "SELECT * FROM t", None),
+    ]
+    index_conn = pool.connections[1]
+    assert index_conn.log == [
+        ("autocommit", True), ("execute", "CREATE INDEX CONCURRENTLY i ON t (a)", None), ("autocommit", False)
+    ]
+
+    async def run_with_deadline():
+        with deadline(5):
+            await driver.execute("CREATE INDEX CONCURRENTLY i ON t (a)", autocommit=True)
+
+    asyncio.run(run_with_deadline())
+    _, set_timeout, create, reset, _ = pool.connections[-1].log
+    assert set_timeout[0] == "execute" and "statement_timeout" in set_timeout[1] and "false" in set_timeout[1]
+    assert create[1] == "CREATE INDEX CONCURRENTLY i ON t (a)" and reset[1] == "RESET statement_timeout"
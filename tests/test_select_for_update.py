@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import DBError
+
+JOBS = dict(columns=("id", "status"), rows=[(1, "queued"), (2, "queued")])
+
+
+class Job(models.Model, table_name="sfu_jobs"):
+    status = models.CharField(max_length=16)
+
+
+class AsyncJob(models.AsyncModel, table_name="sfu_async_jobs"):
+    status = models.CharField(max_length=16)
+
+
+def test_select_for_update_needs_a_transaction(recording_db):
+    recording_db(Job, **JOBS)
+    jobs = Job.objects.select_for_update(nowait=True, of=[Job]).limit(5)
+    with pytest.raises(DBError):
+        jobs.filter(status="queued")
+
+    with Job.db.transaction():
+        assert len(jobs.filter(status="queued")) == 2
+    assert Job.db.queries[-2] == (
+        "SELECT * FROM sfu_jobs WHERE status=%s LIMIT 5 FOR UPDATE OF sfu_jobs NOWAIT;", ("queued",)
+    )
+
+    with pytest.raises(ValueError):
+        Job.objects.select_for_update(skip_locked=True, nowait=True)
+
+
+def test_claim_batch(recording_db):
+    recording_db(Job, **JOBS)
+    processed = []
+    claimed = Job.objects.claim_batch(10, processed.extend, status="queued")
+    assert processed == list(claimed) and len(claimed) == 2
+    assert Job.db.queries[-2][0] == (
+        "SELECT * FROM sfu_jobs WHERE status=%s ORDER BY id LIMIT 10 FOR UPDATE SKIP LOCKED;"
+    )
+
+    def fail(jobs):
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        Job.objects.claim_batch(10, fail)
+    assert Job.db.queries[-1] == "ROLLBACK"
+
+    recording_db(AsyncJob, **JOBS)
+
+    async def process(jobs):
+        processed.extend(jobs)
+
+    claimed = asyncio.run(AsyncJob.objects.claim_batch(1, process, status="queued"))
+    assert len(processed) == 4
+    assert AsyncJob.db.queries[-2][0].endswith("WHERE status=$1 ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED;")
+
+
+def test_search_keeps_the_lock_and_limit(recording_db):
+    recording_db(Job, **JOBS)
+    jobs = Job.objects.select_for_update(skip_locked=True).limit(10)
+    with pytest.raises(DBError):
+        jobs.search(status="queued")
+
+    with Job.db.transaction():
+        jobs.search(status="queued")
+    assert Job.db.queries[-2] == (
+        "SELECT * FROM sfu_jobs WHERE status LIKE %s LIMIT 10 FOR UPDATE SKIP LOCKED;", ("%queued%",)
+    )
+
+    recording_db(AsyncJob, **JOBS)
+
+    async def search():
+        async with AsyncJob.db.transaction():
+            await AsyncJob.objects.select_for_update().limit(1).search(status="queued")
+
+    asyncio.run(search())
+    assert AsyncJob.db.queries[-2][0] == "SELECT * FROM sfu_async_jobs WHERE status LIKE $1 LIMIT 1 FOR UPDATE;"
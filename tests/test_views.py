@@ -0,0 +1,48 @@
+import pytest
+
+from pg_orm import models
+from pg_orm.errors import DBError, SchemaError
+from pg_orm.migrations.migration import _dependency_levels
+
+
+class Sale(models.Model, table_name="view_sales"):
+    status = models.CharField(max_length=10)
+    total = models.FloatField()
+
+
+class SalesByStatus(models.MaterializedView, table_name="sales_by_status",
+                    query="SELECT status, sum(total) AS total FROM view_sales GROUP BY status;"):
+    status = models.CharField(max_length=10, unique=True)
+    total = models.FloatField()
+
+
+def test_view_creation():
+    query_gen = SalesByStatus._query_gen
+    assert list(SalesByStatus.fields) == ["status", "total"]
+    assert query_gen.generate_table_creation_query() == (
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS sales_by_status AS "
+        "SELECT status, sum(total) AS total FROM view_sales GROUP BY status WITH DATA"
+    )
+    assert query_gen.generate_index_creation_queries() == [
+        "CREATE UNIQUE INDEX IF NOT EXISTS sales_by_status_status_key ON sales_by_status USING btree (status)"
+    ]
+    assert query_gen.generate_refresh_query(True) == "REFRESH MATERIALIZED VIEW CONCURRENTLY sales_by_status;"
+    assert query_gen.generate_drop_query() == "DROP MATERIALIZED VIEW IF EXISTS sales_by_status CASCADE;"
+    assert _dependency_levels([SalesByStatus, Sale]) == [[Sale], [SalesByStatus]]
+
+
+def test_views_are_read_only():
+    with pytest.raises(DBError):
+        SalesByStatus._query_gen.generate_insert_query(status="paid", total=1.0)
+
+
+def test_view_from_manager_sql():
+    query = Sale.objects.sql(status__in=["paid", "it's"], total__gte=10)
+    assert query == "SELECT * FROM view_sales WHERE status = ANY(ARRAY['paid', 'it''s']) AND total >= 10"
+
+    class Unkeyed(models.MaterializedView, table_name="unkeyed_sales", query=query):
+        status = models.CharField(max_length=10)
+
+    with pytest.raises(SchemaError):
+        Unkeyed._query_gen.generate_refresh_query(True)
+    assert Unkeyed._query_gen.generate_refresh_query(False) == "REFRESH MATERIALIZED VIEW unkeyed_sales;"
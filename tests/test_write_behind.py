@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import threading
+
+import pytest
+
+from conftest import RecordingDriver, AsyncRecordingDriver
+from pg_orm import models
+from pg_orm.errors import BufferFull
+
+
+class BlockingDriver(RecordingDriver):
+    """Holds the flush in transaction() until release is set"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self.entered.set()
+        self.release.wait()
+        with super().transaction():
+            yield
+
+
+class CopyDriver(AsyncRecordingDriver):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.copied = []
+
+    async def copy_records(self, table, columns, records):
+        self.copied.append((table, columns, list(records)))
+        return len(records)
+
+
+class Event(models.Model, table_name="wb_events"):
+    name = models.CharField(max_length=32)
+    value = models.IntegerField(null=True)
+
+
+class AsyncEvent(models.AsyncModel, table_name="wb_async_events"):
+    name = models.CharField(max_length=32)
+
+
+def test_saves_are_coalesced_into_multi_row_inserts(recording_db):
+    recording_db(Event, driver_class=BlockingDriver)
+    with Event.write_behind(max_rows=3, flush_interval=60, max_pending=3) as buffer:
+        Event(name="a", value=1).save()
+        Event(name="b", value=2).save()
+        assert Event.db.queries == [] and len(buffer) == 2
+        Event(name="c").save()  # max_rows wakes the flush thread
+        buffer.flush()
+
+    assert Event._write_behind is None and buffer.flushed == 3
+    assert Event.db.queries == [
+        "BEGIN",
+        ("INSERT INTO wb_events (name, value) VALUES (%s, %s), (%s, %s)", ("a", 1, "b", 2)),
+        ("INSERT INTO wb_events (name) VALUES (%s)", ("c",)),
+        "COMMIT",
+    ]
+
+
+def test_full_buffer_applies_backpressure(recording_db):
+    recording_db(Event, driver_class=BlockingDriver)
+    Event.db.release.clear()
+    buffer = Event.write_behind(max_rows=1, flush_interval=60, max_pending=1, put_timeout=0.05)
+    try:
+        Event(name="a").save()
+        assert Event.db.entered.wait(1)  # The flush thread is busy writing "a"
+        Event(name="b").save()
+        with pytest.raises(BufferFull):
+            Event(name="c").save()
+    finally:
+        Event.db.release.set()
+        buffer.close()
+    assert buffer.flushed == 2
+
+
+def test_async_buffer_uses_copy(recording_db):
+    recording_db(AsyncEvent, driver_class=CopyDriver)
+
+    async def run():
+        buffer = AsyncEvent.write_behind(max_rows=2, flush_interval=60)
+        await AsyncEvent(name="a").save()
+        await AsyncEvent(name="b").save()
+        await asyncio.sleep(0.01)  # max_rows wakes the flush task
+        await AsyncEvent(name="c").save()
+        await buffer.close()
+
+    asyncio.run(run())
+    assert AsyncEvent.db.copied == [
+        ("wb_async_events", ("name",), [("a",), ("b",)]),
+        ("wb_async_events", ("name",), [("c",)]),
+    ]